@@ -1,18 +1,29 @@
+import os
 from typing import Literal
 
 import requests
 
 BASE_URL = "http://127.0.0.1:5000/api"
 
+# Once the server has answered a ping, don't ping it again before every request
+_server_confirmed_running = False
+
 
 def server_running() -> bool:
-    response = requests.get(f"{BASE_URL}/ping/")
+    try:
+        response = requests.get(f"{BASE_URL}/ping/")
+    except requests.ConnectionError:
+        return False
     return response.status_code == 200
 
 
 def complain_if_server_not_running():
+    global _server_confirmed_running
+    if _server_confirmed_running:
+        return
     if not server_running():
         raise Exception("Couldn't connect to the backend. Is it running?")
+    _server_confirmed_running = True
 
 
 def create_wildlife(name: str, scientific_name: str, category_id: int,
@@ -48,4 +59,50 @@ def create_category(name: str, parent_id: int | None = None) -> int:
         return response.json()["category_id"]
     else:
         raise Exception(
-            f"Failed to create category (server returned {response.status_code}). Full response: {response.text}")
\ No newline at end of file
+            f"Failed to create category (server returned {response.status_code}). Full response: {response.text}")
+
+
+def import_wildlife(file_path: str, format: Literal["csv", "ndjson"] | None = None) -> dict:
+    """Uploads a CSV or NDJSON file of wildlife to the bulk import route, and returns its report of imported and failed rows."""
+    complain_if_server_not_running()
+    params = {"format": format} if format else {}
+    with open(file_path, "rb") as file:
+        response = requests.post(f"{BASE_URL}/import-wildlife/", params=params, files={"file": file})
+    if response.status_code == 200:
+        return response.json()
+    else:
+        raise Exception(
+            f"Failed to import wildlife (server returned {response.status_code}). Full response: {response.text}")
+
+
+def export_dataset(file_path: str, dataset: str | None = None, format: Literal["ndjson", "csv"] = "ndjson",
+                   part: str | None = None):
+    """Streams a dataset export (see /api/export/) into a file, a chunk at a time, so large datasets never have to fit in memory"""
+    complain_if_server_not_running()
+    params = {"format": format}
+    if dataset:
+        params["dataset"] = dataset
+    if part:
+        params["part"] = part
+    with requests.get(f"{BASE_URL}/export/", params=params, stream=True) as response:
+        if response.status_code != 200:
+            raise Exception(
+                f"Failed to export dataset (server returned {response.status_code}). Full response: {response.text}")
+        with open(file_path, "wb") as file:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                file.write(chunk)
+
+
+def export_all_datasets(directory: str) -> list[str]:
+    """Exports every dataset the server knows about as NDJSON into the directory, one <dataset>.ndjson file each, and returns their paths"""
+    complain_if_server_not_running()
+    response = requests.get(f"{BASE_URL}/datasets/")
+    if response.status_code != 200:
+        raise Exception(
+            f"Failed to list datasets (server returned {response.status_code}). Full response: {response.text}")
+    file_paths = []
+    for dataset in response.json()["datasets"]:
+        file_path = os.path.join(directory, f"{dataset}.ndjson")
+        export_dataset(file_path, dataset=dataset)
+        file_paths.append(file_path)
+    return file_paths
@@ -1,16 +1,40 @@
-from flask import Flask, jsonify, request
+import logging
+import sqlite3
+
+import click
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
 from app.routes.wildlife import wildlife_bp
 from app.routes.categories import categories_bp
 from app.routes.images import images_bp
+from app.routes.bulk import bulk_bp
+from app import db_helpers, file_deletion, image_gc, image_index, logs, metrics
 
 import os
 
+logger = logging.getLogger(__name__)
+
+# Seconds clients are asked to wait before retrying a request that found the database locked
+DATABASE_LOCKED_RETRY_AFTER = 1
+
 
 def _normalize_dataset_name(name: str) -> str:
     return name.strip().lower().replace(" ", "_")
 
 
+def _slow_query_ms_from_env() -> float | None:
+    """Reads SLOW_QUERY_MS from the environment: a number of milliseconds, or empty, "none" or "off" to turn the slow query log off"""
+    value = os.environ.get("SLOW_QUERY_MS")
+    if value is None:
+        return db_helpers.DEFAULT_SLOW_QUERY_MS
+    if value.strip().lower() in ("", "none", "off"):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"SLOW_QUERY_MS must be a number of milliseconds, or 'none' or 'off', not {value!r}") from None
+
+
 def _discover_dataset_configs(base_dir: str) -> dict[str, dict[str, str]]:
     dataset_configs: dict[str, dict[str, str]] = {}
 
@@ -42,12 +66,25 @@ def create_app(test_config=None):
         IMAGE_UPLOAD_FOLDER=os.path.join(backend_dir, "uploaded_images"),
         DATASET_CONFIGS={},
         DEFAULT_DATASET=None,
+        DB_POOL_SIZE=db_helpers.DEFAULT_POOL_SIZE,
+        DB_CACHE_SIZE=db_helpers.DEFAULT_CACHE_SIZE,
+        DB_MMAP_SIZE=db_helpers.DEFAULT_MMAP_SIZE,
+        IMAGE_GC_INTERVAL=24 * 60 * 60,  # Seconds between orphan image collections; None turns the scheduled job off
+        IMAGE_SENDFILE=None,  # "x-sendfile" or "x-accel-redirect" to have a front proxy send image files; see images.send_image
+        IMAGE_ACCEL_REDIRECT_PREFIX="/protected-images",
+        LOG_LEVEL=os.environ.get("LOG_LEVEL", "INFO"),  # DEBUG turns on the debug logging (e.g. every query); see app/logs.py
+        SLOW_QUERY_MS=_slow_query_ms_from_env(),  # Queries slower than this are logged with their plan; None turns it off
     )
 
     # Override with test config if provided
     if test_config is not None:
         app.config.update(test_config)
 
+    # Set up logging first, so startup is logged too, and every request gets an ID before anything else runs
+    logs.init_app(app)
+    # Count requests and time them per route, and serve the counts at /api/metrics/
+    metrics.init_app(app)
+
     # Auto-discover dataset folders for normal runtime; keep tests simple when DATABASE is explicitly overridden.
     if not app.config.get("DATASET_CONFIGS"):
         if test_config is not None and "DATABASE" in test_config:
@@ -61,23 +98,60 @@ def create_app(test_config=None):
         else:
             app.config["DEFAULT_DATASET"] = sorted(app.config["DATASET_CONFIGS"].keys())[0]
 
+    # Make sure every dataset (or the one DATABASE, without dataset folders) has the current schema (including the full-text
+    # search tables), and finish deleting any files that were still queued when the server last stopped
+    db_paths = [dataset["db_path"] for dataset in app.config["DATASET_CONFIGS"].values()] or [app.config["DATABASE"]]
+    for db_path in db_paths:
+        db_helpers.init_db(db_path)
+        file_deletion.start_file_deletions(db_path)
+
+    # Index which upload folder holds each image, so serving one doesn't have to check every folder
+    image_index.build_image_index([dataset["image_upload_folder"] for dataset in app.config["DATASET_CONFIGS"].values()]
+                                  + [app.config["IMAGE_UPLOAD_FOLDER"]])
+
+    if app.config["IMAGE_GC_INTERVAL"] and not app.config.get("TESTING"):
+        image_gc.schedule_image_gc(app, app.config["IMAGE_GC_INTERVAL"])
+
+    @app.cli.command("gc-images")
+    @click.option("--dry-run", is_flag=True, help="Only report what would be deleted.")
+    @click.option("--min-age", type=float, default=image_gc.IMAGE_GC_MIN_AGE, show_default=True,
+                  help="Never delete files modified less than this many seconds ago.")
+    def gc_images(dry_run, min_age):
+        """Deletes uploaded images that no wildlife refers to any more."""
+        for folder, stats in image_gc.collect_all_orphan_images(app, dry_run=dry_run, min_age=min_age).items():
+            click.echo(f"{folder}: {stats}")
+
     # Enable CORS for frontend
     CORS(app, origins=["http://localhost:3000"])
-    print("[CORS DEBUG] CORS enabled for all routes.")
 
     @app.before_request
-    def validate_dataset():
+    def resolve_dataset():
+        # Resolve the dataset once here; every DB helper then reads it from g.dataset
         dataset = request.args.get("dataset")
-        if not dataset:
-            return None
-        dataset_key = _normalize_dataset_name(dataset)
-        if dataset_key not in app.config["DATASET_CONFIGS"]:
+        dataset_key = _normalize_dataset_name(dataset) if dataset else None
+        if dataset_key is not None and dataset_key not in app.config["DATASET_CONFIGS"]:
             return jsonify({
                 "error": f"Unknown dataset '{dataset}'",
                 "available_datasets": sorted(app.config["DATASET_CONFIGS"].keys()),
             }), 400
+        g.dataset = db_helpers.resolve_dataset(dataset_key)
         return None
 
+    @app.errorhandler(sqlite3.OperationalError)
+    def database_locked(e):
+        # Another connection held the write lock for longer than the busy timeout. That's temporary, so answer 503 rather than 500.
+        if e.sqlite_errorname not in ("SQLITE_BUSY", "SQLITE_LOCKED"):
+            # Not ours to handle, so let Flask answer it with its usual 500
+            raise
+        logger.warning("Database locked: %s", e)
+        response = jsonify({"error": f"The database is busy ({e}); try again"})
+        response.headers["Retry-After"] = str(DATABASE_LOCKED_RETRY_AFTER)
+        return response, 503
+
+    @app.get("/api/ping/")
+    def ping():
+        return jsonify({"message": "pong"}), 200
+
     @app.get("/api/datasets/")
     def get_datasets():
         return jsonify({
@@ -85,9 +159,13 @@ def create_app(test_config=None):
             "datasets": sorted(app.config["DATASET_CONFIGS"].keys()),
         }), 200
 
+    # Report each request's queries in its response headers, and hand pooled DB connections back at the end of each request
+    db_helpers.init_app(app)
+
     # Register blueprints
     app.register_blueprint(wildlife_bp)
     app.register_blueprint(categories_bp)
     app.register_blueprint(images_bp)
+    app.register_blueprint(bulk_bp)
 
     return app
@@ -0,0 +1,54 @@
+import threading
+from typing import Any, Callable
+
+from app import db_helpers
+
+# Every cache, for metrics
+_caches: list["DatasetCache"] = []
+
+
+class DatasetCache:
+    """
+    A process-wide cache that holds one value per dataset (keyed by database path), for values built from categories and fields.
+    The value is built lazily by calling `build` inside the request, and stored with the dataset's schema version (see get_schema_version).
+    Every get() reads that version from the database first, and rebuilds the value if it has moved on, so a change to categories
+    or fields made by any process (another worker, a script, the sqlite3 shell) is picked up on the next request.
+    """
+
+    def __init__(self, name: str, build: Callable[[], Any]):
+        self.name = name
+        self._build = build
+        self._lock = threading.Lock()
+        self._entries: dict[str, tuple[tuple[str, int], Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        _caches.append(self)
+
+    def get(self) -> Any:
+        key = db_helpers.get_active_database_path()
+        # Read before building, so the value is never older than the version it's stored with
+        version = get_schema_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = self._build()
+        with self._lock:
+            self._entries[key] = (version, value)
+        return value
+
+
+def get_schema_version() -> tuple[str, int]:
+    """
+    Returns the active dataset's (generation, version) from SchemaVersion. Triggers bump the version in the same transaction as
+    every change to Categories, Fields or FieldsToCategories, so it changes whenever anything cached from them might have.
+    """
+    row = db_helpers.select_one("SELECT generation, version FROM SchemaVersion")
+    return row["generation"], row["version"]
+
+
+def get_caches() -> list[DatasetCache]:
+    return list(_caches)
@@ -63,4 +63,207 @@ CREATE TABLE IF NOT EXISTS EnumeratedFieldValues (
     FOREIGN KEY (wildlife_id) REFERENCES Wildlife(id),
     FOREIGN KEY (option_id) REFERENCES EnumeratedOptions(id),
     PRIMARY KEY (wildlife_id, option_id)
-);
\ No newline at end of file
+);
+
+-- Triggers below keep derived tables (CategoryClosure, IntegerFieldValues and the search indexes) in sync.
+-- They're dropped and recreated every time this script runs, so changes to them reach existing databases.
+
+-- A bulk import adds a row here inside its transaction, so the insert triggers skip the rows it adds;
+-- it then fills in the derived tables itself with a few set-based statements, which is much faster (see db_helpers.bulk_load).
+-- The row is removed before the transaction commits, so other connections never see it.
+CREATE TABLE IF NOT EXISTS BulkLoad (
+    id INTEGER PRIMARY KEY
+);
+
+-- Every (ancestor, descendant) pair in the category tree, including each category paired with itself at depth 0.
+-- This turns "all subcategories of X" and "all parents of X" into single indexed lookups instead of recursive queries.
+-- Kept in sync with Categories by the triggers below, including when a category is moved to a new parent.
+CREATE TABLE IF NOT EXISTS CategoryClosure (
+    ancestor_id INTEGER NOT NULL,
+    descendant_id INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    FOREIGN KEY (ancestor_id) REFERENCES Categories(id),
+    FOREIGN KEY (descendant_id) REFERENCES Categories(id),
+    PRIMARY KEY (ancestor_id, descendant_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS CategoryClosure_descendant ON CategoryClosure (descendant_id, ancestor_id);
+
+DROP TRIGGER IF EXISTS Categories_closure_insert;
+CREATE TRIGGER Categories_closure_insert AFTER INSERT ON Categories
+BEGIN
+    INSERT INTO CategoryClosure (ancestor_id, descendant_id, depth) VALUES (new.id, new.id, 0);
+    INSERT INTO CategoryClosure (ancestor_id, descendant_id, depth)
+    SELECT ancestor_id, new.id, depth + 1 FROM CategoryClosure WHERE descendant_id = new.parent_id;
+END;
+
+DROP TRIGGER IF EXISTS Categories_closure_move;
+CREATE TRIGGER Categories_closure_move AFTER UPDATE OF parent_id ON Categories
+WHEN new.parent_id IS NOT old.parent_id
+BEGIN
+    -- Detach the moved subtree from its old ancestors...
+    DELETE FROM CategoryClosure
+    WHERE descendant_id IN (SELECT descendant_id FROM CategoryClosure WHERE ancestor_id = new.id)
+    AND ancestor_id IN (SELECT ancestor_id FROM CategoryClosure WHERE descendant_id = new.id AND ancestor_id != new.id);
+    -- ...and attach it under the new parent's ancestors
+    INSERT INTO CategoryClosure (ancestor_id, descendant_id, depth)
+    SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+    FROM CategoryClosure above, CategoryClosure below
+    WHERE above.descendant_id = new.parent_id AND below.ancestor_id = new.id;
+END;
+
+DROP TRIGGER IF EXISTS Categories_closure_delete;
+CREATE TRIGGER Categories_closure_delete AFTER DELETE ON Categories
+BEGIN
+    DELETE FROM CategoryClosure WHERE descendant_id = old.id;
+    DELETE FROM CategoryClosure WHERE ancestor_id = old.id;
+END;
+
+-- Typed copy of the values of INTEGER fields, so range searches compare numbers (not text) and can seek on the index.
+-- Kept in sync with FieldValues by the triggers below.
+CREATE TABLE IF NOT EXISTS IntegerFieldValues (
+    wildlife_id INTEGER NOT NULL,
+    field_id INTEGER NOT NULL,
+    value INTEGER,
+    FOREIGN KEY (wildlife_id) REFERENCES Wildlife(id),
+    FOREIGN KEY (field_id) REFERENCES Fields(id),
+    PRIMARY KEY (wildlife_id, field_id)
+);
+
+CREATE INDEX IF NOT EXISTS IntegerFieldValues_field_value ON IntegerFieldValues (field_id, value);
+
+DROP TRIGGER IF EXISTS FieldValues_integer_insert;
+CREATE TRIGGER FieldValues_integer_insert AFTER INSERT ON FieldValues
+WHEN (SELECT type FROM Fields WHERE id = new.field_id) = 'INTEGER' AND NOT EXISTS (SELECT 1 FROM BulkLoad)
+BEGIN
+    INSERT OR REPLACE INTO IntegerFieldValues (wildlife_id, field_id, value)
+    VALUES (new.wildlife_id, new.field_id, CAST(new.value AS INTEGER));
+END;
+
+DROP TRIGGER IF EXISTS FieldValues_integer_update;
+CREATE TRIGGER FieldValues_integer_update AFTER UPDATE OF value ON FieldValues
+WHEN (SELECT type FROM Fields WHERE id = new.field_id) = 'INTEGER'
+BEGIN
+    UPDATE IntegerFieldValues SET value = CAST(new.value AS INTEGER) WHERE wildlife_id = new.wildlife_id AND field_id = new.field_id;
+END;
+
+DROP TRIGGER IF EXISTS FieldValues_integer_delete;
+CREATE TRIGGER FieldValues_integer_delete AFTER DELETE ON FieldValues
+BEGIN
+    DELETE FROM IntegerFieldValues WHERE wildlife_id = old.wildlife_id AND field_id = old.field_id;
+END;
+
+-- Full-text search indexes. These are kept in sync with Wildlife and FieldValues by the triggers below.
+-- WildlifeNameSearch uses the wildlife ID as its rowid.
+-- FieldValueSearch only holds TEXT field values, and its rowid is (wildlife_id << 32) | field_id, so a field value always maps to the same row
+-- (even after REPLACE INTO FieldValues, which doesn't fire delete triggers).
+
+CREATE VIRTUAL TABLE IF NOT EXISTS WildlifeNameSearch USING fts5(name, scientific_name);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS FieldValueSearch USING fts5(value, wildlife_id UNINDEXED, field_id UNINDEXED);
+
+DROP TRIGGER IF EXISTS Wildlife_search_insert;
+CREATE TRIGGER Wildlife_search_insert AFTER INSERT ON Wildlife
+WHEN NOT EXISTS (SELECT 1 FROM BulkLoad)
+BEGIN
+    INSERT OR REPLACE INTO WildlifeNameSearch (rowid, name, scientific_name) VALUES (new.id, new.name, new.scientific_name);
+END;
+
+DROP TRIGGER IF EXISTS Wildlife_search_update;
+CREATE TRIGGER Wildlife_search_update AFTER UPDATE OF name, scientific_name ON Wildlife
+BEGIN
+    UPDATE WildlifeNameSearch SET name = new.name, scientific_name = new.scientific_name WHERE rowid = new.id;
+END;
+
+DROP TRIGGER IF EXISTS Wildlife_search_delete;
+CREATE TRIGGER Wildlife_search_delete AFTER DELETE ON Wildlife
+BEGIN
+    DELETE FROM WildlifeNameSearch WHERE rowid = old.id;
+END;
+
+DROP TRIGGER IF EXISTS FieldValues_search_insert;
+CREATE TRIGGER FieldValues_search_insert AFTER INSERT ON FieldValues
+WHEN (SELECT type FROM Fields WHERE id = new.field_id) = 'TEXT' AND NOT EXISTS (SELECT 1 FROM BulkLoad)
+BEGIN
+    INSERT OR REPLACE INTO FieldValueSearch (rowid, value, wildlife_id, field_id)
+    VALUES ((new.wildlife_id << 32) | new.field_id, new.value, new.wildlife_id, new.field_id);
+END;
+
+DROP TRIGGER IF EXISTS FieldValues_search_update;
+CREATE TRIGGER FieldValues_search_update AFTER UPDATE OF value ON FieldValues
+WHEN (SELECT type FROM Fields WHERE id = new.field_id) = 'TEXT'
+BEGIN
+    UPDATE FieldValueSearch SET value = new.value WHERE rowid = (new.wildlife_id << 32) | new.field_id;
+END;
+
+DROP TRIGGER IF EXISTS FieldValues_search_delete;
+CREATE TRIGGER FieldValues_search_delete AFTER DELETE ON FieldValues
+BEGIN
+    DELETE FROM FieldValueSearch WHERE rowid = (old.wildlife_id << 32) | old.field_id;
+END;
+
+-- Counts changes to categories and fields, so every process can tell when its cached copies of them (see app/cache.py) are out of date,
+-- including after changes made by other processes. (Not to be confused with PRAGMA user_version, which records the migrations applied.)
+-- version is bumped by the triggers below, in the same transaction as the change. generation is random per database, so versions
+-- from a database that's been deleted and recreated can't be mistaken for the old one's.
+CREATE TABLE IF NOT EXISTS SchemaVersion (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation TEXT NOT NULL DEFAULT (lower(hex(randomblob(8)))),
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO SchemaVersion (id) VALUES (1);
+
+DROP TRIGGER IF EXISTS Categories_schema_version_insert;
+CREATE TRIGGER Categories_schema_version_insert AFTER INSERT ON Categories
+BEGIN
+    UPDATE SchemaVersion SET version = version + 1;
+END;
+
+DROP TRIGGER IF EXISTS Categories_schema_version_update;
+CREATE TRIGGER Categories_schema_version_update AFTER UPDATE ON Categories
+BEGIN
+    UPDATE SchemaVersion SET version = version + 1;
+END;
+
+DROP TRIGGER IF EXISTS Categories_schema_version_delete;
+CREATE TRIGGER Categories_schema_version_delete AFTER DELETE ON Categories
+BEGIN
+    UPDATE SchemaVersion SET version = version + 1;
+END;
+
+DROP TRIGGER IF EXISTS Fields_schema_version_insert;
+CREATE TRIGGER Fields_schema_version_insert AFTER INSERT ON Fields
+BEGIN
+    UPDATE SchemaVersion SET version = version + 1;
+END;
+
+DROP TRIGGER IF EXISTS Fields_schema_version_update;
+CREATE TRIGGER Fields_schema_version_update AFTER UPDATE ON Fields
+BEGIN
+    UPDATE SchemaVersion SET version = version + 1;
+END;
+
+DROP TRIGGER IF EXISTS Fields_schema_version_delete;
+CREATE TRIGGER Fields_schema_version_delete AFTER DELETE ON Fields
+BEGIN
+    UPDATE SchemaVersion SET version = version + 1;
+END;
+
+DROP TRIGGER IF EXISTS FieldsToCategories_schema_version_insert;
+CREATE TRIGGER FieldsToCategories_schema_version_insert AFTER INSERT ON FieldsToCategories
+BEGIN
+    UPDATE SchemaVersion SET version = version + 1;
+END;
+
+DROP TRIGGER IF EXISTS FieldsToCategories_schema_version_update;
+CREATE TRIGGER FieldsToCategories_schema_version_update AFTER UPDATE ON FieldsToCategories
+BEGIN
+    UPDATE SchemaVersion SET version = version + 1;
+END;
+
+DROP TRIGGER IF EXISTS FieldsToCategories_schema_version_delete;
+CREATE TRIGGER FieldsToCategories_schema_version_delete AFTER DELETE ON FieldsToCategories
+BEGIN
+    UPDATE SchemaVersion SET version = version + 1;
+END;
@@ -1,13 +1,30 @@
+import itertools
+import logging
 import os
+import queue
 import sqlite3
-from typing import Sequence, Any
-from flask import current_app, has_app_context, has_request_context, request
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Sequence, Any
+from flask import current_app, g, has_app_context, has_request_context, request
+from app import image_index, migrations
 
 THIS_FOLDER = os.path.dirname(os.path.abspath(__file__))
 BACKEND_FOLDER = os.path.dirname(THIS_FOLDER)
 DEFAULT_DB_PATH = os.path.join(BACKEND_FOLDER, "database.db")
 DEFAULT_IMAGE_UPLOAD_FOLDER = os.path.join(BACKEND_FOLDER, "uploaded_images")
 
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("app.slow_queries")
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_CACHE_SIZE = -16000  # Negative values are in KiB, so this is ~16 MB of page cache per connection
+DEFAULT_MMAP_SIZE = 128 * 1024 * 1024
+DEFAULT_FETCH_BATCH_SIZE = 500
+DEFAULT_SLOW_QUERY_MS = 100
+N_SLOWEST_QUERIES = 3
+
 
 def _normalize_dataset_name(name: str) -> str:
     return name.strip().lower().replace(" ", "_")
@@ -23,85 +40,346 @@ def _get_selected_dataset_key() -> str | None:
     return _normalize_dataset_name(dataset_raw)
 
 
-def _get_dataset_config() -> dict[str, str] | None:
-    if not has_app_context():
-        return None
-
+def resolve_dataset(dataset_key: str | None = None) -> dict[str, str | None]:
+    """
+    Works out which database and upload folder to use for the given (normalized) dataset key, or the default dataset if it's None or unknown.
+    The returned "key" is None when the app isn't using dataset folders (e.g. in tests, where DATABASE is set directly).
+    The database path also serves as the dataset's key in the connection pools and caches.
+    """
     dataset_configs = current_app.config.get("DATASET_CONFIGS", {})
-    if not dataset_configs:
-        return None
+    if dataset_key not in dataset_configs:
+        dataset_key = current_app.config.get("DEFAULT_DATASET")
 
-    selected_dataset = _get_selected_dataset_key()
-    if selected_dataset and selected_dataset in dataset_configs:
-        return dataset_configs[selected_dataset]
-
-    default_dataset = current_app.config.get("DEFAULT_DATASET")
-    if default_dataset and default_dataset in dataset_configs:
-        return dataset_configs[default_dataset]
+    dataset_config = dataset_configs.get(dataset_key)
+    if dataset_config:
+        return {
+            "key": dataset_key,
+            "db_path": dataset_config["db_path"],
+            "image_upload_folder": dataset_config["image_upload_folder"],
+        }
+    return {
+        "key": None,
+        "db_path": current_app.config.get("DATABASE", DEFAULT_DB_PATH),
+        "image_upload_folder": current_app.config.get("IMAGE_UPLOAD_FOLDER", DEFAULT_IMAGE_UPLOAD_FOLDER),
+    }
+
+
+def get_active_dataset() -> dict[str, str | None]:
+    """
+    Returns the current request's dataset. It's resolved once per request by the before_request hook in create_app and kept in g.dataset,
+    so this is just an attribute lookup. Outside of a request, it's resolved on first use.
+    """
+    if not has_app_context():
+        return {"key": None, "db_path": DEFAULT_DB_PATH, "image_upload_folder": DEFAULT_IMAGE_UPLOAD_FOLDER}
 
-    return None
+    dataset = g.get("dataset")
+    if dataset is None:
+        dataset = g.dataset = resolve_dataset(_get_selected_dataset_key())
+    return dataset
 
 
 def get_active_database_path() -> str:
-    dataset_config = _get_dataset_config()
-    if dataset_config:
-        return dataset_config["db_path"]
-
-    if has_app_context():
-        return current_app.config.get("DATABASE", DEFAULT_DB_PATH)
-    return DEFAULT_DB_PATH
+    return get_active_dataset()["db_path"]
 
 
 def get_active_image_upload_folder() -> str:
-    dataset_config = _get_dataset_config()
-    if dataset_config:
-        return dataset_config["image_upload_folder"]
-
-    if has_app_context():
-        return current_app.config.get("IMAGE_UPLOAD_FOLDER", DEFAULT_IMAGE_UPLOAD_FOLDER)
-    return DEFAULT_IMAGE_UPLOAD_FOLDER
+    return get_active_dataset()["image_upload_folder"]
 
 
 def find_existing_image_folder(filename: str) -> str | None:
+    """
+    Returns the folder to serve an uploaded image from: the active dataset's folder if it has the file,
+    otherwise the first other dataset folder (or the fallback folder) that does. Returns None if none of them have it.
+    Files are looked up in image_index first, so usually no folder has to be checked on disk, and a file that isn't in any of them
+    is only looked for on disk once every image_index.MISS_TTL seconds.
+    """
     preferred_folder = get_active_image_upload_folder()
-    preferred_path = os.path.join(preferred_folder, filename)
-    if os.path.exists(preferred_path):
-        return preferred_folder
+    indexed_folders = image_index.folders_with_image(filename)
+    if indexed_folders:
+        return preferred_folder if preferred_folder in indexed_folders else indexed_folders[0]
 
-    if has_app_context():
-        for dataset in current_app.config.get("DATASET_CONFIGS", {}).values():
-            folder = dataset["image_upload_folder"]
-            if os.path.exists(os.path.join(folder, filename)):
-                return folder
+    # Not indexed, so most likely missing. Another process may have saved it, though, so check the folders themselves, and index
+    # the file if it turns up; a miss is remembered for a while, so a missing file isn't looked for on disk on every request.
+    if image_index.recently_missed(filename):
+        return None
+    for folder in get_image_upload_folders():
+        if os.path.exists(os.path.join(folder, filename)):
+            image_index.add_image(filename, folder)
+            return folder
+    image_index.record_miss(filename)
+    return None
 
-        fallback_folder = current_app.config.get("IMAGE_UPLOAD_FOLDER", DEFAULT_IMAGE_UPLOAD_FOLDER)
-        if os.path.exists(os.path.join(fallback_folder, filename)):
-            return fallback_folder
 
-    return None
+def get_image_upload_folders() -> list[str]:
+    """Returns every folder images can be served from, in the order find_existing_image_folder prefers them after the active dataset's"""
+    folders = [get_active_image_upload_folder()]
+    if has_app_context():
+        folders += [dataset["image_upload_folder"] for dataset in current_app.config.get("DATASET_CONFIGS", {}).values()]
+        folders.append(current_app.config.get("IMAGE_UPLOAD_FOLDER", DEFAULT_IMAGE_UPLOAD_FOLDER))
+    return list(dict.fromkeys(folders))
+
+
+class ConnectionPool:
+    """
+    A pool of reusable connections to a single SQLite database file.
+    Connections are opened lazily and handed back with release(); if the pool is already full, the extra connection is closed.
+    """
+
+    def __init__(self, db_path: str, max_size: int = DEFAULT_POOL_SIZE,
+                 cache_size: int = DEFAULT_CACHE_SIZE, mmap_size: int = DEFAULT_MMAP_SIZE):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.opened = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        with self._lock:
+            self.opened += 1
+        logger.debug("Opened pooled connection to %s", self.db_path)
+        return conn
 
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        with self._lock:
+            self.in_use += 1
+        return conn
 
-def get_connection():
+    def release(self, conn: sqlite3.Connection):
+        with self._lock:
+            self.in_use -= 1
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @property
+    def idle(self) -> int:
+        return self._idle.qsize()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Returns the connection pool for db_path, creating it on first use"""
+    pool = _pools.get(db_path)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            config = current_app.config if has_app_context() else {}
+            pool = ConnectionPool(
+                db_path,
+                max_size=config.get("DB_POOL_SIZE", DEFAULT_POOL_SIZE),
+                cache_size=config.get("DB_CACHE_SIZE", DEFAULT_CACHE_SIZE),
+                mmap_size=config.get("DB_MMAP_SIZE", DEFAULT_MMAP_SIZE),
+            )
+            _pools[db_path] = pool
+        return pool
+
+
+def get_pools() -> dict[str, ConnectionPool]:
+    """Returns every connection pool opened so far, by database path"""
+    with _pools_lock:
+        return dict(_pools)
+
+
+def close_pools():
+    """Closes every idle pooled connection. Connections that are checked out are closed when they're released."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Returns a connection to the active dataset's database.
+    Inside an app context, the connection is checked out of the dataset's pool once and reused until the context is torn down.
+    Outside an app context (e.g. when main.py initializes the database), a standalone connection is opened; the caller must close it.
+    """
     db_path = get_active_database_path()
-    print(f"[DB DEBUG] Attempting to connect to database: {db_path}")  # Debug
-    try:
+    if not has_app_context():
         conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row 
-        print("[DB DEBUG] Database connection established.")
+        conn.row_factory = sqlite3.Row
         return conn
-    except Exception as e:
-        print(f"[DB DEBUG] Database connection failed: {e}")
-        raise
+
+    if "db_connections" not in g:
+        g.db_connections = {}
+    conn = g.db_connections.get(db_path)
+    if conn is None:
+        conn = get_pool(db_path).acquire()
+        g.db_connections[db_path] = conn
+    return conn
+
+
+def release_connections(exception=None):
+    """Returns the connections checked out during this app context to their pools"""
+    connections = g.pop("db_connections", {})
+    for db_path, conn in connections.items():
+        pool = _pools.get(db_path)
+        if pool is not None:
+            pool.release(conn)
+        else:
+            conn.close()
+
+
+class QueryStats:
+    """The queries the helpers ran during one request: how many, their total time, and the slowest few as (seconds, query) pairs"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.slowest: list[tuple[float, str]] = []
+
+    def add(self, query: str, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        if len(self.slowest) < N_SLOWEST_QUERIES or seconds > self.slowest[-1][0]:
+            self.slowest.append((seconds, query))
+            self.slowest.sort(key=lambda entry: entry[0], reverse=True)
+            del self.slowest[N_SLOWEST_QUERIES:]
+
+    def server_timing(self) -> str:
+        """Formats the stats as a Server-Timing header: the total as "db", then the slowest queries as "sql-1", "sql-2", ..."""
+        metrics = [f'db;dur={self.total_seconds * 1000:.2f};desc="{self.count} queries"']
+        for i, (seconds, query) in enumerate(self.slowest, 1):
+            metrics.append(f'sql-{i};dur={seconds * 1000:.2f};desc="{_header_safe(query)}"')
+        return ", ".join(metrics)
+
+
+def _header_safe(query: str, max_length: int = 80) -> str:
+    text = " ".join(query.split())
+    if len(text) > max_length:
+        text = text[:max_length - 3] + "..."
+    return text.replace("\\", "\\\\").replace('"', '\\"').encode("ascii", "replace").decode()
+
+
+def get_query_stats() -> QueryStats | None:
+    """Returns the stats for the queries run so far in the current app context, or None if none were run"""
+    return g.get("query_stats") if has_app_context() else None
+
+
+@contextmanager
+def _timed(conn: sqlite3.Connection, query: str, params: Sequence[Any] | None = ()):
+    """Times the query run (and fetched) inside the block, and records it with _record_query"""
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_query(conn, query, params, time.perf_counter() - started_at)
+
+
+def _record_query(conn: sqlite3.Connection, query: str, params: Sequence[Any] | None, seconds: float):
+    """
+    Adds a query to the current request's stats. If it took more than SLOW_QUERY_MS, it's also written to the "app.slow_queries" log
+    with its EXPLAIN QUERY PLAN; params is what the plan is explained with (None skips the plan, e.g. when an executemany had no params).
+    """
+    threshold_ms = DEFAULT_SLOW_QUERY_MS
+    if has_app_context():
+        if "query_stats" not in g:
+            g.query_stats = QueryStats()
+        g.query_stats.add(query, seconds)
+        threshold_ms = current_app.config.get("SLOW_QUERY_MS", DEFAULT_SLOW_QUERY_MS)
+    if threshold_ms is not None and seconds * 1000 >= threshold_ms and slow_query_logger.isEnabledFor(logging.WARNING):
+        slow_query_logger.warning("Slow query", extra={
+            "query": " ".join(query.split()),
+            "params": params,
+            "query_ms": round(seconds * 1000, 2),
+            "plan": _explain(conn, query, params) if has_app_context() else None,
+        })
+
+
+def _explain(conn: sqlite3.Connection, query: str, params: Sequence[Any] | None) -> list[str] | None:
+    """Returns the EXPLAIN QUERY PLAN of the query, one line per step, indented by depth"""
+    if params is None:
+        return None
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    except sqlite3.Error as e:
+        return [f"(couldn't explain: {e})"]
+    depths = {0: -1}
+    plan = []
+    for step_id, parent_id, _, detail in rows:
+        depths[step_id] = depths.get(parent_id, -1) + 1
+        plan.append("  " * depths[step_id] + detail)
+    return plan
+
+
+def add_query_stats_headers(response):
+    """
+    Adds the request's query count and SQL time to the response, as X-Query-Count and Server-Timing headers.
+    Streamed responses are left without them, since their queries run after the headers are sent; the request's log line has their counts.
+    """
+    if response.is_streamed:
+        return response
+    stats = get_query_stats() or QueryStats()
+    response.headers["X-Query-Count"] = str(stats.count)
+    response.headers.add("Server-Timing", stats.server_timing())
+    return response
+
+
+def init_app(app):
+    app.after_request(add_query_stats_headers)
+    app.teardown_appcontext(release_connections)
+
+
+@contextmanager
+def _standalone_connection(db_path: str):
+    """Yields an unpooled connection to db_path and closes it afterwards"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def _connection():
+    """Yields a connection, closing it afterwards only if it isn't owned by the pool"""
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        if not has_app_context():
+            conn.close()
 
 
 def insert(query: str, params: Sequence[Any] = ()) -> int:
     """Executes an INSERT query and returns the last inserted row ID"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    last_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with _connection() as conn:
+        cursor = conn.cursor()
+        with _timed(conn, query, params):
+            cursor.execute(query, params)
+        last_id = cursor.lastrowid
+        _commit_unless_in_transaction(conn)
     if last_id is None:
         raise Exception("Failed to insert row")
     return last_id
@@ -110,12 +388,27 @@ def insert(query: str, params: Sequence[Any] = ()) -> int:
 def mutate(query: str, params: Sequence[Any] = ()) -> int:
     """Executes a mutating query (UPDATE or DELETE) and returns the number of affected rows.
     This also works with INSERT, but if you want to get the last inserted row ID, you should use the insert function instead."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    n_rows_affected = cursor.rowcount
-    conn.commit()
-    conn.close()
+    with _connection() as conn:
+        cursor = conn.cursor()
+        with _timed(conn, query, params):
+            cursor.execute(query, params)
+        n_rows_affected = cursor.rowcount
+        _commit_unless_in_transaction(conn)
+    return n_rows_affected
+
+
+def mutate_many(query: str, params_seq: Iterable[Sequence[Any]]) -> int:
+    """Executes a mutating query once for each set of params (with executemany) and returns the total number of affected rows.
+    Use this instead of calling insert/mutate in a loop, e.g. to insert all of a wildlife's field values at once."""
+    # Keep the first set of params, to explain the query with if it's slow
+    params_iter = iter(params_seq)
+    first_params = next(params_iter, None)
+    with _connection() as conn:
+        cursor = conn.cursor()
+        with _timed(conn, query, first_params):
+            cursor.executemany(query, itertools.chain([first_params], params_iter) if first_params is not None else [])
+        n_rows_affected = cursor.rowcount
+        _commit_unless_in_transaction(conn)
     return n_rows_affected
 
 
@@ -123,38 +416,205 @@ update = mutate
 delete = mutate
 
 
+@contextmanager
+def transaction():
+    """
+    Runs every helper call inside the `with` block on the same connection, as one transaction with a single commit at the end.
+    If the block raises, everything it did is rolled back. Nested transaction() blocks join the outermost one.
+    Needs an app context, since the connection is shared through g.
+
+    Example:
+    with db_helpers.transaction():
+        wildlife_id = db_helpers.insert("INSERT INTO Wildlife ...", [...])
+        db_helpers.mutate_many("INSERT INTO FieldValues ...", [...])
+    """
+    conn = get_connection()
+    depth = g.get("db_transaction_depth", 0)
+    if depth == 0 and not conn.in_transaction:
+        # Take the write lock up front, rather than failing halfway through if another writer got it first
+        conn.execute("BEGIN IMMEDIATE")
+    g.db_transaction_depth = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        g.db_transaction_depth = depth
+        if depth == 0:
+            conn.rollback()
+        raise
+    g.db_transaction_depth = depth
+    if depth == 0:
+        conn.commit()
+
+
+@contextmanager
+def snapshot():
+    """
+    Runs every read inside the `with` block against the same snapshot of the database, so they all see a consistent state
+    even if other requests write in the meantime (with WAL, those writes aren't blocked). Doesn't take the write lock.
+    Needs an app context, and mustn't be used inside transaction().
+    """
+    conn = get_connection()
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+
+
+def _commit_unless_in_transaction(conn: sqlite3.Connection):
+    if not (has_app_context() and g.get("db_transaction_depth", 0)):
+        conn.commit()
+
+
 def select_multiple(query: str, params: Sequence[Any] = ()) -> list[dict[str, Any]]:
     """Executes a SELECT query and returns the results as a list of rows (dicts)"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    results = cursor.fetchall()
-    conn.close()
+    with _connection() as conn:
+        cursor = conn.cursor()
+        with _timed(conn, query, params):
+            cursor.execute(query, params)
+            results = cursor.fetchall()
     return [dict(row) for row in results]
 
 
+def select_iter(query: str, params: Sequence[Any] = (), batch_size: int = DEFAULT_FETCH_BATCH_SIZE) -> Iterator[dict[str, Any]]:
+    """Executes a SELECT query and yields the results one row (dict) at a time.
+    Rows are fetched from the cursor in batches, so unlike select_multiple the whole result set is never held in memory."""
+    with _connection() as conn:
+        cursor = conn.cursor()
+        # Only the time spent in SQLite counts as the query's time, not the time the caller spends between batches
+        seconds = 0.0
+        try:
+            started_at = time.perf_counter()
+            cursor.execute(query, params)
+            rows = cursor.fetchmany(batch_size)
+            seconds += time.perf_counter() - started_at
+            while rows:
+                for row in rows:
+                    yield dict(row)
+                started_at = time.perf_counter()
+                rows = cursor.fetchmany(batch_size)
+                seconds += time.perf_counter() - started_at
+        finally:
+            cursor.close()
+            _record_query(conn, query, params, seconds)
+
+
 def select_one(query: str, params: Sequence[Any] = ()) -> dict[str, Any] | None:
     """Executes a SELECT query and returns the first result as a dict"""
-    print(f"[DB DEBUG] Executing SELECT ONE: {query} | Params: {params}")
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    result = cursor.fetchone()
-    conn.close()
-    print(f"[DB DEBUG] Result: {result}")
+    logger.debug("SELECT ONE: %s | params: %s", query, params)
+    with _connection() as conn:
+        cursor = conn.cursor()
+        with _timed(conn, query, params):
+            cursor.execute(query, params)
+            result = cursor.fetchone()
     if result:
         return dict(result)
     else:
         return None
 
 
-def init_db():
-    print("[DB DEBUG] Initializing database...")
+def rebuild_search_index(conn: sqlite3.Connection):
+    """Repopulates the full-text search tables (WildlifeNameSearch and FieldValueSearch) from Wildlife and FieldValues.
+    The triggers in create.sql keep them in sync afterwards; this is only needed for databases created before the search tables existed."""
+    conn.execute("DELETE FROM WildlifeNameSearch")
+    conn.execute("DELETE FROM FieldValueSearch")
+    conn.execute("INSERT INTO WildlifeNameSearch (rowid, name, scientific_name) SELECT id, name, scientific_name FROM Wildlife")
+    conn.execute("""
+        INSERT INTO FieldValueSearch (rowid, value, wildlife_id, field_id)
+        SELECT (fv.wildlife_id << 32) | fv.field_id, fv.value, fv.wildlife_id, fv.field_id
+        FROM FieldValues fv JOIN Fields f ON f.id = fv.field_id
+        WHERE f.type = 'TEXT'
+    """)
+
+
+def rebuild_integer_field_values(conn: sqlite3.Connection):
+    """Repopulates IntegerFieldValues from the INTEGER fields in FieldValues.
+    Like rebuild_search_index, this is only needed for databases created before the table existed."""
+    conn.execute("DELETE FROM IntegerFieldValues")
+    conn.execute("""
+        INSERT INTO IntegerFieldValues (wildlife_id, field_id, value)
+        SELECT fv.wildlife_id, fv.field_id, CAST(fv.value AS INTEGER)
+        FROM FieldValues fv JOIN Fields f ON f.id = fv.field_id
+        WHERE f.type = 'INTEGER'
+    """)
+
+
+def rebuild_category_closure(conn: sqlite3.Connection):
+    """Repopulates CategoryClosure from the parent_id links in Categories.
+    Like rebuild_search_index, this is only needed for databases created before the table existed."""
+    conn.execute("DELETE FROM CategoryClosure")
+    conn.execute("""
+        WITH RECURSIVE closure(ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM Categories
+            UNION ALL
+            SELECT closure.ancestor_id, c.id, closure.depth + 1 FROM Categories c JOIN closure ON c.parent_id = closure.descendant_id
+        )
+        INSERT INTO CategoryClosure (ancestor_id, descendant_id, depth) SELECT ancestor_id, descendant_id, depth FROM closure
+    """)
+
+
+@contextmanager
+def bulk_load(first_wildlife_id: int):
+    """For bulk imports, inside transaction(): while the block runs, the insert triggers in create.sql skip new Wildlife and FieldValues rows,
+    and on the way out the search tables and IntegerFieldValues are filled in for every wildlife with an ID of at least first_wildlife_id,
+    with one statement each. Indexing row by row from the triggers is several times slower, mostly because FTS5 flushes at every trigger.
+    Every wildlife inserted in the block must get an ID of at least first_wildlife_id, and only inserts are covered; updates and deletes still go through the triggers."""
     conn = get_connection()
-    cursor = conn.cursor()
+    conn.execute("INSERT INTO BulkLoad DEFAULT VALUES")
+    yield conn
+    conn.execute("DELETE FROM BulkLoad")
+    for query in _BULK_LOAD_BACKFILLS:
+        with _timed(conn, query, [first_wildlife_id]):
+            conn.execute(query, [first_wildlife_id])
+
+
+_BULK_LOAD_BACKFILLS = [
+    """
+    INSERT INTO WildlifeNameSearch (rowid, name, scientific_name)
+    SELECT id, name, scientific_name FROM Wildlife WHERE id >= ?
+    """,
+    """
+    INSERT INTO FieldValueSearch (rowid, value, wildlife_id, field_id)
+    SELECT (fv.wildlife_id << 32) | fv.field_id, fv.value, fv.wildlife_id, fv.field_id
+    FROM FieldValues fv JOIN Fields f ON f.id = fv.field_id
+    WHERE fv.wildlife_id >= ? AND f.type = 'TEXT'
+    """,
+    """
+    INSERT INTO IntegerFieldValues (wildlife_id, field_id, value)
+    SELECT fv.wildlife_id, fv.field_id, CAST(fv.value AS INTEGER)
+    FROM FieldValues fv JOIN Fields f ON f.id = fv.field_id
+    WHERE fv.wildlife_id >= ? AND f.type = 'INTEGER'
+    """,
+]
+
+
+# Tables derived from other tables by triggers, with a query telling whether their source has any rows, and how to rebuild them
+_DERIVED_TABLES = [
+    ("WildlifeNameSearch", "SELECT EXISTS(SELECT 1 FROM Wildlife)", rebuild_search_index),
+    ("IntegerFieldValues",
+     "SELECT EXISTS(SELECT 1 FROM FieldValues fv JOIN Fields f ON f.id = fv.field_id WHERE f.type = 'INTEGER')",
+     rebuild_integer_field_values),
+    ("CategoryClosure", "SELECT EXISTS(SELECT 1 FROM Categories)", rebuild_category_closure),
+]
+
+
+def init_db(db_path: str | None = None):
+    """
+    Creates any missing tables in the given database, or in the active database if db_path isn't provided,
+    then applies any migrations it hasn't had yet (see app/migrations). create_app runs this for every dataset at startup.
+    """
+    logger.info("Initializing database %s", db_path or get_active_database_path())
     with open(os.path.join(THIS_FOLDER, "create.sql"), "r") as sql_file:
         sql_script = sql_file.read()
-    cursor.executescript(sql_script)
-    conn.commit()
-    conn.close()
-    print("[DB DEBUG] Database initialized!")
+    with (_standalone_connection(db_path) if db_path else _connection()) as conn:
+        cursor = conn.cursor()
+        cursor.executescript(sql_script)
+        migrations.run_migrations(conn)
+        # Fill in derived tables that were added after this database was created
+        for table, source_has_rows_query, rebuild in _DERIVED_TABLES:
+            table_empty = cursor.execute(f"SELECT NOT EXISTS(SELECT 1 FROM {table})").fetchone()[0]
+            if table_empty and cursor.execute(source_has_rows_query).fetchone()[0]:
+                logger.info("Building %s", table)
+                rebuild(conn)
+        conn.commit()
+    logger.debug("Database initialized")
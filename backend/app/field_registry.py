@@ -0,0 +1,30 @@
+from dataclasses import dataclass
+
+from app import db_helpers
+from app.cache import DatasetCache
+
+
+@dataclass(frozen=True)
+class FieldRegistry:
+    """
+    The fields of a dataset. by_id and by_name hold the same field dicts ({"id", "name", "type"}), which callers must treat as read-only.
+    Which fields a category has is looked up in the database instead (see utils.get_category_fields).
+    """
+    by_id: dict[int, dict]
+    by_name: dict[str, dict]
+
+
+def build_field_registry() -> FieldRegistry:
+    fields = db_helpers.select_multiple("SELECT id, name, type FROM Fields ORDER BY id")
+    return FieldRegistry(
+        by_id={field["id"]: field for field in fields},
+        by_name={field["name"]: field for field in fields},
+    )
+
+
+field_registry_cache = DatasetCache("field_registry", build_field_registry)
+
+
+def get_field_registry() -> FieldRegistry:
+    """Returns the active dataset's fields, loading them only if fields changed since they were last loaded"""
+    return field_registry_cache.get()
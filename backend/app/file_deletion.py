@@ -0,0 +1,113 @@
+"""
+Deletes files (uploaded images) in the background, so delete routes can return as soon as their rows are gone.
+
+Routes call queue_file_deletions inside the transaction that deletes the rows, which records the files in PendingFileDeletions,
+then start_file_deletions once it has committed. A small thread pool then removes the files, retrying failures with a growing delay.
+Because the queue is a table, files queued before a crash or restart are picked up again when create_app calls start_file_deletions at startup.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import db_helpers, image_index
+
+FILE_DELETION_WORKERS = 2
+FILE_DELETION_BATCH_SIZE = 500
+FILE_DELETION_MAX_ATTEMPTS = 5
+FILE_DELETION_RETRY_DELAY = 2.0  # Seconds before the first retry; it doubles after each failed attempt
+
+logger = logging.getLogger(__name__)
+
+_executor: ThreadPoolExecutor | None = None
+_lock = threading.Condition()
+# Databases with a drain queued or running, and those that got new deletions while their drain was running
+_draining: set[str] = set()
+_drain_again: set[str] = set()
+
+
+def queue_file_deletions(file_paths):
+    """Records files to delete once the current transaction commits. Must be called inside db_helpers.transaction()."""
+    db_helpers.mutate_many("INSERT INTO PendingFileDeletions (file_path) VALUES (?)", [(path,) for path in file_paths])
+
+
+def start_file_deletions(db_path: str | None = None):
+    """Wakes the background workers to delete the files queued for db_path (the active dataset's database by default)"""
+    db_path = db_path or db_helpers.get_active_database_path()
+    global _executor
+    with _lock:
+        if db_path in _draining:
+            _drain_again.add(db_path)
+            return
+        _draining.add(db_path)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=FILE_DELETION_WORKERS, thread_name_prefix="file-deletion")
+    _executor.submit(_drain, db_path)
+
+
+def wait_for_file_deletions(timeout: float | None = None) -> bool:
+    """Blocks until no deletions are in progress (retries scheduled for later don't count). Returns False if the timeout ran out first."""
+    with _lock:
+        return _lock.wait_for(lambda: not _draining, timeout)
+
+
+def _drain(db_path: str):
+    next_retry_at = None
+    try:
+        while True:
+            with _lock:
+                _drain_again.discard(db_path)
+            next_retry_at = _delete_due_files(db_path)
+            with _lock:
+                if db_path not in _drain_again:
+                    break
+    except Exception:
+        logger.exception("Failed to process file deletions for %s", db_path)
+    finally:
+        with _lock:
+            _draining.discard(db_path)
+            _lock.notify_all()
+
+    if next_retry_at is not None:
+        timer = threading.Timer(max(next_retry_at - time.time(), 0), start_file_deletions, [db_path])
+        timer.daemon = True
+        timer.start()
+
+
+def _delete_due_files(db_path: str) -> float | None:
+    """Deletes every file that's due, in batches. Returns when the earliest retry is due, or None if nothing is left to retry."""
+    pool = db_helpers.get_pool(db_path)
+    conn = pool.acquire()
+    try:
+        while True:
+            rows = conn.execute(
+                "SELECT id, file_path, attempts FROM PendingFileDeletions WHERE attempts < ? AND next_attempt_at <= ? LIMIT ?",
+                [FILE_DELETION_MAX_ATTEMPTS, time.time(), FILE_DELETION_BATCH_SIZE],
+            ).fetchall()
+            if not rows:
+                break
+
+            done, failed = [], []
+            for row in rows:
+                try:
+                    os.remove(row["file_path"])
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    attempts = row["attempts"] + 1
+                    if attempts >= FILE_DELETION_MAX_ATTEMPTS:
+                        logger.error("Giving up on deleting %s after %d attempts: %s", row["file_path"], attempts, e)
+                    failed.append((attempts, time.time() + FILE_DELETION_RETRY_DELAY * 2 ** (attempts - 1), str(e), row["id"]))
+                    continue
+                done.append((row["id"],))
+                image_index.remove_image(os.path.basename(row["file_path"]), os.path.dirname(row["file_path"]))
+
+            conn.executemany("DELETE FROM PendingFileDeletions WHERE id = ?", done)
+            conn.executemany("UPDATE PendingFileDeletions SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?", failed)
+            conn.commit()
+
+        return conn.execute("SELECT MIN(next_attempt_at) FROM PendingFileDeletions WHERE attempts < ?",
+                            [FILE_DELETION_MAX_ATTEMPTS]).fetchone()[0]
+    finally:
+        pool.release(conn)
@@ -0,0 +1,126 @@
+"""
+Deletes orphaned images: files in an upload folder that no database row refers to any more.
+They're left behind when edit-wildlife replaces an IMAGE field's file, when a request fails after saving its files, and so on.
+
+Folders are read with os.scandir a batch of entries at a time, and each batch is checked against the database with indexed lookups,
+so memory use stays the same however many files a folder has. Run it with `flask --app main gc-images`, or let create_app schedule it
+every IMAGE_GC_INTERVAL seconds.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+
+from app import db_helpers, image_index
+
+logger = logging.getLogger(__name__)
+
+# The reference check binds each filename twice, so this keeps a lookup within the 999 variables older SQLite builds allow
+IMAGE_GC_BATCH_SIZE = 250
+# Files newer than this (in seconds) are never deleted, since create-wildlife and edit-wildlife save files before inserting the rows that refer to them
+IMAGE_GC_MIN_AGE = 60 * 60
+
+_REFERENCED_FILENAMES_QUERY = """
+    SELECT image_path FROM Images WHERE image_path IN ({placeholders})
+    UNION
+    SELECT value FROM FieldValues
+    WHERE field_id IN (SELECT id FROM Fields WHERE type = 'IMAGE') AND value IN ({placeholders})
+"""
+
+
+def get_image_folders(app) -> tuple[list[str], list[str]]:
+    """
+    Returns the app's upload folders, and the databases whose rows may refer to files in them. With dataset folders,
+    IMAGE_UPLOAD_FOLDER is scanned too, since files saved there before datasets were set up can still be served to any dataset.
+    """
+    datasets = app.config.get("DATASET_CONFIGS") or {}
+    if datasets:
+        folders = [dataset["image_upload_folder"] for dataset in datasets.values()] + [app.config["IMAGE_UPLOAD_FOLDER"]]
+        return list(dict.fromkeys(folders)), [dataset["db_path"] for dataset in datasets.values()]
+    return [app.config["IMAGE_UPLOAD_FOLDER"]], [app.config["DATABASE"]]
+
+
+def collect_orphan_images(upload_folder: str, db_paths: list[str], dry_run: bool = False,
+                          min_age: float = IMAGE_GC_MIN_AGE, batch_size: int = IMAGE_GC_BATCH_SIZE) -> dict[str, int]:
+    """
+    Deletes the files in upload_folder that none of the databases refer to (as an Images row or an IMAGE field value),
+    skipping hidden files and files modified in the last min_age seconds. Every database is checked, not just the folder's own dataset,
+    because images are served from whichever dataset's folder has the file. With dry_run, only counts what would be deleted.
+    Returns {"scanned", "orphaned", "deleted", "bytes_freed"}.
+    """
+    stats = {"scanned": 0, "orphaned": 0, "deleted": 0, "bytes_freed": 0}
+    if not os.path.isdir(upload_folder):
+        return stats
+
+    cutoff = time.time() - min_age
+    with os.scandir(upload_folder) as entries:
+        candidates = (
+            entry for entry in entries
+            if not entry.name.startswith(".") and entry.is_file(follow_symlinks=False)
+        )
+        while batch := list(itertools.islice(candidates, batch_size)):
+            stats["scanned"] += len(batch)
+            old_entries = {}
+            for entry in batch:
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    # Deleted since it was listed, by a request or the file deletion queue
+                    continue
+                if stat.st_mtime < cutoff:
+                    old_entries[entry.name] = (entry, stat.st_size)
+            orphans = set(old_entries) - _referenced_filenames(db_paths, list(old_entries))
+            stats["orphaned"] += len(orphans)
+            if dry_run:
+                continue
+            for filename in orphans:
+                entry, size = old_entries[filename]
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    logger.warning("Couldn't delete orphaned image %s: %s", entry.path, e)
+                    continue
+                image_index.remove_image(filename, upload_folder)
+                stats["deleted"] += 1
+                stats["bytes_freed"] += size
+    return stats
+
+
+def _referenced_filenames(db_paths: list[str], filenames: list[str]) -> set[str]:
+    referenced = set()
+    for db_path in db_paths:
+        pool = db_helpers.get_pool(db_path)
+        conn = pool.acquire()
+        try:
+            # Callers may pass a batch_size bigger than IMAGE_GC_BATCH_SIZE, so look up at most that many filenames at a time
+            for start in range(0, len(filenames), IMAGE_GC_BATCH_SIZE):
+                chunk = filenames[start:start + IMAGE_GC_BATCH_SIZE]
+                query = _REFERENCED_FILENAMES_QUERY.format(placeholders=",".join("?" for _ in chunk))
+                referenced.update(row[0] for row in conn.execute(query, chunk + chunk))
+        finally:
+            pool.release(conn)
+    return referenced
+
+
+def collect_all_orphan_images(app, dry_run: bool = False, min_age: float = IMAGE_GC_MIN_AGE) -> dict[str, dict[str, int]]:
+    """Runs collect_orphan_images on every upload folder of the app, and returns the stats for each folder"""
+    upload_folders, db_paths = get_image_folders(app)
+    return {folder: collect_orphan_images(folder, db_paths, dry_run=dry_run, min_age=min_age) for folder in upload_folders}
+
+
+def schedule_image_gc(app, interval: float):
+    """Runs collect_all_orphan_images in a background thread every `interval` seconds, starting one interval from now"""
+    def run():
+        try:
+            for folder, stats in collect_all_orphan_images(app).items():
+                logger.info("Collected orphaned images in %s", folder, extra=stats)
+        except Exception:
+            logger.exception("Orphaned image collection failed")
+        schedule_image_gc(app, interval)
+
+    timer = threading.Timer(interval, run)
+    timer.daemon = True
+    timer.start()
@@ -0,0 +1,91 @@
+"""
+An in-memory index from image filename to the upload folders that hold it, so serving an image doesn't have to check every folder on disk.
+
+create_app builds it at startup; save_file adds new files, and the background file deletion and the orphan image collector remove the ones they delete.
+Files that get into a folder some other way (by hand, or from another server process) aren't indexed, so find_existing_image_folder
+falls back to checking the folders when a lookup misses, and indexes what it finds. Filenames it didn't find are remembered for
+MISS_TTL seconds (up to MAX_MISSES of them), so repeated requests for a missing file don't check every folder each time.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MISS_TTL = 60
+MAX_MISSES = 10_000
+
+_folders_by_filename: dict[str, tuple[str, ...]] = {}
+# Filename -> when the folders were last checked for it and it wasn't there, oldest first
+_misses: OrderedDict[str, float] = OrderedDict()
+# One shared (folder,) tuple per folder, so the usual one-folder entries don't each need their own tuple
+_single_folders: dict[str, tuple[str]] = {}
+_lock = threading.Lock()
+
+
+def build_image_index(folders: list[str]):
+    """Replaces the index with the files currently in the folders. A file found in several folders lists them in the given order."""
+    index: dict[str, tuple[str, ...]] = {}
+    for folder in folders:
+        if not os.path.isdir(folder):
+            continue
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                existing = index.get(entry.name)
+                index[entry.name] = existing + (folder,) if existing else _single_folder(folder)
+    global _folders_by_filename
+    with _lock:
+        _folders_by_filename = index
+        _misses.clear()
+
+
+def folders_with_image(filename: str) -> tuple[str, ...]:
+    """Returns the folders that hold the file, or () if it isn't indexed"""
+    return _folders_by_filename.get(filename, ())
+
+
+def add_image(filename: str, folder: str):
+    with _lock:
+        _misses.pop(filename, None)
+        existing = _folders_by_filename.get(filename)
+        if not existing:
+            _folders_by_filename[filename] = _single_folder(folder)
+        elif folder not in existing:
+            _folders_by_filename[filename] = existing + (folder,)
+
+
+def remove_image(filename: str, folder: str):
+    with _lock:
+        remaining = tuple(f for f in _folders_by_filename.get(filename, ()) if f != folder)
+        if remaining:
+            _folders_by_filename[filename] = remaining
+        else:
+            _folders_by_filename.pop(filename, None)
+
+
+def recently_missed(filename: str) -> bool:
+    """Returns True if the folders were checked for the file in the last MISS_TTL seconds and it wasn't in any of them"""
+    with _lock:
+        missed_at = _misses.get(filename)
+        if missed_at is None:
+            return False
+        if time.monotonic() - missed_at < MISS_TTL:
+            return True
+        del _misses[filename]
+        return False
+
+
+def record_miss(filename: str):
+    with _lock:
+        _misses.pop(filename, None)
+        _misses[filename] = time.monotonic()
+        while len(_misses) > MAX_MISSES:
+            _misses.popitem(last=False)
+
+
+def _single_folder(folder: str) -> tuple[str]:
+    single = _single_folders.get(folder)
+    if single is None:
+        single = _single_folders[folder] = (folder,)
+    return single
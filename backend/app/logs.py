@@ -0,0 +1,114 @@
+"""
+Leveled, structured logging for the backend.
+
+Modules log through the standard library, with `logger = logging.getLogger(__name__)`. Everything under the "app" logger is written
+as JSON lines, one object per record, and records logged during a request automatically get its request_id, dataset, and duration_ms
+(the time since the request started). Each request also ends with one "request" line at INFO level, with its method, path and status,
+and the number of queries it ran and their total time (query_count and sql_ms; see db_helpers.QueryStats). For a streamed response,
+that line is written once the body has been sent, so it counts the queries run while streaming too.
+
+Debug output is off unless LOG_LEVEL is DEBUG. Pass values as %-style arguments (logger.debug("Ran %s", query)) rather than
+f-strings, so that when a level is off, its messages are never formatted; guard anything more expensive with logger.isEnabledFor.
+"""
+import json
+import logging
+import sys
+import time
+import uuid
+
+from flask import g, has_request_context, request
+
+APP_LOGGER_NAME = "app"
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Attributes every LogRecord has; anything else on a record came from `extra` and is written out as a field
+_STANDARD_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+logger = logging.getLogger(__name__)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as a single-line JSON object"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds the current request's ID, dataset and elapsed time to records logged during a request"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if has_request_context():
+            record.request_id = g.get("request_id")
+            dataset = g.get("dataset")
+            record.dataset = dataset["key"] if dataset else None
+            started_at = g.get("request_started_at")
+            if started_at is not None and not hasattr(record, "duration_ms"):
+                record.duration_ms = round((time.perf_counter() - started_at) * 1000, 2)
+        return True
+
+
+_handler: logging.Handler | None = None
+
+
+def configure_logging(level: str | int = "INFO", stream=None):
+    """Sends the "app" loggers' records at or above level to stream (stderr by default) as JSON lines. Safe to call more than once."""
+    global _handler
+    app_logger = logging.getLogger(APP_LOGGER_NAME)
+    if _handler is not None:
+        app_logger.removeHandler(_handler)
+    _handler = logging.StreamHandler(stream or sys.stderr)
+    _handler.setFormatter(JsonFormatter())
+    # A handler's filters only run for records that pass the level check, so disabled levels cost nothing here
+    _handler.addFilter(RequestContextFilter())
+    app_logger.addHandler(_handler)
+    app_logger.setLevel(level.upper() if isinstance(level, str) else level)
+    app_logger.propagate = False
+
+
+def init_app(app):
+    """Configures logging from LOG_LEVEL, and gives every request an ID (taken from its X-Request-ID header if it has one)"""
+    configure_logging(app.config.get("LOG_LEVEL", "INFO"))
+
+    @app.before_request
+    def start_request_log():
+        g.request_started_at = time.perf_counter()
+        g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+
+    @app.after_request
+    def finish_request_log(response):
+        response.headers[REQUEST_ID_HEADER] = g.get("request_id", "")
+        extra = {"method": request.method, "path": request.path, "status": response.status_code}
+        if not response.is_streamed:
+            _log_request(g, extra)
+            return response
+
+        # The body's queries run while it's sent, after this hook, and outside the request context once it's done,
+        # so hold on to the request's g and write the line from there
+        request_g = g._get_current_object()
+        dataset = request_g.get("dataset")
+        extra.update(request_id=request_g.get("request_id"), dataset=dataset["key"] if dataset else None)
+        response.call_on_close(lambda: _log_request(request_g, extra))
+        return response
+
+
+def _log_request(request_g, extra: dict):
+    """Writes a request's "request" line, with the queries it has run so far"""
+    query_stats = request_g.get("query_stats")
+    if query_stats is not None:
+        extra.update(query_count=query_stats.count, sql_ms=round(query_stats.total_seconds * 1000, 2))
+    started_at = request_g.get("request_started_at")
+    if started_at is not None:
+        extra["duration_ms"] = round((time.perf_counter() - started_at) * 1000, 2)
+    logger.info("request", extra=extra)
@@ -0,0 +1,228 @@
+"""
+Metrics for monitoring, served in the Prometheus text format at GET /api/metrics/.
+
+Request counts and latency histograms are kept in memory per route (Flask endpoint, e.g. "wildlife.get_wildlife"), so each process
+reports its own; when running several worker processes, scrape each of them or sum them in Prometheus. Pool, cache and dataset
+metrics are read when the endpoint is scraped. Latency is measured up to when the response is returned, so for streamed responses
+it doesn't include the streaming.
+
+Example queries:
+histogram_quantile(0.99, sum by (endpoint, le) (rate(http_request_duration_seconds_bucket[5m])))
+rate(app_db_queries_total[5m]) / rate(http_request_duration_seconds_count[5m])
+"""
+import bisect
+import os
+import threading
+import time
+
+from flask import Response, current_app, g, request
+
+from app import db_helpers
+from app.cache import get_caches
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# In seconds; the same as the Prometheus client libraries' defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DATASET_TABLES = ("Wildlife", "Categories", "Fields", "FieldValues", "Images", "PendingFileDeletions")
+# Requests that didn't match a route are all counted under this endpoint, so stray URLs can't create new series
+UNMATCHED_ENDPOINT = "unmatched"
+
+
+class Histogram:
+    """Counts observations into buckets; counts[i] is the number that were <= buckets[i] but above the previous bucket"""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one is for observations above every bucket
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+_lock = threading.Lock()
+_request_counts: dict[tuple[str, str, int], int] = {}  # (method, endpoint, status) -> count
+_latencies: dict[str, Histogram] = {}
+_query_totals: dict[str, list] = {}  # endpoint -> [queries, seconds]
+
+
+def record_request(method: str, endpoint: str, status: int, seconds: float, query_stats: db_helpers.QueryStats | None = None):
+    with _lock:
+        key = (method, endpoint, status)
+        _request_counts[key] = _request_counts.get(key, 0) + 1
+        histogram = _latencies.get(endpoint)
+        if histogram is None:
+            histogram = _latencies[endpoint] = Histogram()
+        histogram.observe(seconds)
+        if query_stats is not None:
+            totals = _query_totals.setdefault(endpoint, [0, 0.0])
+            totals[0] += query_stats.count
+            totals[1] += query_stats.total_seconds
+
+
+def reset():
+    """Forgets every request recorded so far"""
+    with _lock:
+        _request_counts.clear()
+        _latencies.clear()
+        _query_totals.clear()
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Writer:
+    def __init__(self):
+        self.lines: list[str] = []
+
+    def metric(self, name: str, metric_type: str, help_text: str, samples):
+        """Writes a metric's HELP and TYPE lines, then its samples, given as (labels, value) or (suffix, labels, value)"""
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {metric_type}")
+        for sample in samples:
+            suffix, labels, value = sample if len(sample) == 3 else ("", *sample)
+            self.lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def _histogram_samples(histograms: dict[str, Histogram]):
+    for endpoint, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+            cumulative += count
+            yield "_bucket", {"endpoint": endpoint, "le": _format_value(float(bound))}, cumulative
+        yield "_sum", {"endpoint": endpoint}, histogram.sum
+        yield "_count", {"endpoint": endpoint}, histogram.count
+
+
+def _get_datasets() -> dict[str, str]:
+    """Returns the database path of every dataset, by dataset key ("default" when the app isn't using dataset folders)"""
+    dataset_configs = current_app.config.get("DATASET_CONFIGS") or {}
+    if dataset_configs:
+        return {key: dataset["db_path"] for key, dataset in dataset_configs.items()}
+    return {"default": current_app.config["DATABASE"]}
+
+
+def _dataset_stats(db_path: str) -> tuple[int, dict[str, int]]:
+    """
+    Returns the size of the database on disk (including its write-ahead log), and roughly how many rows each of DATASET_TABLES has.
+    The row counts are each table's highest rowid, which is one lookup at the end of the table rather than a scan of all of it;
+    it's exact until rows are deleted, after which it overcounts.
+    """
+    size = sum(os.path.getsize(path) for path in (db_path, db_path + "-wal") if os.path.exists(path))
+    pool = db_helpers.get_pool(db_path)
+    conn = pool.acquire()
+    try:
+        row_counts = {table: conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0] for table in DATASET_TABLES}
+    finally:
+        pool.release(conn)
+    return size, row_counts
+
+
+def render_metrics() -> str:
+    """Returns every metric in the Prometheus text format"""
+    with _lock:
+        request_counts = dict(_request_counts)
+        latencies = {endpoint: _copy_histogram(histogram) for endpoint, histogram in _latencies.items()}
+        query_totals = {endpoint: tuple(totals) for endpoint, totals in _query_totals.items()}
+
+    writer = _Writer()
+    writer.metric("http_requests_total", "counter", "Requests handled, by method, route and status.", [
+        ({"method": method, "endpoint": endpoint, "status": status}, count)
+        for (method, endpoint, status), count in sorted(request_counts.items())
+    ])
+    writer.metric("http_request_duration_seconds", "histogram", "Time taken to handle requests, by route.", _histogram_samples(latencies))
+    writer.metric("app_db_queries_total", "counter", "SQL statements run by requests, by route.", [
+        ({"endpoint": endpoint}, queries) for endpoint, (queries, _) in sorted(query_totals.items())
+    ])
+    writer.metric("app_db_query_seconds_total", "counter", "Time requests spent running SQL statements, by route.", [
+        ({"endpoint": endpoint}, seconds) for endpoint, (_, seconds) in sorted(query_totals.items())
+    ])
+
+    pools = sorted(db_helpers.get_pools().items())
+    writer.metric("app_db_pool_connections", "gauge", "Pooled database connections, by state.", [
+        sample for db_path, pool in pools
+        for sample in (({"database": db_path, "state": "in_use"}, pool.in_use), ({"database": db_path, "state": "idle"}, pool.idle))
+    ])
+    writer.metric("app_db_pool_max_size", "gauge", "The most idle connections each pool keeps.", [
+        ({"database": db_path}, pool.max_size) for db_path, pool in pools
+    ])
+    writer.metric("app_db_pool_opened_total", "counter", "Database connections opened by each pool.", [
+        ({"database": db_path}, pool.opened) for db_path, pool in pools
+    ])
+
+    caches = sorted(get_caches(), key=lambda cache: cache.name)
+    writer.metric("app_cache_hits_total", "counter", "Cache lookups that found a current value.", [
+        ({"cache": cache.name}, cache.hits) for cache in caches
+    ])
+    writer.metric("app_cache_misses_total", "counter", "Cache lookups that had to build the value.", [
+        ({"cache": cache.name}, cache.misses) for cache in caches
+    ])
+    writer.metric("app_cache_hit_ratio", "gauge", "Hits over all lookups since the process started.", [
+        ({"cache": cache.name}, cache.hits / (cache.hits + cache.misses)) for cache in caches if cache.hits + cache.misses
+    ])
+
+    dataset_stats = {key: _dataset_stats(db_path) for key, db_path in sorted(_get_datasets().items())}
+    writer.metric("app_dataset_db_size_bytes", "gauge", "Size of each dataset's database files.", [
+        ({"dataset": key}, size) for key, (size, _) in dataset_stats.items()
+    ])
+    writer.metric("app_dataset_rows_approx", "gauge", "Approximate rows in each dataset's main tables (the highest rowid, so deleted rows still count).", [
+        ({"dataset": key, "table": table}, count) for key, (_, row_counts) in dataset_stats.items() for table, count in row_counts.items()
+    ])
+    return writer.text()
+
+
+def _copy_histogram(histogram: Histogram) -> Histogram:
+    copy = Histogram(histogram.buckets)
+    copy.counts = list(histogram.counts)
+    copy.count = histogram.count
+    copy.sum = histogram.sum
+    return copy
+
+
+def init_app(app):
+    """Records every request's route, status and latency, and adds the GET /api/metrics/ route. Call it after logs.init_app."""
+
+    @app.after_request
+    def record_request_metrics(response):
+        # logs.init_app's before_request hook sets request_started_at
+        started_at = g.get("request_started_at")
+        if started_at is not None:
+            record_request(request.method, request.endpoint or UNMATCHED_ENDPOINT, response.status_code,
+                           time.perf_counter() - started_at, db_helpers.get_query_stats())
+        return response
+
+    @app.get("/api/metrics/")
+    def get_metrics():
+        """
+        Returns the app's metrics in the Prometheus text format: requests and their latency per route, SQL statements per route,
+        connection pool usage, cache hits and misses, and the size and approximate row counts of each dataset's database.
+
+        Example request:
+        GET /api/metrics/
+
+        Example output:
+        # HELP http_requests_total Requests handled, by method, route and status.
+        # TYPE http_requests_total counter
+        http_requests_total{method="GET",endpoint="wildlife.get_wildlife",status="200"} 12
+        ...
+        """
+        return Response(render_metrics(), content_type=CONTENT_TYPE)
@@ -0,0 +1,8 @@
+-- Indexes for the foreign key columns that lookups, category filters and cascading deletes search by.
+-- Images.wildlife_id and EnumeratedOptions.field_id don't need one: they're the first column of a UNIQUE constraint, which SQLite already indexes.
+
+CREATE INDEX IF NOT EXISTS Wildlife_category ON Wildlife (category_id);
+CREATE INDEX IF NOT EXISTS Categories_parent ON Categories (parent_id);
+CREATE INDEX IF NOT EXISTS FieldValues_field ON FieldValues (field_id, wildlife_id);
+CREATE INDEX IF NOT EXISTS EnumeratedFieldValues_option ON EnumeratedFieldValues (option_id);
+CREATE INDEX IF NOT EXISTS FieldsToCategories_category ON FieldsToCategories (category_id, field_id);
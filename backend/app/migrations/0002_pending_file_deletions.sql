@@ -0,0 +1,14 @@
+-- Files waiting to be deleted by the background worker in file_deletion.py.
+-- Rows are added in the same transaction that deletes what the files belonged to, so a file is only deleted if that transaction commits,
+-- and deletions that haven't happened yet survive a restart. file_path is absolute, since the worker runs outside any request.
+-- A file that can't be deleted is retried with a growing delay; after too many attempts it's left here with its last_error, for someone to look at.
+
+CREATE TABLE IF NOT EXISTS PendingFileDeletions (
+    id INTEGER PRIMARY KEY,
+    file_path TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS PendingFileDeletions_due ON PendingFileDeletions (attempts, next_attempt_at);
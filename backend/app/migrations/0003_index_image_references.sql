@@ -0,0 +1,6 @@
+-- Lets the orphan image collector (image_gc.py) check a batch of filenames against the database with index lookups.
+-- FieldValues_field_value replaces FieldValues_field: it serves the same lookups by field_id, and also finds IMAGE field values by filename.
+
+CREATE INDEX IF NOT EXISTS Images_path ON Images (image_path);
+CREATE INDEX IF NOT EXISTS FieldValues_field_value ON FieldValues (field_id, value);
+DROP INDEX IF EXISTS FieldValues_field;
@@ -0,0 +1,59 @@
+"""
+Versioned schema changes for existing databases.
+
+create.sql only creates what's missing, so it can't change tables or indexes that already exist. Changes like that go here instead,
+as numbered SQL files (0001_description.sql, 0002_...). A database's PRAGMA user_version records the number of the last migration applied to it,
+and run_migrations applies the newer ones in order, each in its own transaction. Never edit a migration once it's been deployed; add a new one.
+"""
+import logging
+import os
+import re
+import sqlite3
+
+MIGRATIONS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+_MIGRATION_FILENAME = re.compile(r"^(\d+)_\w+\.sql$")
+
+logger = logging.getLogger(__name__)
+
+
+def get_migrations() -> list[tuple[int, str]]:
+    """Returns (version, path) for every migration file, in version order"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_FOLDER):
+        match = _MIGRATION_FILENAME.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), os.path.join(MIGRATIONS_FOLDER, filename)))
+    migrations.sort()
+    versions = [version for version, _ in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Two migrations share a version number: {versions}")
+    return migrations
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn: sqlite3.Connection) -> list[int]:
+    """
+    Applies every migration newer than the database's user_version, and returns the versions it applied.
+    Each migration and the user_version bump that records it are committed together, so if one fails, it's rolled back
+    and the database stays at the previous version (the error is raised, and the remaining migrations aren't attempted).
+    """
+    current_version = get_schema_version(conn)
+    applied = []
+    for version, path in get_migrations():
+        if version <= current_version:
+            continue
+        with open(path, "r") as sql_file:
+            sql_script = sql_file.read()
+        logger.info("Applying migration %s", os.path.basename(path))
+        try:
+            # executescript commits any open transaction first, then runs the script as is, so the transaction is part of the script
+            conn.executescript(f"BEGIN IMMEDIATE;\n{sql_script}\nPRAGMA user_version = {version};\nCOMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        applied.append(version)
+    return applied
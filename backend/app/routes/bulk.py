@@ -0,0 +1,425 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import csv
+import io
+import json
+import sqlite3
+import logging
+from app import db_helpers
+from app.routes.wildlife import get_non_integer_field_names, normalize_integer_field_values
+from app.utils import get_category_fields
+
+bulk_bp = Blueprint('bulk', __name__)
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 5000
+IMPORT_FORMATS = ("csv", "ndjson")
+MAX_REPORTED_ERRORS = 1000
+# Keeps "IN (...)" lists under SQLite's limit on the number of query parameters
+IN_CLAUSE_CHUNK_SIZE = 500
+EXPORT_FORMATS = ("ndjson", "csv")
+# Exported rows are buffered up to about this many characters before being sent, rather than sent one at a time
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# What /api/export/ can export: part name -> (columns, queries). Each query returns those columns, in an order that
+# follows an index, so SQLite can stream the rows without sorting them first.
+EXPORT_PARTS = {
+    "categories": (["id", "parent_id", "name"], [
+        "SELECT id, parent_id, name FROM Categories ORDER BY id",
+    ]),
+    "fields": (["id", "name", "type", "category_ids"], [
+        """
+        SELECT f.id, f.name, f.type,
+               (SELECT group_concat(category_id, ' ') FROM FieldsToCategories WHERE field_id = f.id) AS category_ids
+        FROM Fields f ORDER BY f.id
+        """,
+    ]),
+    "wildlife": (["id", "name", "scientific_name", "category_id", "thumbnail_id"], [
+        "SELECT id, name, scientific_name, category_id, thumbnail_id FROM Wildlife ORDER BY id",
+    ]),
+    # ENUM values live in EnumeratedFieldValues rather than FieldValues, so they're exported after the rest
+    "field_values": (["wildlife_id", "field_id", "field_name", "value"], [
+        """
+        SELECT fv.wildlife_id, fv.field_id, f.name AS field_name, fv.value
+        FROM FieldValues fv JOIN Fields f ON f.id = fv.field_id
+        ORDER BY fv.wildlife_id, fv.field_id
+        """,
+        """
+        SELECT efv.wildlife_id, eo.field_id, f.name AS field_name, eo.option_value AS value
+        FROM EnumeratedFieldValues efv
+        JOIN EnumeratedOptions eo ON eo.id = efv.option_id
+        JOIN Fields f ON f.id = eo.field_id
+        ORDER BY efv.wildlife_id, efv.option_id
+        """,
+    ]),
+    "images": (["id", "wildlife_id", "image_path", "is_thumbnail"], [
+        """
+        SELECT i.id, i.wildlife_id, i.image_path, (w.thumbnail_id IS i.id) AS is_thumbnail
+        FROM Images i LEFT JOIN Wildlife w ON w.id = i.wildlife_id
+        ORDER BY i.id
+        """,
+    ]),
+}
+
+
+@bulk_bp.route("/api/import-wildlife/", methods=["POST"])
+def import_wildlife():
+    """
+    Creates many wildlife at once from a CSV or NDJSON file, and reports which rows failed.
+    The file can be uploaded as the 'file' form field, or sent as the raw request body.
+    Its format comes from the 'format' parameter ('csv' or 'ndjson'); if that's missing, it's guessed from the file name or content type.
+
+    Each row needs name, scientific_name and category_id, plus a value for every field of the category (including inherited fields),
+    keyed by field name, exactly like create-wildlife. IMAGE fields take the filename of an image that's already been uploaded.
+    In a CSV file, columns are field names, and an empty cell counts as not provided; that way one file can hold rows from categories with different fields.
+    In an NDJSON file, each line is one JSON object.
+
+    Rows are checked against their category's fields (looked up once per category), and the valid ones are inserted in large batches,
+    one transaction per batch. Invalid rows are skipped and listed in "errors" (up to 1000 of them), numbered from 1 for the first data row.
+    If the file itself can't be read partway through (it isn't valid UTF-8, or the CSV is malformed), the import stops there with a 400:
+    the rows before that point are still imported, and the response also has "error" and "stopped_at_row", the row it couldn't read.
+    If a batch fails for any other reason (the database is locked, the disk is full), the import stops with a 500 and the same
+    "error" and "stopped_at_row" (the batch's first row): earlier batches are kept, and the failed batch's rows are listed in "errors".
+
+    Throughput is about 10,000-15,000 rows a second for a category with three fields, which is short of the tens of thousands a second
+    we were aiming for. Most of the time goes to inserting FieldValues: even with the search-index triggers skipped during the
+    import, SQLite still runs each trigger's WHEN check and updates the table's indexes row by row.
+
+    Example request:
+    POST /api/import-wildlife/?format=csv
+    Form Data: file=wildlife.csv
+
+    where wildlife.csv is:
+    name,scientific_name,category_id,Wingspan,Habitat
+    Luna Moth,Actias luna,3,11,Forests
+    Atlas Moth,Attacus atlas,3,wide,Forests
+
+    Example output:
+    {
+        "imported": 1,
+        "failed": 1,
+        "errors": [
+            {
+                "row": 2,
+                "error": "The following are integer fields, but their values aren't whole numbers: Wingspan"
+            }
+        ]
+    }
+    """
+    upload = request.files.get("file")
+    import_format = request.args.get("format") or _guess_import_format(upload)
+    if import_format not in IMPORT_FORMATS:
+        return jsonify({"error": f"Couldn't tell the file format; pass 'format' as one of: {', '.join(IMPORT_FORMATS)}"}), 400
+
+    stream = io.TextIOWrapper(upload.stream if upload else request.stream, encoding="utf-8-sig", newline="")
+    rows = _read_csv(stream) if import_format == "csv" else _read_ndjson(stream)
+
+    importer = WildlifeImporter()
+    batch = []
+    row_number = 0
+    read_error = None
+    try:
+        for row_number, row in enumerate(rows, start=1):
+            batch.append((row_number, row))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                importer.import_batch(batch)
+                batch = []
+                if importer.batch_error:
+                    break
+    except (UnicodeDecodeError, csv.Error) as e:
+        # The rest of the file can't be read, but the rows before this one were fine, and earlier batches are already committed
+        read_error = f"Couldn't read the file after row {row_number}: {e}"
+    if batch and not importer.batch_error:
+        importer.import_batch(batch)
+
+    result = {
+        "imported": importer.imported,
+        "failed": importer.failed,
+        "errors": importer.errors,
+    }
+    if importer.batch_error:
+        return jsonify({**result, **importer.batch_error}), 500
+    if read_error:
+        return jsonify({**result, "error": read_error, "stopped_at_row": row_number + 1}), 400
+    return jsonify(result), 200
+
+
+@bulk_bp.route("/api/export/", methods=["GET"])
+def export_dataset():
+    """
+    Streams the whole dataset out as NDJSON or CSV, for backups and nightly exports.
+    Rows are read from the database in batches and sent as they're read, so memory use stays the same however big the dataset is.
+    Everything comes from one snapshot of the database, so the parts are consistent with each other even if the dataset changes during the export.
+
+    Query parameters:
+    - format: 'ndjson' (the default) or 'csv'.
+    - part: one of 'categories', 'fields', 'wildlife', 'field_values' or 'images' (the image manifest).
+      With NDJSON, leaving it out exports every part in that order, and each line gets a "part" key saying which one it belongs to.
+      CSV files can only hold one part, so it's required for CSV.
+    - dataset: which dataset to export, as for every other route.
+
+    Example request:
+    GET /api/export/?format=csv&part=wildlife
+
+    Example output:
+    id,name,scientific_name,category_id,thumbnail_id
+    1,Monarch,Danaus plexippus,3,7
+    2,Luna Moth,Actias luna,4,
+
+    Example request:
+    GET /api/export/
+
+    Example output:
+    {"part": "categories", "id": 1, "parent_id": null, "name": "Insects"}
+    ...
+    {"part": "images", "id": 7, "wildlife_id": 1, "image_path": "1234abcd.png", "is_thumbnail": 1}
+    """
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    part = request.args.get("part")
+    if part is not None and part not in EXPORT_PARTS:
+        return jsonify({"error": f"part must be one of: {', '.join(EXPORT_PARTS)}"}), 400
+    if part is None and export_format == "csv":
+        return jsonify({"error": f"A CSV export needs a part, one of: {', '.join(EXPORT_PARTS)}"}), 400
+
+    parts = [part] if part else list(EXPORT_PARTS)
+    if export_format == "csv":
+        lines = _csv_export_lines(part)
+        mimetype = "text/csv"
+    else:
+        lines = _ndjson_export_lines(parts, tag_parts=part is None)
+        mimetype = "application/x-ndjson"
+
+    def generate():
+        with db_helpers.snapshot():
+            yield from _chunked(lines)
+
+    dataset_name = db_helpers.get_active_dataset()["key"] or "wildlife"
+    filename = f"{dataset_name}-{part or 'export'}.{export_format}"
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+def _export_rows(part):
+    _, queries = EXPORT_PARTS[part]
+    for query in queries:
+        yield from db_helpers.select_iter(query)
+
+
+def _ndjson_export_lines(parts, tag_parts):
+    for part in parts:
+        for row in _export_rows(part):
+            yield json.dumps({"part": part, **row} if tag_parts else row) + "\n"
+
+
+def _csv_export_lines(part):
+    columns, _ = EXPORT_PARTS[part]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in _export_rows(part):
+        writer.writerow([row[column] for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _chunked(lines):
+    """Joins lines into chunks of about EXPORT_CHUNK_SIZE characters, so the response isn't written one small line at a time"""
+    chunk = []
+    chunk_length = 0
+    for line in lines:
+        chunk.append(line)
+        chunk_length += len(line)
+        if chunk_length >= EXPORT_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+            chunk_length = 0
+    if chunk:
+        yield "".join(chunk)
+
+
+def _guess_import_format(upload):
+    filename = (upload.filename if upload else "") or ""
+    content_type = (upload.mimetype if upload else request.mimetype) or ""
+    if filename.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    if filename.endswith((".ndjson", ".jsonl")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+
+def _read_csv(stream):
+    for row in csv.DictReader(stream):
+        # An empty cell means the row has no value for that column
+        yield {key: value for key, value in row.items() if key is not None and value not in (None, "")}
+
+
+def _read_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ValueError(f"Invalid JSON: {e}")
+            continue
+        yield row if isinstance(row, dict) else ValueError("Each line must be a JSON object")
+
+
+class WildlifeImporter:
+    """
+    Validates and inserts batches of wildlife rows for import_wildlife, keeping count of what succeeded and what failed.
+    Category fields are fetched once per category, and names imported by earlier batches are tracked across batches.
+    """
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        # {"error", "stopped_at_row"} once a batch has failed for a reason other than a bad row; the import stops there
+        self.batch_error = None
+        self._category_fields = {}
+        self._seen_names = set()
+        self._seen_scientific_names = set()
+        # Row numbers of the current batch that have been neither imported nor failed yet
+        self._unreported_rows = set()
+
+    def import_batch(self, batch):
+        """
+        Imports a batch of (row number, row) pairs, failing the rows that can't be imported. If something other than a bad row
+        goes wrong (say the database is locked or the disk is full), the batch is rolled back, its remaining rows are failed with
+        the error, and batch_error is set. Earlier batches stay committed.
+        """
+        self._unreported_rows = {row_number for row_number, _ in batch}
+        try:
+            self._import_batch(batch)
+        except Exception as e:
+            logger.exception("Import batch starting at row %d failed", batch[0][0])
+            for row_number in sorted(self._unreported_rows):
+                self._fail(row_number, f"Batch failed: {e}")
+            self.batch_error = {"error": f"The import stopped at the batch starting at row {batch[0][0]}: {e}",
+                                "stopped_at_row": batch[0][0]}
+
+    def _import_batch(self, batch):
+        valid_rows = []
+        for row_number, row in batch:
+            error = self._validate(row)
+            if error:
+                self._fail(row_number, error)
+            else:
+                valid_rows.append((row_number, row))
+        valid_rows = self._drop_duplicates(valid_rows)
+        if not valid_rows:
+            return
+
+        try:
+            with db_helpers.transaction() as conn:
+                # Hand out IDs ourselves so every row can be inserted with executemany. This is safe because
+                # transaction() holds the write lock, so nobody else can insert wildlife in the meantime.
+                next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM Wildlife").fetchone()[0]
+                with db_helpers.bulk_load(next_id):
+                    self._insert(valid_rows, next_id)
+        except sqlite3.IntegrityError as e:
+            # Most likely someone created a wildlife with the same name while we were importing
+            for row_number, _ in valid_rows:
+                self._fail(row_number, f"Batch failed: {e}")
+            return
+        # Only names that actually made it into the database count as taken for later batches
+        self._seen_names.update(row["name"] for _, row in valid_rows)
+        self._seen_scientific_names.update(row["scientific_name"] for _, row in valid_rows)
+        self.imported += len(valid_rows)
+        self._unreported_rows.clear()
+
+    def _insert(self, rows, first_id):
+        wildlife_rows = []
+        field_value_rows = []
+        for wildlife_id, (row_number, row) in enumerate(rows, start=first_id):
+            wildlife_rows.append((wildlife_id, row["name"], row["scientific_name"], row["category_id"]))
+            fields = self._category_fields[row["category_id"]]
+            for field_name, field in fields.items():
+                field_value_rows.append((wildlife_id, field["id"], str(row[field_name])))
+        db_helpers.mutate_many("INSERT INTO Wildlife (id, name, scientific_name, category_id) VALUES (?, ?, ?, ?)",
+                               wildlife_rows)
+        db_helpers.mutate_many("INSERT INTO FieldValues (wildlife_id, field_id, value) VALUES (?, ?, ?)",
+                               field_value_rows)
+
+    def _validate(self, row):
+        """Returns an error message if the row can't be imported, or None if it can. Converts category_id and INTEGER field values in place."""
+        if isinstance(row, Exception):
+            return str(row)
+
+        missing_required = [key for key in ("name", "scientific_name", "category_id") if key not in row or row[key] in (None, "")]
+        if missing_required:
+            return f"Missing required fields: {', '.join(missing_required)}"
+        if not isinstance(row["name"], str) or not isinstance(row["scientific_name"], str):
+            return "name and scientific_name must be strings"
+        try:
+            row["category_id"] = int(row["category_id"])
+        except (TypeError, ValueError):
+            return f"category_id must be an integer, not {row['category_id']!r}"
+
+        fields = self._get_category_fields(row["category_id"])
+        if fields is None:
+            return f"Category {row['category_id']} not found"
+
+        provided_field_names = {key for key in row.keys() if key not in ("name", "scientific_name", "category_id")}
+        invalid_field_names = provided_field_names - fields.keys()
+        if invalid_field_names:
+            return f"The following fields are invalid for the category with ID {row['category_id']}: {', '.join(sorted(invalid_field_names))}"
+        missing_field_names = fields.keys() - provided_field_names
+        if missing_field_names:
+            return f"Missing required fields: {', '.join(sorted(missing_field_names))}"
+
+        for field_name in provided_field_names:
+            if not isinstance(row[field_name], (str, int)) or isinstance(row[field_name], bool):
+                return f"The value of {field_name} must be a string or an integer"
+        non_integer_field_names = get_non_integer_field_names(fields.values(), row)
+        if non_integer_field_names:
+            return f"The following are integer fields, but their values aren't whole numbers: {', '.join(non_integer_field_names)}"
+        normalize_integer_field_values(fields.values(), row)
+        return None
+
+    def _get_category_fields(self, category_id):
+        """Returns {field name: field} for every field of the category (including inherited ones), or None if it doesn't exist"""
+        if category_id not in self._category_fields:
+            fields = get_category_fields(category_id)
+            self._category_fields[category_id] = None if fields is None else {field["name"]: field for field in fields}
+        return self._category_fields[category_id]
+
+    def _drop_duplicates(self, rows):
+        """Fails rows whose name or scientific name is already taken, in the database, by an earlier batch or earlier in this batch"""
+        existing_names = self._existing_values("name", [row["name"] for _, row in rows])
+        existing_scientific_names = self._existing_values("scientific_name", [row["scientific_name"] for _, row in rows])
+        # Names taken earlier in this batch; they only join _seen_names once the batch is committed
+        batch_names = set()
+        batch_scientific_names = set()
+        unique_rows = []
+        for row_number, row in rows:
+            if row["name"] in existing_names or row["name"] in self._seen_names or row["name"] in batch_names:
+                self._fail(row_number, f"Wildlife with name {row['name']} already exists")
+            elif (row["scientific_name"] in existing_scientific_names or row["scientific_name"] in self._seen_scientific_names
+                  or row["scientific_name"] in batch_scientific_names):
+                self._fail(row_number, f"Wildlife with scientific name {row['scientific_name']} already exists")
+            else:
+                batch_names.add(row["name"])
+                batch_scientific_names.add(row["scientific_name"])
+                unique_rows.append((row_number, row))
+        return unique_rows
+
+    def _existing_values(self, column, values):
+        existing = set()
+        for start in range(0, len(values), IN_CLAUSE_CHUNK_SIZE):
+            chunk = values[start:start + IN_CLAUSE_CHUNK_SIZE]
+            placeholders = ','.join('?' for _ in chunk)
+            rows = db_helpers.select_multiple(f"SELECT {column} FROM Wildlife WHERE {column} IN ({placeholders})", chunk)
+            existing.update(row[column] for row in rows)
+        return existing
+
+    def _fail(self, row_number, error):
+        self._unreported_rows.discard(row_number)
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": error})
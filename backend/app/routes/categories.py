@@ -1,10 +1,12 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app
 import os
 from app import db_helpers
 # from .utils import save_file, get_parent_ids  # Adjust import if needed
 from werkzeug.utils import secure_filename
-from app.utils import save_file, get_parent_ids, get_subcategory_ids  # Adjust import if needed
-from app.routes.images import delete_image_by_id
+from app.utils import save_file, get_parent_ids  # Adjust import if needed
+from app.file_deletion import start_file_deletions
+from app.routes.wildlife import delete_wildlife_where
+from app.cache import DatasetCache, get_schema_version
 
 categories_bp = Blueprint('category', __name__)
 
@@ -130,46 +132,44 @@ def get_categories_and_fields():
     Note that subcategories always inherit the field IDs of their parent; i.e. the field_ids of a subcategory is a superset of its parent's field_ids.
     Don't rely on things being in a particular order, e.g. don't assume field_ids are sorted.
     """
-    # The code here is pretty unreadable; if you're reading this and know what you're doing, feel free to clean it up
+    # Read the version before the body, so the ETag is never newer than the body it's sent with
+    generation, version = get_schema_version()
+    response = Response(categories_and_fields_cache.get(), mimetype="application/json")
+    response.set_etag(f"{generation}-{version}")
+    # Let clients keep the response, but make them check it's still current (a 304 if so) before using it
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
 
+
+def build_categories_and_fields():
+    """
+    Builds the get-categories-and-fields response body.
+    Cached per dataset in categories_and_fields_cache until a category or field changes; its ETag is the dataset's schema version.
+    """
     category_data = db_helpers.select_multiple("SELECT * FROM Categories")
-    fields_to_categories = db_helpers.select_multiple("SELECT * FROM FieldsToCategories")
 
-    # Make a dict from categories to their fields
-    category_fields = {}
-    for entry in fields_to_categories:
-        if entry["category_id"] in category_fields:
-            category_fields[entry["category_id"]].append(entry["field_id"])
-        else:
-            category_fields[entry["category_id"]] = [entry["field_id"]]
-    for category in category_data:
-        if category["id"] not in category_fields:
-            category_fields[category["id"]] = []
+    # Every field a category has, including those inherited from its parents, in one pass over the closure table
+    inherited_fields = db_helpers.select_multiple("""
+        SELECT DISTINCT CategoryClosure.descendant_id AS category_id, FieldsToCategories.field_id
+        FROM CategoryClosure
+        JOIN FieldsToCategories ON FieldsToCategories.category_id = CategoryClosure.ancestor_id
+    """)
 
     category_dict = {}
-    # First pass: id, name, empty subcategories list, and parent ID
     for category in category_data:
         category_dict[category["id"]] = {
             "id": category["id"],
             "name": category["name"],
             "parent_id": category["parent_id"],
-            "subcategories": []
+            "subcategories": [],
+            "field_ids": [],
         }
-
-    # Helper function for the second pass; gets all the field IDs that belong to a category
-    def get_field_ids(category_id):
-        category = category_dict[category_id]
-        immediate_ids = category_fields[category["id"]]
-        if category["parent_id"]:
-            return list(set(immediate_ids + get_field_ids(category["parent_id"])))  # list(set()) removes duplicates
-        else:
-            return immediate_ids
-
-    # Second pass: get subcategories and field IDs
     for category in category_data:
-        if category["parent_id"]:
+        if category["parent_id"] in category_dict:
             category_dict[category["parent_id"]]["subcategories"].append(category["id"])
-        category_dict[category["id"]]["field_ids"] = get_field_ids(category["id"])
+    for entry in inherited_fields:
+        if entry["category_id"] in category_dict:
+            category_dict[entry["category_id"]]["field_ids"].append(entry["field_id"])
 
     # Make fields
     fields_dict = {}
@@ -178,10 +178,10 @@ def get_categories_and_fields():
         fields_dict[field["id"]] = field
 
     output = {"categories": category_dict, "fields": fields_dict}
-    return jsonify(output), 200
-
+    return (current_app.json.dumps(output) + "\n").encode()
 
 
+categories_and_fields_cache = DatasetCache("categories_and_fields", build_categories_and_fields)
 
 
 @categories_bp.route("/api/delete-category/", methods=["DELETE"])
@@ -203,47 +203,30 @@ def delete_category():
     delete_members = request.args.get("delete-members")
 
     category = db_helpers.select_one("SELECT * FROM Categories WHERE id = ?", [category_id])
+    if category is None:
+        return jsonify({"error": "Category not found"}), 404
     if delete_members is None:
         parent_id = category['parent_id']
         if parent_id is None:
             return jsonify({
                 "error": "Delete failed; cannot reassign members to the parent category because it does not exist."}), 400
         else:
-            # Reassign wildlife to the parent category
-            db_helpers.update("UPDATE Wildlife SET category_id = ? WHERE category_id = ?", [parent_id, category_id])
-            # Reassign the subcategories to the parent category
-            db_helpers.update("UPDATE Categories SET parent_id = ? WHERE parent_id = ?", [parent_id, category_id])
-            # Delete the category
-            db_helpers.delete("DELETE FROM Categories WHERE id = ?", [category_id])
+            with db_helpers.transaction():
+                # Reassign wildlife to the parent category
+                db_helpers.update("UPDATE Wildlife SET category_id = ? WHERE category_id = ?", [parent_id, category_id])
+                # Reassign the subcategories to the parent category
+                db_helpers.update("UPDATE Categories SET parent_id = ? WHERE parent_id = ?", [parent_id, category_id])
+                # Delete the category
+                db_helpers.delete("DELETE FROM Categories WHERE id = ?", [category_id])
             return jsonify({"message": "Category members successfully reassigned and category deleted"}), 200
     else:
-        category_ids = get_subcategory_ids([category_id])
-        # Delete the members
-        wildlife_ids_to_delete = [
-            x["id"] for x in db_helpers.select_multiple(
-                f"SELECT id FROM Wildlife WHERE category_id IN ({','.join('?' for _ in category_ids)})",
-                category_ids
-            )
-        ]
-
-        for wildlife_id in wildlife_ids_to_delete:
-            wildlife_images = db_helpers.select_multiple("SELECT id FROM Images WHERE wildlife_id = ?", [wildlife_id])
-            for image in wildlife_images:
-                delete_image_by_id(image["id"])
-
-        if wildlife_ids_to_delete:
-            db_helpers.delete(
-                f"DELETE FROM Wildlife WHERE id IN ({','.join('?' for _ in wildlife_ids_to_delete)})",
-                wildlife_ids_to_delete
-            )
-            db_helpers.delete(
-                f"DELETE FROM FieldValues WHERE wildlife_id IN ({','.join('?' for _ in wildlife_ids_to_delete)})",
-                wildlife_ids_to_delete
-            )
-
-        # Delete the category and its subcategories
-        db_helpers.delete(
-            f"DELETE FROM Categories WHERE id IN ({','.join('?' for _ in category_ids)})",
-            category_ids
-        )
+        # The category and all its subcategories, worked out inside the transaction so it matches what's being deleted
+        subtree = "(SELECT descendant_id FROM CategoryClosure WHERE ancestor_id = ?)"
+        with db_helpers.transaction():
+            # Delete the members, then the field associations, then the categories themselves (whose closure rows go with them),
+            # a table at a time
+            delete_wildlife_where(f"category_id IN {subtree}", [category_id])
+            db_helpers.delete(f"DELETE FROM FieldsToCategories WHERE category_id IN {subtree}", [category_id])
+            db_helpers.delete(f"DELETE FROM Categories WHERE id IN {subtree}", [category_id])
+        start_file_deletions()
         return jsonify({"message": "Category members and category successfully deleted"}), 200
@@ -1,11 +1,19 @@
-from flask import Blueprint, request, jsonify, send_from_directory
+from flask import Blueprint, Response, abort, current_app, request, jsonify, send_from_directory
+from werkzeug.utils import safe_join
+from urllib.parse import quote
+import logging
+import mimetypes
 import os
 from app import db_helpers
+from app.file_deletion import queue_file_deletions, start_file_deletions
 # from .utils import save_file, get_parent_ids  # Adjust import if needed
 from app.utils import save_file  # Adjust import if needed
 import sqlite3
 
 images_bp = Blueprint('images', __name__)
+logger = logging.getLogger(__name__)
+
+IMAGE_MAX_AGE = 365 * 24 * 60 * 60
 
 @images_bp.route("/api/get-image/<string:filename>/", strict_slashes = False, methods=["GET"])
 def get_image(filename):
@@ -21,15 +29,9 @@ def get_image(filename):
     image_folder = db_helpers.find_existing_image_folder(filename)
     if image_folder is None:
         return jsonify({"error": f"Image '{filename}' not found in any dataset"}), 404
-    print(f"[DEBUG] Requested image filename: {filename}")
-    print(f"[DEBUG] Image folder: {image_folder}")
-    file_path = os.path.join(image_folder, filename)
-    print(f"[DEBUG] Full file path: {file_path}")
-    if not os.path.exists(file_path):
-        print(f"[DEBUG] File does not exist: {file_path}")
-    else:
-        print(f"[DEBUG] File exists: {file_path}")
-    return send_from_directory(image_folder, filename)
+    logger.debug("Serving image %s from %s", filename, image_folder)
+    # save_file gives every upload a new random name, so the file behind a filename never changes
+    return send_image(image_folder, filename, immutable=True)
 
 
 
@@ -46,7 +48,6 @@ def add_image():
 
     file_length = image_file.seek(0, os.SEEK_END)
     image_file.seek(0, os.SEEK_SET)
-    print("file_length", file_length)
     if file_length > 10 * 1024 * 1024:
         return jsonify({"error": f"The image file {image_file.filename} is too large (max 10 MB)"}), 400
     if not image_file.mimetype.startswith("image/"):
@@ -98,13 +99,11 @@ def get_images_by_wildlife_id(wildlife_id):
     Get all images for a wildlife instance.
     Requires wildlife_id.
     """
-    print("get_images_by_wildlife_id", wildlife_id)
     try:
         images = db_helpers.select_multiple("SELECT id, image_path FROM Images WHERE wildlife_id = ?", [wildlife_id])
-        # print(images)
         return jsonify(images), 200
     except Exception as e:
-        print("Error in get_images_by_wildlife_id:", e)
+        logger.exception("Couldn't get the images of wildlife %s", wildlife_id)
         return jsonify({"error": str(e)}), 500
 
 
@@ -130,38 +129,71 @@ def get_image_by_image_id(image_id):
     image_folder = db_helpers.find_existing_image_folder(filename)
     if image_folder is None:
         return jsonify({"error": f"Image file '{filename}' not found"}), 404
-    return send_from_directory(image_folder, filename)
+    # An image ID can be reused once its image is deleted, so browsers must check back, but the ETag makes that a cheap 304
+    return send_image(image_folder, filename, immutable=False)
+
+
+def send_image(folder, filename, immutable):
+    """
+    Helper function.
+    Sends an uploaded image. The filename doubles as its ETag, since save_file never reuses a name for different content.
+    Conditional requests get a 304, and Range requests get just the bytes asked for.
+    With immutable, browsers and proxies may cache the image for a year without checking back; otherwise they revalidate every time.
+
+    When IMAGE_SENDFILE is "x-sendfile" or "x-accel-redirect", the response only names the file (in an X-Sendfile header, or as
+    IMAGE_ACCEL_REDIRECT_PREFIX followed by its absolute path), and the front proxy sends the bytes. For nginx that needs, e.g.:
+    location /protected-images/ { internal; alias /; }
+    """
+    sendfile_mode = current_app.config.get("IMAGE_SENDFILE")
+    if sendfile_mode in ("x-sendfile", "x-accel-redirect"):
+        file_path = safe_join(folder, filename)
+        if file_path is None:
+            abort(404)
+        file_path = os.path.abspath(file_path)
+        response = Response(mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+        if sendfile_mode == "x-sendfile":
+            response.headers["X-Sendfile"] = file_path
+        else:
+            prefix = current_app.config.get("IMAGE_ACCEL_REDIRECT_PREFIX", "/protected-images").rstrip("/")
+            response.headers["X-Accel-Redirect"] = quote(prefix + file_path)
+        response.set_etag(filename)
+        # The proxy handles Range requests itself; this only turns a matching If-None-Match into a 304
+        response.make_conditional(request)
+    else:
+        # send_from_directory handles If-None-Match and Range requests itself
+        response = send_from_directory(folder, filename, etag=filename)
+
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.max_age = IMAGE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
 
 
 def delete_image_by_id(image_id):
-    image = db_helpers.select_one("SELECT * FROM Images WHERE id = ?", [image_id])
-    if not image:
-        return jsonify({"error": f"Image with id {image_id} not found"}), 404
-
-    # Delete the image file from uploaded_images
-    image_path = image.get("image_path")
-    if image_path:
-        upload_dir = db_helpers.get_active_image_upload_folder()
-        file_path = os.path.join(upload_dir, image_path)
-        print("i am here")
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception as e:
-            # Log the error but continue with DB deletion
-            print(f"Error deleting image file {file_path}: {e}")
-
-    # Check if the image is the thumbnail for its wildlife
-    wildlife = db_helpers.select_one("SELECT id, thumbnail_id, name FROM Wildlife WHERE id = ?", [image["wildlife_id"]])
-    is_thumbnail = False
-    if wildlife and wildlife["thumbnail_id"] is not None:
-        is_thumbnail = str(wildlife["thumbnail_id"]) == str(image_id)
-
-    # Delete the image from the database
-    db_helpers.delete("DELETE FROM Images WHERE id = ?", [image_id])
-
-    if is_thumbnail and wildlife:
-        db_helpers.mutate("UPDATE Wildlife SET thumbnail_id = NULL WHERE id = ?", [wildlife["id"]])
+    with db_helpers.transaction():
+        image = db_helpers.select_one("SELECT * FROM Images WHERE id = ?", [image_id])
+        if not image:
+            return jsonify({"error": f"Image with id {image_id} not found"}), 404
+
+        # The file is deleted in the background once the row is gone
+        if image.get("image_path"):
+            upload_dir = db_helpers.get_active_image_upload_folder()
+            queue_file_deletions([os.path.join(upload_dir, image["image_path"])])
+
+        # Check if the image is the thumbnail for its wildlife
+        wildlife = db_helpers.select_one("SELECT id, thumbnail_id, name FROM Wildlife WHERE id = ?", [image["wildlife_id"]])
+        is_thumbnail = wildlife is not None and str(wildlife["thumbnail_id"]) == str(image_id)
+
+        # Delete the image from the database
+        db_helpers.delete("DELETE FROM Images WHERE id = ?", [image_id])
+        if is_thumbnail:
+            db_helpers.mutate("UPDATE Wildlife SET thumbnail_id = NULL WHERE id = ?", [wildlife["id"]])
+    start_file_deletions()
+
+    if is_thumbnail:
         return jsonify({
             "message": (
                 f"Image successfully deleted. Warning: this was the thumbnail for wildlife '{wildlife.get('name', '')}' "
@@ -1,14 +1,17 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
+import logging
 import os
 from app import db_helpers
-from app.routes.images import delete_image_by_id
+from app.file_deletion import queue_file_deletions, start_file_deletions
+from app.field_registry import get_field_registry
 
 # from .utils import save_file, get_parent_ids  # Adjust import if needed
 from werkzeug.utils import secure_filename
-from app.utils import save_file, get_parent_ids, get_subcategory_ids  # Adjust import if needed
+from app.utils import save_file, get_category_fields, category_filter_clause, get_page_args, get_response_format, add_keyset_clause, page_response, to_fts_query  # Adjust import if needed
 
 
 wildlife_bp = Blueprint('wildlife', __name__)
+logger = logging.getLogger(__name__)
 
 
 @wildlife_bp.route("/api/delete-wildlife/", methods=["DELETE"])
@@ -25,23 +28,30 @@ def delete_wildlife():
     }
     """
     wildlife_id = request.args["id"]
-    n_rows_deleted = db_helpers.delete("DELETE FROM Wildlife WHERE id = ?", [wildlife_id])
-    if n_rows_deleted == 0:
-        return jsonify({"error": "Wildlife not found"}), 404
-
-    # image_field_values = [fv["value"] for fv in db_helpers.select_multiple("SELECT value FROM FieldValues WHERE wildlife_id = ? AND field_id IN (SELECT id FROM Fields WHERE type = 'IMAGE')", [wildlife_id])]
-    # for image_filename in image_field_values:
-    #     image_path = os.path.join(current_app.config["IMAGE_UPLOAD_FOLDER"], image_filename)
-    #     if os.path.exists(image_path):
-    #         os.remove(image_path)
+    with db_helpers.transaction():
+        n_rows_deleted = delete_wildlife_where("id = ?", [wildlife_id])
+        if n_rows_deleted == 0:
+            return jsonify({"error": "Wildlife not found"}), 404
+    start_file_deletions()
+    return jsonify({"message": "Wildlife successfully deleted"}), 200
 
-    wildlife_images = db_helpers.select_multiple("SELECT id FROM Images WHERE wildlife_id = ?", [wildlife_id])
-    for image in wildlife_images:
-        delete_image_by_id(image["id"])
 
-    db_helpers.delete("DELETE FROM FieldValues WHERE wildlife_id = ?", [wildlife_id])
-    db_helpers.delete("DELETE FROM EnumeratedFieldValues WHERE wildlife_id = ?", [wildlife_id])
-    return jsonify({"message": "Wildlife successfully deleted"}), 200
+def delete_wildlife_where(condition, params):
+    """
+    Helper function.
+    Deletes every wildlife matching the SQL condition (on Wildlife's columns), along with its field values and images,
+    using one statement per table however many wildlife match. Must be called inside db_helpers.transaction().
+    The image files are queued for deletion rather than deleted; call file_deletion.start_file_deletions() once the transaction has committed.
+    Returns the number of wildlife deleted.
+    """
+    matching_ids = f"SELECT id FROM Wildlife WHERE {condition}"
+    upload_folder = db_helpers.get_active_image_upload_folder()
+    image_paths = db_helpers.select_multiple(f"SELECT image_path FROM Images WHERE wildlife_id IN ({matching_ids})", params)
+    queue_file_deletions(os.path.join(upload_folder, image["image_path"]) for image in image_paths)
+    db_helpers.delete(f"DELETE FROM Images WHERE wildlife_id IN ({matching_ids})", params)
+    db_helpers.delete(f"DELETE FROM FieldValues WHERE wildlife_id IN ({matching_ids})", params)
+    db_helpers.delete(f"DELETE FROM EnumeratedFieldValues WHERE wildlife_id IN ({matching_ids})", params)
+    return db_helpers.delete(f"DELETE FROM Wildlife WHERE {condition}", params)
 
 
 @wildlife_bp.route("/api/search-wildlife-by-integer-field/", methods=["GET"])
@@ -54,6 +64,7 @@ Requires:
 - 'exact_value': (Optional) The exact value to search for. Cannot be used with min_value or max_value.
 - 'min_value': (Optional) The minimum value to search for. Use alone for greater than queries or with max_value for range queries.
 - 'max_value': (Optional) The maximum value to search for. Use alone for less than queries or with min_value for range queries.
+- 'limit' and 'after': (Optional) Keyset pagination parameters and format=ndjson (see get-wildlife).
 Note: 'field_id' is required. Either 'exact_value' or one/both of 'min_value' and 'max_value' must be provided. It's not valid to provide 'exact_value' together with 'min_value' or 'max_value'.
 
 Returns a JSON structure with a 'results' key containing search results.
@@ -101,29 +112,36 @@ Example output (for the range value search, formatted as a JSON response):
 
     if field_id is None:
         return jsonify({"error": "field_id is required"}), 400
-    field_info = db_helpers.select_one("SELECT * FROM Fields WHERE id = ? AND type = 'INTEGER'", (field_id,))
-    if not field_info:
+    try:
+        limit, after = get_page_args()
+        response_format = get_response_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    field_info = get_field_registry().by_id.get(field_id)
+    if not field_info or field_info["type"] != "INTEGER":
         return jsonify({"error": "Invalid field ID or field is not of type INTEGER"}), 400
 
     if exact_value is not None and (min_value is not None or max_value is not None):
         return jsonify({"error": "Cannot specify exact_value together with min_value or max_value"}), 400
 
-    sql_query = "SELECT w.* FROM Wildlife w JOIN FieldValues fv ON w.id = fv.wildlife_id WHERE fv.field_id = ?"
+    # IntegerFieldValues holds the values as numbers, with an index on (field_id, value), so this is an index range seek
+    sql_query = "SELECT w.* FROM Wildlife w JOIN IntegerFieldValues iv ON w.id = iv.wildlife_id WHERE iv.field_id = ?"
     params = [field_id]
 
     if exact_value is not None:
-        sql_query += " AND fv.value = ?"
-        params.append(str(exact_value))
+        sql_query += " AND iv.value = ?"
+        params.append(exact_value)
     else:
         if min_value is not None:
-            sql_query += " AND fv.value > ?"
-            params.append(str(min_value))
+            sql_query += " AND iv.value > ?"
+            params.append(min_value)
         if max_value is not None:
-            sql_query += " AND fv.value < ?"
-            params.append(str(max_value))
+            sql_query += " AND iv.value < ?"
+            params.append(max_value)
 
-    results = db_helpers.select_multiple(sql_query, params)
-    return jsonify(results), 200
+    sql_query, params = add_keyset_clause(sql_query, params, limit, after)
+    results = db_helpers.select_iter(sql_query, params)
+    return page_response(results, limit, response_format)
 
 
 @wildlife_bp.route("/api/edit-wildlife/", methods=["POST"])
@@ -155,67 +173,48 @@ def edit_wildlife():
     category_id = request.form["category_id"]
     other_fields = {k: v for k, v in request.form.items() if k not in ("name", "scientific_name", "category_id", "wildlife_id", "thumbnail_id")}
 
-    #checking if category exists
-    category_exists = db_helpers.select_one("SELECT 1 FROM Categories WHERE id = ?", [category_id])
-    if not category_exists:
+    #checking if category exists, and getting its valid fields (including those inherited from parent categories)
+    valid_fields = get_category_fields(category_id)
+    if valid_fields is None:
         return jsonify({"error": "Category not found"}), 400
-
-        #checking for valid fields
-    parent_category_ids = get_parent_ids(category_id)
-    valid_fields = db_helpers.select_multiple(f"""
-        SELECT Fields.name FROM Fields
-        JOIN FieldsToCategories ON Fields.id = FieldsToCategories.field_id
-        WHERE FieldsToCategories.category_id IN ({','.join('?' for _ in parent_category_ids)})
-        """, parent_category_ids)
+    field_ids = {field['name']: field['id'] for field in valid_fields}
     valid_field_names = {field['name'] for field in valid_fields}
     provided_field_names = set(other_fields.keys())
     if not provided_field_names.issubset(valid_field_names):
         invalid_fields = provided_field_names - valid_field_names
         return jsonify({"error": f"Provided fields not valid for category: {', '.join(invalid_fields)}"}), 400
-    
-    valid_image_fields = filter(lambda field: field["type"] == "IMAGE", valid_fields)
-    # valid_image_field_names = {field['name'] for field in valid_image_fields}
 
-    # print(valid_image_field_names)
+    non_integer_field_names = get_non_integer_field_names(valid_fields, other_fields)
+    if non_integer_field_names:
+        return jsonify({"error": f"The following are integer fields, but their values aren't whole numbers: {', '.join(non_integer_field_names)}"}), 400
+    normalize_integer_field_values(valid_fields, other_fields)
 
-    for image_file in request.files.values():
-        if image_file.filename == "":
-            continue
+    image_files = {field_name: image_file for field_name, image_file in request.files.items() if image_file.filename != ""}
+    unknown_image_field_names = set(image_files.keys()) - valid_field_names
+    if unknown_image_field_names:
+        return jsonify({"error": f"Provided fields not valid for category: {', '.join(unknown_image_field_names)}"}), 400
+
+    for image_file in image_files.values():
         file_length = image_file.seek(0, os.SEEK_END)
         image_file.seek(0, os.SEEK_SET)
         if file_length > 10 * 1024 * 1024:
             return jsonify({"error": f"The image file {image_file.filename} is too large (max 10 MB)"}), 400
         if not image_file.mimetype.startswith("image/"):
-            print("this is not an image")
             return jsonify({"error": f"The file {image_file.filename} is not an image (its MIME type is {image_file.mimetype}, which doesn't start with 'image/')"}), 400
     
     #------------------------------------------------------------------------------------#
 
     #---------------------------UPDATING INFORMATION-------------------------------------#
     #modify remaining fields
-
-    for field_name, value in other_fields.items():
-        print(field_name, value)
-        field = db_helpers.select_one("SELECT id FROM Fields WHERE name = ?", [field_name])
-        if not field:
-            return jsonify({"error": f"Field {field_name} not found"}), 400
-        field_id = field["id"]
-        db_helpers.update("REPLACE INTO FieldValues (wildlife_id, field_id, value) VALUES (?, ?, ?)",
-                          (wildlife_id, field_id, value))
-
-    
-    for field_name, image_file in request.files.items():
-        if image_file.filename == "":
-            continue
-        print(field_name, image_file)
-        field = db_helpers.select_one("SELECT id FROM Fields WHERE name = ?", [field_name])
-        if not field:
-            return jsonify({"error": f"Field {field_name} not found"}), 400
-        field_id = field["id"]
-        saved_filename = save_file(image_file, current_app.config["IMAGE_UPLOAD_FOLDER"])
-        print(saved_filename)
-        db_helpers.insert("REPLACE INTO FieldValues (wildlife_id, field_id, value) VALUES (?, ?, ?)",
-                          (wildlife_id, field_id, saved_filename))
+    #image fields are uploaded as files; any that were also sent as form data are overwritten by the file
+    field_values = dict(other_fields)
+    for field_name, image_file in image_files.items():
+        field_values[field_name] = save_file(image_file, db_helpers.get_active_image_upload_folder())
+
+    #all the values are written in one transaction, with a single commit
+    with db_helpers.transaction():
+        db_helpers.mutate_many("REPLACE INTO FieldValues (wildlife_id, field_id, value) VALUES (?, ?, ?)",
+                               [(wildlife_id, field_ids[field_name], value) for field_name, value in field_values.items()])
     #success message
     return jsonify({"message": "wildlife updated successfully", "wildlife_id": wildlife_id}), 201
     #------------------------------------------------------------------------------------#
@@ -263,19 +262,10 @@ def create_wildlife():
 
     provided_nonimage_fields = {k: v for k, v in request.form.items() if k not in ("name", "scientific_name", "category_id", "thumbnail")}
 
-    category_exists = db_helpers.select_one("SELECT 1 FROM Categories WHERE id = ?", (category_id,))
-    if not category_exists:
-        return jsonify({"error": "Category not found"}), 400
-
-    # Get all parent category IDs, and the ID of the category itself
-    parent_category_ids = get_parent_ids(category_id)
-
     # Fetch all fields valid for the category, including those inherited from parent categories
-    valid_fields = db_helpers.select_multiple(f"""
-            SELECT Fields.name, Fields.type FROM Fields
-            JOIN FieldsToCategories ON Fields.id = FieldsToCategories.field_id
-            WHERE FieldsToCategories.category_id IN ({','.join('?' for _ in parent_category_ids)})
-        """, parent_category_ids)
+    valid_fields = get_category_fields(category_id)
+    if valid_fields is None:
+        return jsonify({"error": "Category not found"}), 400
 
     valid_nonimage_fields = filter(lambda field: field["type"] != "IMAGE", valid_fields)
     valid_image_fields = filter(lambda field: field["type"] == "IMAGE", valid_fields)
@@ -314,28 +304,27 @@ def create_wildlife():
         field_names_missing_value = valid_nonimage_field_names - provided_nonimage_fields.keys()
         return jsonify({"error": f"The following are non-image fields, but you provided them as files: {', '.join(field_names_missing_value)}"}), 400
 
-    # Insert the wildlife entry
-    wildlife_id = db_helpers.insert("INSERT INTO Wildlife (name, scientific_name, category_id) VALUES (?, ?, ?)",
-                                    (name, scientific_name, category_id))
+    # Ensure all integer fields are whole numbers
+    non_integer_field_names = get_non_integer_field_names(valid_fields, provided_nonimage_fields)
+    if non_integer_field_names:
+        return jsonify({"error": f"The following are integer fields, but their values aren't whole numbers: {', '.join(non_integer_field_names)}"}), 400
+    normalize_integer_field_values(valid_fields, provided_nonimage_fields)
 
-    # Insert the non-image field values
-    for field_name, value in provided_nonimage_fields.items():
-        field_row = db_helpers.select_one("SELECT id FROM Fields WHERE name = ?", [field_name])
-        if not field_row:
-            continue  # or handle error as appropriate
-        field_id = field_row["id"]
-        db_helpers.insert("INSERT INTO FieldValues (wildlife_id, field_id, value) VALUES (?, ?, ?)",
-                          (wildlife_id, field_id, value))
+    field_ids = {field['name']: field['id'] for field in valid_fields}
 
-    # Insert the image field values
+    # Save the image files first, so the database work below is a single short transaction
+    field_values = dict(provided_nonimage_fields)
     for field_name, image_file in request.files.items():
-        field_row = db_helpers.select_one("SELECT id FROM Fields WHERE name = ?", [field_name])
-        if not field_row:
-            continue  # or handle error as appropriate
-        field_id = field_row["id"]
-        saved_filename = save_file(image_file, current_app.config["IMAGE_UPLOAD_FOLDER"])
-        db_helpers.insert("INSERT INTO FieldValues (wildlife_id, field_id, value) VALUES (?, ?, ?)",
-                          (wildlife_id, field_id, saved_filename))
+        field_values[field_name] = save_file(image_file, db_helpers.get_active_image_upload_folder())
+
+    with db_helpers.transaction():
+        # Insert the wildlife entry
+        wildlife_id = db_helpers.insert("INSERT INTO Wildlife (name, scientific_name, category_id) VALUES (?, ?, ?)",
+                                        (name, scientific_name, category_id))
+
+        # Insert all the field values (image and non-image) at once
+        db_helpers.mutate_many("INSERT INTO FieldValues (wildlife_id, field_id, value) VALUES (?, ?, ?)",
+                               [(wildlife_id, field_ids[field_name], value) for field_name, value in field_values.items()])
 
     return jsonify({"message": "Wildlife created successfully", "wildlife_id": wildlife_id}), 201
 
@@ -352,8 +341,11 @@ def create_wildlife():
 def search_wildlife_names():
     """
     Searches for wildlife by name or scientific name within specified categories. Case-insensitive.
+    Results must contain every word in 'query'. By default, each word also matches the start of a longer word ("fo" matches "Fox");
+    pass prefix=false to only match whole words. Unpaginated results are sorted by relevance, best match first.
     The 'category_id' parameter is optional and can be repeated to search across multiple categories.
     If no categories are provided, it searches across all categories.
+    Supports the optional 'limit' and 'after' pagination parameters and format=ndjson (see get-wildlife).
 
     Example request:
     GET /api/search-wildlife-names/?query=fox&category_id=1&category_id=2
@@ -376,30 +368,35 @@ def search_wildlife_names():
     """
     category_ids = request.args.getlist("category_id", type=int)
     user_query = request.args.get("query")
+    prefix = request.args.get("prefix", "true").lower() not in ("false", "0")
+    try:
+        limit, after = get_page_args()
+        response_format = get_response_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    match_query = to_fts_query(user_query, prefix)
+    if match_query is None:
+        # With nothing to match on, every wildlife matches
+        sql_query = "SELECT w.* FROM Wildlife w WHERE 1 = 1"
+        params = []
+    else:
+        sql_query = "SELECT w.* FROM WildlifeNameSearch s JOIN Wildlife w ON w.id = s.rowid WHERE WildlifeNameSearch MATCH ?"
+        params = [match_query]
 
     if category_ids:
-        all_category_ids = get_subcategory_ids(category_ids)
-        # This special case is necessary because "IN ()" is invalid syntax (it needs at least one value inside the parenthesis)
-        if not all_category_ids:
-            return jsonify([]), 200  # Return an empty list if no categories found
-
-        # Create a placeholder string for SQL query
-        placeholders = ','.join('?' for _ in all_category_ids)
-
-        sql_query = f"""
-        SELECT w.* FROM Wildlife w
-        WHERE w.category_id IN ({placeholders})
-        AND (w.name LIKE ? OR w.scientific_name LIKE ?)
-        """
+        # Only keep wildlife in the given categories or their subcategories
+        category_sql, category_params = category_filter_clause(category_ids)
+        sql_query += f" AND {category_sql}"
+        params += category_params
 
-        params = all_category_ids + [f'%{user_query}%', f'%{user_query}%']
-    else:
-        # If no category IDs are provided, search across all wildlife
-        sql_query = "SELECT * FROM Wildlife WHERE name LIKE ? OR scientific_name LIKE ?"
-        params = [f'%{user_query}%', f'%{user_query}%']
+    if match_query is not None and limit is None:
+        # Best matches first. Paginated results are ordered by ID instead, so the cursor stays stable.
+        sql_query += " ORDER BY s.rank"
 
-    wildlife_results = db_helpers.select_multiple(sql_query, params)
-    return jsonify(wildlife_results), 200
+    sql_query, params = add_keyset_clause(sql_query, params, limit, after)
+    wildlife_results = db_helpers.select_iter(sql_query, params)
+    return page_response(wildlife_results, limit, response_format)
 
 
 @wildlife_bp.route("/api/search-wildlife-text-field/", methods=["GET"])
@@ -407,8 +404,10 @@ def search_wildlife_text_field():
     """
     Searches for wildlife by a specified text field within specified categories. Case-insensitive.
     Requires 'field_id' and 'query'.
+    Words are matched the same way as in search-wildlife-names, including the optional 'prefix' parameter and relevance ordering.
     The 'category_id' parameter is optional and can be repeated for multiple categories.
     If no categories are provided, it searches across all categories.
+    Supports the optional 'limit' and 'after' pagination parameters and format=ndjson (see get-wildlife).
 
     Note that you can't search for name or scientific name using this route, as they are part of the wildlife table itself, and aren't custom fields.
     To search for those, use the search-wildlife-names route (see above).
@@ -425,48 +424,50 @@ def search_wildlife_text_field():
             "scientific_name": "Chelonia mydas"
         }
     ]
-    For the example request to produce this output, Green Turtle would need a text field with field_id=2 that contains the string "sea".
+    For the example request to produce this output, Green Turtle would need a text field with field_id=2 that contains the word "sea" (or a word starting with it).
     For example, maybe its parent category has an "extra notes" field, whose value for the Green Turtle is "It's also known as the green sea turtle".
     """
     category_ids = request.args.getlist("category_id", type=int)
     field_id = request.args.get("field_id", type=int)
     user_query = request.args.get("query")
+    prefix = request.args.get("prefix", "true").lower() not in ("false", "0")
 
     # Check if the field_id corresponds to a TEXT type field
-    field_info = db_helpers.select_one("SELECT type FROM Fields WHERE id = ?", (field_id,))
+    field_info = get_field_registry().by_id.get(field_id)
     if not field_info or field_info["type"] != "TEXT":
         return jsonify({"error": "Field not found or not of type TEXT"}), 400
-
-    if category_ids:
-        all_category_ids = get_subcategory_ids(category_ids)
-        if not all_category_ids:
-            # If there are no categories found, return an empty list
-            return jsonify([]), 200
-
-        # Create a placeholder string for SQL query
-        placeholders = ','.join('?' for _ in all_category_ids)
-
-        sql_query = f"""
-        WITH RECURSIVE wildlife_in_categories(id) AS (
-            SELECT id FROM Wildlife WHERE category_id IN ({placeholders})
-        )
-        SELECT w.* FROM Wildlife w
-        JOIN FieldValues fv ON fv.wildlife_id = w.id
-        JOIN wildlife_in_categories wic ON wic.id = w.id
-        WHERE fv.field_id = ? AND fv.value LIKE ?
-        """
-        params = all_category_ids + [field_id, f'%{user_query}%']
+    try:
+        limit, after = get_page_args()
+        response_format = get_response_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    match_query = to_fts_query(user_query, prefix)
+    if match_query is None:
+        # With nothing to match on, every wildlife with a value for the field matches
+        sql_query = "SELECT w.* FROM Wildlife w JOIN FieldValues fv ON fv.wildlife_id = w.id WHERE fv.field_id = ?"
+        params = [field_id]
     else:
-        # If no category IDs are provided, search across all wildlife
         sql_query = """
-        SELECT w.* FROM Wildlife w
-        JOIN FieldValues fv ON fv.wildlife_id = w.id
-        WHERE fv.field_id = ? AND fv.value LIKE ?
+        SELECT w.* FROM FieldValueSearch s
+        JOIN Wildlife w ON w.id = s.wildlife_id
+        WHERE FieldValueSearch MATCH ? AND s.field_id = ?
         """
-        params = [field_id, f'%{user_query}%']
+        params = [match_query, field_id]
+
+    if category_ids:
+        # Only keep wildlife in the given categories or their subcategories
+        category_sql, category_params = category_filter_clause(category_ids)
+        sql_query += f" AND {category_sql}"
+        params += category_params
+
+    if match_query is not None and limit is None:
+        # Best matches first. Paginated results are ordered by ID instead, so the cursor stays stable.
+        sql_query += " ORDER BY s.rank"
 
-    wildlife_results = db_helpers.select_multiple(sql_query, params)
-    return jsonify(wildlife_results), 200
+    sql_query, params = add_keyset_clause(sql_query, params, limit, after)
+    wildlife_results = db_helpers.select_iter(sql_query, params)
+    return page_response(wildlife_results, limit, response_format)
 
 
 
@@ -480,8 +481,19 @@ def get_wildlife():
     Custom fields have their name as the key and their value as the value.
     Text field values are returned as strings; integer field values are returned as integers.
 
+    Pagination is opt-in. Pass 'limit' to get at most that many wildlife, ordered by ID, wrapped as
+    {"results": [...], "next_cursor": 42}. Pass the next_cursor back as 'after' to get the following page;
+    next_cursor is null on the last page. Without 'limit', the output is a plain array of every wildlife, as below.
+    The search routes accept the same 'limit' and 'after' parameters.
+
+    Pass format=ndjson to stream the wildlife as newline-delimited JSON (one object per line) instead of one big array.
+    Rows are read from the database and written out as they're produced, so memory use doesn't grow with the dataset.
+    This also works on the search routes, and can be combined with 'limit' and 'after' (there's no next_cursor; use the last ID).
+
     Example request:
     GET /api/get-wildlife/
+    GET /api/get-wildlife/?limit=100&after=42
+    GET /api/get-wildlife/?format=ndjson
 
     Example output:
     [
@@ -520,28 +532,79 @@ def get_wildlife():
         }
     ]
     """
-    all_wildlife = db_helpers.select_multiple("SELECT * FROM Wildlife")
-    out = []
-    for wildlife in all_wildlife:
-        field_values = db_helpers.select_multiple("SELECT * FROM FieldValues WHERE FieldValues.wildlife_id = ?",
-                                                  [wildlife["id"]])
-        cleaned_field_values = []
-        for fv in field_values:
-            field = db_helpers.select_one("SELECT * FROM Fields WHERE id = ?", [fv["field_id"]])
-            if field["type"] == "TEXT":
-                field_value = fv["value"]
-            elif field["type"] == "INTEGER":
-                field_value = int(fv["value"])
-            elif field["type"] == "ENUM":
-                field_value = fv["value"]
-            elif field["type"] == "IMAGE":
-                field_value = fv["value"]
-            else:
-                raise NotImplementedError("Unsupported field type '{}'".format(field["type"]))
-
-            cleaned_field_values.append({"field_id": field["id"], "value": field_value, "name": field["name"]})
-        out.append({**wildlife, "field_values": cleaned_field_values})
-    return jsonify(out), 200
+    try:
+        limit, after = get_page_args()
+        response_format = get_response_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Paginate the Wildlife rows before joining, so a page never cuts a wildlife's field values in half
+    wildlife_query, params = add_keyset_clause("SELECT * FROM Wildlife w WHERE 1 = 1", [], limit, after)
+    rows = db_helpers.select_iter(f"""
+        SELECT w.id, w.category_id, w.thumbnail_id, w.name, w.scientific_name,
+               fv.field_id, f.name AS field_name, f.type AS field_type,
+               CASE WHEN f.type = 'INTEGER' THEN iv.value ELSE fv.value END AS field_value
+        FROM ({wildlife_query}) w
+        LEFT JOIN FieldValues fv ON fv.wildlife_id = w.id
+        LEFT JOIN Fields f ON f.id = fv.field_id
+        LEFT JOIN IntegerFieldValues iv ON iv.wildlife_id = fv.wildlife_id AND iv.field_id = fv.field_id
+        ORDER BY w.id, fv.field_id
+    """, params)
+    return page_response(group_wildlife_rows(rows), limit, response_format)
+
+
+def get_non_integer_field_names(valid_fields, provided_values):
+    """
+    Helper function.
+    Returns the names of the INTEGER fields in valid_fields whose provided value isn't a whole number.
+    """
+    non_integer_field_names = []
+    for field in valid_fields:
+        if field["type"] != "INTEGER" or field["name"] not in provided_values:
+            continue
+        try:
+            int(provided_values[field["name"]])
+        except ValueError:
+            non_integer_field_names.append(field["name"])
+    return non_integer_field_names
+
+
+def normalize_integer_field_values(valid_fields, provided_values):
+    """
+    Helper function.
+    Rewrites the values of the INTEGER fields in provided_values (in place) in their plain form, e.g. " +1_000" becomes "1000".
+    int() accepts more spellings than SQLite's CAST, which fills IntegerFieldValues, so values are stored the way CAST reads them.
+    Call it after get_non_integer_field_names has found no invalid values.
+    """
+    for field in valid_fields:
+        if field["type"] == "INTEGER" and field["name"] in provided_values:
+            provided_values[field["name"]] = str(int(provided_values[field["name"]]))
+
+
+WILDLIFE_COLUMNS = ("id", "category_id", "thumbnail_id", "name", "scientific_name")
+
+
+def group_wildlife_rows(rows):
+    """
+    Helper function.
+    Takes rows of Wildlife LEFT JOINed with FieldValues and Fields, ordered by wildlife ID,
+    and yields one wildlife dict (with its "field_values" list) per wildlife, in a single pass.
+    """
+    current = None
+    for row in rows:
+        if current is None or current["id"] != row["id"]:
+            if current is not None:
+                yield current
+            current = {column: row[column] for column in WILDLIFE_COLUMNS}
+            current["field_values"] = []
+        if row["field_id"] is not None and row["field_type"] is not None:
+            current["field_values"].append({
+                "field_id": row["field_id"],
+                "value": row["field_value"],
+                "name": row["field_name"],
+            })
+    if current is not None:
+        yield current
 
 
 @wildlife_bp.route("/api/get-wildlife-by-id/<int:wildlife_id>", methods=["GET"])
@@ -570,15 +633,12 @@ def get_wildlife_by_id(wildlife_id):
     field_values = db_helpers.select_multiple("SELECT * FROM FieldValues WHERE wildlife_id = ?", [wildlife_id])
     custom_fields = {fv["field_id"]: fv["value"] for fv in field_values}
 
-    # Retrieve field names
-    field_names = db_helpers.select_multiple("SELECT id, name FROM Fields")
-    field_names_dict = {field["id"]: field["name"] for field in field_names}
-
     # Add custom field names and values to wildlife data
+    fields = get_field_registry().by_id
     for field_id, value in custom_fields.items():
-        field_name = field_names_dict.get(field_id)
-        if field_name:
-            wildlife[field_name] = value
+        field = fields.get(field_id)
+        if field:
+            wildlife[field["name"]] = value
 
     return jsonify(wildlife), 200
 
@@ -673,7 +733,6 @@ def edit_field():
 
 @wildlife_bp.route("/api/delete-field/", methods=["DELETE"])
 def delete_field():
-    print("Received request to delete field")
     """
     Deletes a field by ID. 
     Requires 'field_id' and 'category_id'
@@ -693,7 +752,7 @@ def delete_field():
     But for the sake of completeness, and perhaps futured debugging, 
     we will check if the field exists and if it is associated with the category
     """
-    print("Deleting field with ID:", field_id, "from category ID:", category_id)
+    logger.debug("Deleting field %s from category %s", field_id, category_id)
 
     row = db_helpers.select_one(
     """
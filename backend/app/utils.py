@@ -1,53 +1,167 @@
+import itertools
+import json
 import os
+import re
 import uuid
 from werkzeug.utils import secure_filename
-from flask import jsonify
-from app import db_helpers
+from flask import Response, jsonify, request, stream_with_context
+from app import db_helpers, image_index
+
+MAX_PAGE_SIZE = 1000
+RESPONSE_FORMATS = ("json", "ndjson")
 
 def get_subcategory_ids(top_level_category_ids):
     """
     Helper function.
     Returns the input (top_level_category_ids) with its subcategory IDs added as well.
+    IDs of categories that don't exist are dropped. It's a single indexed lookup in CategoryClosure.
     """
     if not top_level_category_ids:
         return []
 
-    # Create a placeholder string for SQL query
     placeholders = ','.join('?' for _ in top_level_category_ids)
+    rows = db_helpers.select_multiple(
+        f"SELECT DISTINCT descendant_id FROM CategoryClosure WHERE ancestor_id IN ({placeholders})", list(top_level_category_ids))
+    return [row["descendant_id"] for row in rows]
+
 
-    # Construct the recursive query to find all subcategories
-    sql_query = f"""
-    WITH RECURSIVE subcategories(id) AS (
-        SELECT id FROM Categories WHERE id IN ({placeholders})
-        UNION ALL
-        SELECT c.id FROM Categories c INNER JOIN subcategories sc ON c.parent_id = sc.id
-    )
-    SELECT DISTINCT id FROM subcategories
+def get_parent_ids(category_id):
     """
-    all_category_ids = db_helpers.select_multiple(sql_query, top_level_category_ids)
-    return [row['id'] for row in all_category_ids]
+    Retrieves a list of parent category IDs for a given category, including the category itself, nearest first.
+    """
+    rows = db_helpers.select_multiple(
+        "SELECT ancestor_id FROM CategoryClosure WHERE descendant_id = ? ORDER BY depth", [category_id])
+    if not rows:
+        return jsonify({"error": "Category not found"}), 404
+    return [row["ancestor_id"] for row in rows]
 
 
-def get_parent_ids(category_id):
+def get_category_fields(category_id):
     """
-    Retrieves a list of parent category IDs for a given category, including the category itself.
+    Helper function.
+    Returns the fields ({"id", "name", "type"}) of a category, including those inherited from its parent categories,
+    or None if the category doesn't exist. It's one query: the category's ancestors come from CategoryClosure, joined to their fields.
     """
-    sql_query = """
-    WITH RECURSIVE parent_categories(id, parent_id) AS (
-        SELECT id, parent_id FROM Categories WHERE id = ?
-        UNION ALL
-        SELECT c.id, c.parent_id FROM Categories c INNER JOIN parent_categories pc ON c.id = pc.parent_id
-    )
-    SELECT id FROM parent_categories
+    # The LEFT JOINs keep a row for the category itself even if it has no fields, so a missing category can be told apart
+    rows = db_helpers.select_multiple("""
+        SELECT DISTINCT f.id, f.name, f.type
+        FROM CategoryClosure c
+        LEFT JOIN FieldsToCategories ftc ON ftc.category_id = c.ancestor_id
+        LEFT JOIN Fields f ON f.id = ftc.field_id
+        WHERE c.descendant_id = ?
+        ORDER BY f.id
+    """, [category_id])
+    if not rows:
+        return None
+    return [row for row in rows if row["id"] is not None]
+
+
+def category_filter_clause(category_ids, column="w.category_id"):
+    """
+    Helper function.
+    Returns an SQL condition (and its params) that's true when `column` is one of category_ids or any of their subcategories.
+    It's a single indexed lookup in CategoryClosure, so it costs the same however deep the category tree is.
     """
+    placeholders = ','.join('?' for _ in category_ids)
+    sql = f"{column} IN (SELECT descendant_id FROM CategoryClosure WHERE ancestor_id IN ({placeholders}))"
+    return sql, list(category_ids)
 
-    parent_ids = db_helpers.select_multiple(sql_query, [category_id])
-    if not parent_ids:
-        return jsonify({"error": "Category not found"}), 404
 
-    # Extracting the IDs from the result rows
-    parent_ids_list = [row['id'] for row in parent_ids]
-    return parent_ids_list
+def get_page_args():
+    """
+    Helper function.
+    Reads the optional keyset pagination parameters from the query string:
+    'limit' (how many wildlife to return) and 'after' (the next_cursor of the previous page; omit it for the first page).
+    Returns (limit, after); limit is None if the client didn't ask for pagination.
+    Raises ValueError if either parameter is invalid.
+    """
+    limit = request.args.get("limit")
+    after = request.args.get("after")
+    if limit is None:
+        return None, None
+    try:
+        limit = int(limit)
+        after = int(after) if after else None
+    except ValueError:
+        raise ValueError("'limit' and 'after' must be integers")
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    return limit, after
+
+
+def add_keyset_clause(sql_query, params, limit, after, id_column="w.id"):
+    """
+    Helper function.
+    Appends a seek condition and ordering on the wildlife ID to a query that already has a WHERE clause.
+    One extra row is requested so that page_response can tell whether there's another page.
+    Returns (sql_query, params) unchanged when limit is None.
+    """
+    if limit is None:
+        return sql_query, params
+    params = list(params)
+    if after is not None:
+        sql_query += f" AND {id_column} > ?"
+        params.append(after)
+    sql_query += f" ORDER BY {id_column} LIMIT ?"
+    params.append(limit + 1)
+    return sql_query, params
+
+
+def get_response_format():
+    """
+    Helper function.
+    Reads the optional 'format' parameter from the query string: 'json' (the default) or 'ndjson'.
+    Raises ValueError for anything else.
+    """
+    response_format = request.args.get("format", "json")
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"'format' must be one of: {', '.join(RESPONSE_FORMATS)}")
+    return response_format
+
+
+def ndjson_response(results):
+    """
+    Helper function.
+    Streams an iterable of dicts as newline-delimited JSON, one object per line.
+    The rows are serialized as they're produced, so the request context (and its DB connection) is kept open until the stream ends.
+    """
+    def generate():
+        for result in results:
+            yield json.dumps(result) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def page_response(results, limit, response_format="json"):
+    """
+    Helper function.
+    Without pagination, returns the results as a plain JSON array.
+    With pagination, returns {"results": [...], "next_cursor": <id or null>}; pass next_cursor as 'after' to get the next page.
+    With response_format='ndjson', streams the results (at most limit of them) as NDJSON instead; results may then be a lazy iterator.
+    """
+    if response_format == "ndjson":
+        return ndjson_response(itertools.islice(results, limit))
+    results = list(results)
+    if limit is None:
+        return jsonify(results), 200
+    page = results[:limit]
+    next_cursor = page[-1]["id"] if len(results) > limit else None
+    return jsonify({"results": page, "next_cursor": next_cursor}), 200
+
+
+def to_fts_query(user_query, prefix=True):
+    """
+    Helper function.
+    Turns text from the search bar into an FTS5 MATCH expression that requires every word in it.
+    Each word is quoted, so characters that mean something to FTS5 are treated as plain text.
+    With prefix=True, each word also matches longer words that start with it (e.g. "fo" matches "fox").
+    Returns None if the query contains no words.
+    """
+    words = re.findall(r"\w+", user_query or "")
+    if not words:
+        return None
+    suffix = "*" if prefix else ""
+    return " ".join(f'"{word}"{suffix}' for word in words)
 
 
 def save_file(file, upload_folder):
@@ -57,4 +171,5 @@ def save_file(file, upload_folder):
     unique_filename = f"{uuid.uuid4().hex}.{extension}"
     file_path = os.path.join(upload_folder, unique_filename)
     file.save(file_path)
+    image_index.add_image(unique_filename, upload_folder)
     return unique_filename
\ No newline at end of file
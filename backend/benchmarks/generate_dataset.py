@@ -0,0 +1,189 @@
+"""
+Generates a synthetic dataset for benchmarking, straight into a database file (and its upload folder).
+
+The category tree is `depth` levels of `fan_out` children under one root. Each category gets `fields_per_category` fields of its own,
+cycling through the field types, so a wildlife in a deeper category has more (inherited) fields. Wildlife are spread evenly over the
+categories, with a value for every one of their fields, and `images_per_species` Images rows each, picked from `image_files` small
+files written to the upload folder (so image routes have real files to serve). Values come from a seeded random generator,
+so the same spec always produces the same dataset.
+
+Rows are written with executemany in one transaction, with the search indexes filled in afterwards (see db_helpers.bulk_load),
+so even a million wildlife take minutes rather than hours.
+
+Usage (from backend/):
+python -m benchmarks.generate_dataset benchmark_data/database.db --species 100000 --depth 3 --fan-out 5
+"""
+import argparse
+import dataclasses
+import itertools
+import os
+import random
+import time
+from dataclasses import dataclass
+
+from app import create_app, db_helpers
+
+FIELD_TYPES = ("TEXT", "INTEGER", "ENUM", "IMAGE")
+# Words for names and TEXT values, so full-text searches match a realistic share of rows
+SYLLABLES = ("ka", "lo", "mi", "ra", "te", "vu", "no", "si", "pa", "el", "or", "an", "ith", "ul", "be", "dra", "quo", "zen")
+TEXT_WORDS = ("forest", "grassland", "wetland", "coastal", "mountain", "desert", "urban", "river", "nocturnal", "diurnal",
+              "migratory", "solitary", "colonial", "herbivore", "carnivore", "omnivore", "endangered", "common", "rare", "native")
+MAX_INTEGER_VALUE = 1_000_000
+# The smallest valid GIF (a 1x1 transparent pixel)
+PLACEHOLDER_IMAGE = (b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00"
+                     b",\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;")
+INSERT_BATCH_SIZE = 10_000
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    depth: int = 3
+    fan_out: int = 4
+    species: int = 10_000
+    fields_per_category: int = 2
+    enum_options: int = 5
+    images_per_species: int = 2
+    image_files: int = 100
+    seed: int = 0
+
+
+def generate_dataset(db_path: str, spec: DatasetSpec = DatasetSpec(), image_upload_folder: str | None = None) -> dict[str, int]:
+    """
+    Creates the database at db_path (which mustn't exist yet) and fills it according to spec. The image files go in
+    image_upload_folder, by default an "uploaded_images" folder next to the database, like a dataset folder. Returns the row counts.
+    """
+    if os.path.exists(db_path):
+        raise FileExistsError(f"{db_path} already exists; generate into a new file")
+    image_upload_folder = image_upload_folder or os.path.join(os.path.dirname(os.path.abspath(db_path)), "uploaded_images")
+    os.makedirs(image_upload_folder, exist_ok=True)
+    rng = random.Random(spec.seed)
+
+    image_filenames = [f"benchmark_{i}.gif" for i in range(spec.image_files)]
+    for filename in image_filenames:
+        with open(os.path.join(image_upload_folder, filename), "wb") as image_file:
+            image_file.write(PLACEHOLDER_IMAGE)
+
+    # Bulk inserts are slow queries by design, so the slow query log is turned off
+    app = create_app({"TESTING": True, "DATABASE": db_path, "IMAGE_UPLOAD_FOLDER": image_upload_folder, "SLOW_QUERY_MS": None})
+    with app.app_context():
+        db_helpers.init_db()
+        categories = _category_tree(spec)
+        fields, field_ids_by_category = _fields(spec, categories)
+        with db_helpers.transaction():
+            db_helpers.mutate_many("INSERT INTO Categories (id, parent_id, name) VALUES (?, ?, ?)", categories)
+            db_helpers.mutate_many("INSERT INTO Fields (id, type, name) VALUES (?, ?, ?)",
+                                   [(field_id, field_type, name) for field_id, field_type, name, _ in fields])
+            db_helpers.mutate_many("INSERT INTO FieldsToCategories (field_id, category_id) VALUES (?, ?)",
+                                   [(field_id, category_id) for field_id, _, _, category_id in fields])
+            enum_options = {
+                field_id: [f"option {i}" for i in range(spec.enum_options)]
+                for field_id, field_type, _, _ in fields if field_type == "ENUM"
+            }
+            db_helpers.mutate_many("INSERT INTO EnumeratedOptions (field_id, option_value) VALUES (?, ?)",
+                                   [(field_id, option) for field_id, options in enum_options.items() for option in options])
+
+            # Each category's fields, including inherited ones
+            parents = {category_id: parent_id for category_id, parent_id, _ in categories}
+            category_fields = {}
+            for category_id, _, _ in categories:
+                field_ids, ancestor_id = [], category_id
+                while ancestor_id is not None:
+                    field_ids += field_ids_by_category[ancestor_id]
+                    ancestor_id = parents[ancestor_id]
+                category_fields[category_id] = [(field_id, fields[field_id - 1][1]) for field_id in sorted(field_ids)]
+
+            category_ids = [category_id for category_id, _, _ in categories]
+            with db_helpers.bulk_load(1):
+                for batch in _batched(range(1, spec.species + 1), INSERT_BATCH_SIZE):
+                    _insert_wildlife(batch, spec, rng, category_ids, category_fields, enum_options, image_filenames)
+
+        counts = {table: db_helpers.select_one(f"SELECT COUNT(*) AS n FROM {table}")["n"]
+                  for table in ("Categories", "Fields", "Wildlife", "FieldValues", "Images")}
+    db_helpers.close_pools()
+    return counts
+
+
+def _category_tree(spec: DatasetSpec) -> list[tuple[int, int | None, str]]:
+    """Returns (id, parent_id, name) for every category, parents before children"""
+    categories = [(1, None, "Category 1")]
+    level = [1]
+    for _ in range(spec.depth):
+        next_level = []
+        for parent_id in level:
+            for _ in range(spec.fan_out):
+                category_id = len(categories) + 1
+                categories.append((category_id, parent_id, f"Category {category_id}"))
+                next_level.append(category_id)
+        level = next_level
+    return categories
+
+
+def _fields(spec: DatasetSpec, categories) -> tuple[list[tuple[int, str, str, int]], dict[int, list[int]]]:
+    """Returns (id, type, name, category_id) for every field, and the IDs of each category's own fields"""
+    fields, field_ids_by_category = [], {}
+    for category_id, _, _ in categories:
+        field_ids_by_category[category_id] = []
+        for _ in range(spec.fields_per_category):
+            field_id = len(fields) + 1
+            field_type = FIELD_TYPES[(field_id - 1) % len(FIELD_TYPES)]
+            fields.append((field_id, field_type, f"{field_type.lower()} field {field_id}", category_id))
+            field_ids_by_category[category_id].append(field_id)
+    return fields, field_ids_by_category
+
+
+def _insert_wildlife(wildlife_ids, spec, rng, category_ids, category_fields, enum_options, image_filenames):
+    wildlife, field_values, images = [], [], []
+    for wildlife_id in wildlife_ids:
+        category_id = category_ids[wildlife_id % len(category_ids)]
+        # The ID keeps names unique; the words give searches something to match
+        name = f"{_word(rng).title()} {_word(rng)} {wildlife_id}"
+        scientific_name = f"{_word(rng).title()} {_word(rng)}{wildlife_id}"
+
+        image_paths = rng.sample(image_filenames, min(spec.images_per_species, len(image_filenames)))
+        first_image_id = (wildlife_id - 1) * spec.images_per_species + 1
+        for i, image_path in enumerate(image_paths):
+            images.append((first_image_id + i, wildlife_id, image_path))
+        wildlife.append((wildlife_id, category_id, first_image_id if image_paths else None, name, scientific_name))
+
+        for field_id, field_type in category_fields[category_id]:
+            if field_type == "TEXT":
+                value = " ".join(rng.choices(TEXT_WORDS, k=rng.randint(1, 6)))
+            elif field_type == "INTEGER":
+                value = str(rng.randint(0, MAX_INTEGER_VALUE))
+            elif field_type == "ENUM":
+                value = rng.choice(enum_options[field_id])
+            else:
+                value = rng.choice(image_filenames) if image_filenames else ""
+            field_values.append((wildlife_id, field_id, value))
+
+    db_helpers.mutate_many("INSERT INTO Wildlife (id, category_id, thumbnail_id, name, scientific_name) VALUES (?, ?, ?, ?, ?)", wildlife)
+    db_helpers.mutate_many("INSERT INTO Images (id, wildlife_id, image_path) VALUES (?, ?, ?)", images)
+    db_helpers.mutate_many("INSERT INTO FieldValues (wildlife_id, field_id, value) VALUES (?, ?, ?)", field_values)
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic wildlife dataset for benchmarking.")
+    parser.add_argument("db_path", help="Database file to create (must not exist)")
+    parser.add_argument("--image-upload-folder", help="Where to write the image files (default: uploaded_images next to the database)")
+    for spec_field in dataclasses.fields(DatasetSpec):
+        parser.add_argument(f"--{spec_field.name.replace('_', '-')}", type=int, default=spec_field.default)
+    args = parser.parse_args()
+
+    spec = DatasetSpec(**{spec_field.name: getattr(args, spec_field.name) for spec_field in dataclasses.fields(DatasetSpec)})
+    started_at = time.perf_counter()
+    counts = generate_dataset(args.db_path, spec, args.image_upload_folder)
+    print(f"Generated {args.db_path} in {time.perf_counter() - started_at:.1f}s: {counts}")
+
+
+if __name__ == "__main__":
+    main()
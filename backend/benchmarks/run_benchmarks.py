@@ -0,0 +1,346 @@
+"""
+Measures each route's throughput and latency against a dataset, through the Flask test client (so no network or server is involved),
+and writes the results as JSON, to compare between releases.
+
+The dataset (made with benchmarks.generate_dataset, or a real one) is copied to a temporary folder first, so the write routes
+don't change it and every run starts from the same data. Each route is called `iterations` times with randomized, seeded arguments
+(after a few untimed warm-up calls), one request at a time; the time includes reading the whole response body.
+
+Usage (from backend/):
+python -m benchmarks.run_benchmarks benchmark_data/database.db --iterations 200 --output results.json
+python -m benchmarks.run_benchmarks benchmark_data/database.db --compare baseline.json  # Exits with 1 if any route got slower
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from app import create_app, db_helpers
+from app.utils import get_category_fields
+from benchmarks.generate_dataset import PLACEHOLDER_IMAGE, SYLLABLES, TEXT_WORDS, MAX_INTEGER_VALUE
+from benchmarks.stats import summarize_latencies
+
+DEFAULT_ITERATIONS = 200
+WARMUP_ITERATIONS = 5
+# How many wildlife (picked at random) requests are made about
+SAMPLE_SIZE = 10_000
+# A route counts as slower than the baseline if its p95 grew by more than this fraction, and by at least REGRESSION_MIN_MS
+DEFAULT_TOLERANCE = 0.2
+REGRESSION_MIN_MS = 1.0
+
+
+@dataclass
+class DatasetInfo:
+    """What the benchmarks need to know about the dataset to make valid requests"""
+    wildlife: list[tuple[int, int]]  # (id, category_id) of a sample of wildlife
+    category_fields: dict[int, list[dict]]  # Each category's fields, including inherited ones
+    fields_by_type: dict[str, list[dict]]
+    enum_options: dict[int, list[str]]
+    image_ids: list[int]
+    image_filenames: list[str]
+    row_counts: dict[str, int]
+    created: int = 0  # How many wildlife create_wildlife has made so far, to keep their names unique
+
+
+@dataclass
+class RouteBenchmark:
+    """
+    A route to benchmark. `request` returns the keyword arguments for the test client's open() (path, method, query_string, data),
+    or None if the dataset has nothing to make that request about (e.g. no INTEGER fields). A route with a `cost` of n is only
+    called iterations / n times, for routes that read the whole dataset.
+    """
+    name: str
+    request: Callable[[random.Random, DatasetInfo], dict | None]
+    writes: bool = False
+    cost: int = 1
+
+
+def _random_wildlife(rng, info):
+    return rng.choice(info.wildlife) if info.wildlife else None
+
+
+def _choice_or_none(rng, items):
+    return rng.choice(items) if items else None
+
+
+def _get_wildlife_page(rng, info):
+    wildlife = _random_wildlife(rng, info)
+    return {"path": "/api/get-wildlife/", "query_string": {"limit": 100, "after": wildlife[0] if wildlife else 0}}
+
+
+def _get_wildlife_by_id(rng, info):
+    wildlife = _random_wildlife(rng, info)
+    return wildlife and {"path": f"/api/get-wildlife-by-id/{wildlife[0]}"}
+
+
+def _search_names(rng, info):
+    return {"path": "/api/search-wildlife-names/", "query_string": {"query": "".join(rng.choices(SYLLABLES, k=2)), "limit": 100}}
+
+
+def _search_text_field(rng, info):
+    text_field = _choice_or_none(rng, info.fields_by_type.get("TEXT"))
+    return text_field and {"path": "/api/search-wildlife-text-field/",
+                           "query_string": {"field_id": text_field["id"], "query": rng.choice(TEXT_WORDS), "limit": 100}}
+
+
+def _search_integer_field(rng, info):
+    integer_field = _choice_or_none(rng, info.fields_by_type.get("INTEGER"))
+    if integer_field is None:
+        return None
+    min_value = rng.randint(0, MAX_INTEGER_VALUE)
+    return {"path": "/api/search-wildlife-by-integer-field/", "query_string": {
+        "field_id": integer_field["id"], "min_value": min_value, "max_value": min_value + MAX_INTEGER_VALUE // 10, "limit": 100}}
+
+
+def _get_images_by_wildlife_id(rng, info):
+    wildlife = _random_wildlife(rng, info)
+    return wildlife and {"path": f"/api/get-images-by-wildlife-id/{wildlife[0]}"}
+
+
+def _get_image(rng, info):
+    filename = _choice_or_none(rng, info.image_filenames)
+    return filename and {"path": f"/api/get-image/{filename}"}
+
+
+def _get_image_by_image_id(rng, info):
+    image_id = _choice_or_none(rng, info.image_ids)
+    return image_id and {"path": f"/api/get-image-by-image-id/{image_id}"}
+
+
+def _field_value(rng, info, field_info):
+    if field_info["type"] == "INTEGER":
+        return str(rng.randint(0, MAX_INTEGER_VALUE))
+    if field_info["type"] == "ENUM":
+        return rng.choice(info.enum_options.get(field_info["id"]) or ["option"])
+    if field_info["type"] == "IMAGE":
+        return io.BytesIO(PLACEHOLDER_IMAGE), "benchmark.gif", "image/gif"
+    return " ".join(rng.choices(TEXT_WORDS, k=3))
+
+
+def _create_wildlife(rng, info):
+    category_id = rng.choice(list(info.category_fields))
+    info.created += 1
+    data = {"name": f"Benchmark wildlife {info.created}", "scientific_name": f"Benchmarkus {info.created}", "category_id": category_id}
+    for field_info in info.category_fields[category_id]:
+        data[field_info["name"]] = _field_value(rng, info, field_info)
+    return {"path": "/api/create-wildlife/", "method": "POST", "data": data}
+
+
+def _edit_wildlife(rng, info):
+    wildlife = _random_wildlife(rng, info)
+    if wildlife is None:
+        return None
+    wildlife_id, category_id = wildlife
+    editable = [field_info for field_info in info.category_fields[category_id] if field_info["type"] != "IMAGE"]
+    data = {"wildlife_id": wildlife_id, "category_id": category_id}
+    for field_info in editable[:2]:
+        data[field_info["name"]] = _field_value(rng, info, field_info)
+    return {"path": "/api/edit-wildlife/", "method": "POST", "data": data}
+
+
+ROUTE_BENCHMARKS = [
+    RouteBenchmark("get_wildlife_page", _get_wildlife_page),
+    RouteBenchmark("get_wildlife_all_ndjson", lambda rng, info: {"path": "/api/get-wildlife/", "query_string": {"format": "ndjson"}}, cost=20),
+    RouteBenchmark("get_wildlife_by_id", _get_wildlife_by_id),
+    RouteBenchmark("search_wildlife_names", _search_names),
+    RouteBenchmark("search_wildlife_text_field", _search_text_field),
+    RouteBenchmark("search_wildlife_by_integer_field", _search_integer_field),
+    RouteBenchmark("get_categories", lambda rng, info: {"path": "/api/get-categories/"}),
+    RouteBenchmark("get_categories_and_fields", lambda rng, info: {"path": "/api/get-categories-and-fields/"}),
+    RouteBenchmark("get_images_by_wildlife_id", _get_images_by_wildlife_id),
+    RouteBenchmark("get_image", _get_image),
+    RouteBenchmark("get_image_by_image_id", _get_image_by_image_id),
+    RouteBenchmark("export_wildlife_ndjson", lambda rng, info: {"path": "/api/export/", "query_string": {"part": "wildlife"}}, cost=20),
+    RouteBenchmark("create_wildlife", _create_wildlife, writes=True),
+    RouteBenchmark("edit_wildlife", _edit_wildlife, writes=True),
+]
+
+
+def load_dataset_info(seed: int) -> DatasetInfo:
+    """Reads what the benchmarks need from the active dataset. Needs an app context."""
+    fields = db_helpers.select_multiple("SELECT id, name, type FROM Fields")
+    fields_by_type = {}
+    for field_info in fields:
+        fields_by_type.setdefault(field_info["type"], []).append(field_info)
+    enum_options = {}
+    for option in db_helpers.select_multiple("SELECT field_id, option_value FROM EnumeratedOptions"):
+        enum_options.setdefault(option["field_id"], []).append(option["option_value"])
+    category_ids = [row["id"] for row in db_helpers.select_multiple("SELECT id FROM Categories")]
+
+    rng = random.Random(seed)
+    max_wildlife_id = db_helpers.select_one("SELECT COALESCE(MAX(id), 0) AS id FROM Wildlife")["id"]
+    sample_ids = rng.sample(range(1, max_wildlife_id + 1), min(SAMPLE_SIZE, max_wildlife_id))
+    wildlife = []
+    for start in range(0, len(sample_ids), 500):
+        chunk = sample_ids[start:start + 500]
+        rows = db_helpers.select_multiple(f"SELECT id, category_id FROM Wildlife WHERE id IN ({','.join('?' for _ in chunk)})", chunk)
+        wildlife += [(row["id"], row["category_id"]) for row in rows]
+
+    return DatasetInfo(
+        wildlife=sorted(wildlife),
+        category_fields={category_id: get_category_fields(category_id) for category_id in category_ids},
+        fields_by_type=fields_by_type,
+        enum_options=enum_options,
+        image_ids=[row["id"] for row in db_helpers.select_multiple("SELECT id FROM Images ORDER BY random() LIMIT ?", [SAMPLE_SIZE])],
+        image_filenames=[row["image_path"] for row in db_helpers.select_multiple(
+            "SELECT DISTINCT image_path FROM Images LIMIT ?", [SAMPLE_SIZE])],
+        row_counts={table: db_helpers.select_one(f"SELECT COUNT(*) AS n FROM {table}")["n"]
+                    for table in ("Categories", "Fields", "Wildlife", "FieldValues", "Images")},
+    )
+
+
+def benchmark_route(client, benchmark: RouteBenchmark, info: DatasetInfo, iterations: int, seed: int) -> dict | None:
+    """Calls the route `iterations` times (plus warm-up calls) and returns its statistics, or None if it can't be called on this dataset"""
+    rng = random.Random(seed)
+    latencies, errors, query_counts = [], 0, []
+    first_error = None
+    for i in range(WARMUP_ITERATIONS + iterations):
+        request_args = benchmark.request(rng, info)
+        if request_args is None:
+            return None
+        started_at = time.perf_counter()
+        response = client.open(**request_args)
+        response.get_data()
+        latency = time.perf_counter() - started_at
+        response.close()
+        if i < WARMUP_ITERATIONS:
+            continue
+        latencies.append(latency)
+        query_counts.append(int(response.headers.get("X-Query-Count", 0)))
+        if response.status_code >= 400:
+            errors += 1
+            first_error = first_error or f"{response.status_code}: {response.get_data(as_text=True)[:200]}"
+
+    results = {"requests": len(latencies), "errors": errors, **summarize_latencies(latencies, sum(latencies)),
+               "mean_queries": round(sum(query_counts) / len(query_counts), 2)}
+    if first_error:
+        results["first_error"] = first_error
+    return results
+
+
+def run_benchmarks(db_path: str, image_upload_folder: str | None = None, iterations: int = DEFAULT_ITERATIONS, seed: int = 0,
+                   route_names: list[str] | None = None, include_writes: bool = True) -> dict:
+    """Benchmarks the routes against a copy of the dataset, and returns the results (see the module docstring)"""
+    image_upload_folder = image_upload_folder or os.path.join(os.path.dirname(os.path.abspath(db_path)), "uploaded_images")
+    benchmarks = [benchmark for benchmark in ROUTE_BENCHMARKS
+                  if (route_names is None or benchmark.name in route_names) and (include_writes or not benchmark.writes)]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_copy = os.path.join(temp_dir, "database.db")
+        _copy_database(db_path, db_copy)
+        upload_folder_copy = os.path.join(temp_dir, "uploaded_images")
+        if os.path.isdir(image_upload_folder):
+            shutil.copytree(image_upload_folder, upload_folder_copy)
+        else:
+            os.mkdir(upload_folder_copy)
+
+        app = create_app({"TESTING": True, "DATABASE": db_copy, "IMAGE_UPLOAD_FOLDER": upload_folder_copy,
+                          "LOG_LEVEL": "WARNING", "SLOW_QUERY_MS": None})
+        with app.app_context():
+            db_helpers.init_db()
+            info = load_dataset_info(seed)
+
+        routes = {}
+        try:
+            with app.test_client() as client:
+                for benchmark in benchmarks:
+                    results = benchmark_route(client, benchmark, info, max(iterations // benchmark.cost, 1), seed)
+                    if results is not None:
+                        routes[benchmark.name] = results
+        finally:
+            db_helpers.close_pools()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "iterations": iterations,
+            "seed": seed,
+            "row_counts": info.row_counts,
+        },
+        "routes": routes,
+    }
+
+
+def _copy_database(source: str, destination: str):
+    """Copies a database consistently, even if a server is writing to it, with SQLite's backup API"""
+    source_conn, destination_conn = sqlite3.connect(source), sqlite3.connect(destination)
+    try:
+        source_conn.backup(destination_conn)
+    finally:
+        source_conn.close()
+        destination_conn.close()
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list[str]:
+    """Compares each route's p95 latency and error count with the baseline results, and describes the routes that got worse"""
+    regressions = []
+    for name, route in results["routes"].items():
+        old = baseline.get("routes", {}).get(name)
+        if old is None:
+            continue
+        if route["p95_ms"] > old["p95_ms"] * (1 + tolerance) and route["p95_ms"] - old["p95_ms"] >= REGRESSION_MIN_MS:
+            regressions.append(f"{name}: p95 went from {old['p95_ms']} ms to {route['p95_ms']} ms")
+        if route["errors"] > old["errors"]:
+            regressions.append(f"{name}: errors went from {old['errors']} to {route['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API routes against a dataset.")
+    parser.add_argument("db_path", help="The dataset's database file (it isn't modified)")
+    parser.add_argument("--image-upload-folder", help="The dataset's images (default: uploaded_images next to the database)")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="Requests per route")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--route", action="append", dest="routes", choices=[benchmark.name for benchmark in ROUTE_BENCHMARKS],
+                        help="Only benchmark this route (can be given more than once)")
+    parser.add_argument("--no-writes", action="store_true", help="Skip the routes that change the database")
+    parser.add_argument("--output", help="Write the results here instead of to stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="Results of an earlier run; exit with 1 if any route got slower")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="How much slower counts as a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.db_path, args.image_upload_folder, args.iterations, args.seed, args.routes, not args.no_writes)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+    for name, route in results["routes"].items():
+        print(f"{name:36} {route['throughput_rps']:>9.1f} req/s  p50 {route['p50_ms']:>8.2f} ms  p95 {route['p95_ms']:>8.2f} ms  "
+              f"p99 {route['p99_ms']:>8.2f} ms  errors {route['errors']}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""Latency statistics shared by the benchmarks and the load test"""
+import math
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    """Returns the nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize_latencies(latencies: list[float], elapsed: float) -> dict[str, float]:
+    """Returns the throughput and latency statistics (in milliseconds) of requests that took `latencies` seconds, over `elapsed` seconds"""
+    latencies = sorted(latencies)
+    return {
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
@@ -0,0 +1,276 @@
+"""
+A load generator for a running backend: a pool of concurrent workers sends a weighted mix of requests for a fixed time,
+then throughput, error rates and latency percentiles are reported, overall and for each kind of request.
+
+Use it to size a deployment (raise --workers until the p99 or the error rate is no longer acceptable), or to reproduce SQLite
+lock contention by giving writes a larger share of the mix. A write that can't get the database's write lock before the busy timeout
+gets a 503, which is counted as a "database is locked" error.
+
+The kinds of request (and their default share of the mix) are:
+- list: a page of get-wildlife (40)
+- search: a name, text field or integer field search, picked at random (25)
+- image: an image file, by image ID or filename (20)
+- edit: edit-wildlife on an existing wildlife (10)
+- create: create-wildlife in a random category (5)
+
+Example (from backend/, with the server running):
+python load_test.py --workers 16 --duration 60
+python load_test.py --workers 32 --duration 30 --mix list=20,search=10,create=35,edit=35 --output results.json
+
+Like api_callers.py, it talks to the server at BASE_URL. It reads a sample of the dataset first, to make requests about
+wildlife, fields and images that exist. Created wildlife are left in the dataset, so point it at a test dataset (--dataset).
+"""
+import argparse
+import io
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import requests
+
+from api_callers import BASE_URL, complain_if_server_not_running
+from benchmarks.stats import summarize_latencies
+
+DEFAULT_MIX = {"list": 40, "search": 25, "image": 20, "edit": 10, "create": 5}
+DEFAULT_WORKERS = 8
+DEFAULT_DURATION = 30
+REQUEST_TIMEOUT = 30
+# How many wildlife to read up front, to make requests about
+SAMPLE_SIZE = 1000
+# How many of the sampled wildlife to look up images for
+IMAGE_SAMPLE_SIZE = 50
+SEARCH_WORDS = ("a", "e", "ka", "lo", "ra", "forest", "river", "common", "rare")
+# The smallest valid GIF, for IMAGE fields of created wildlife
+PLACEHOLDER_IMAGE = (b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00"
+                     b",\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;")
+
+
+@dataclass
+class Target:
+    """The server to load, and a sample of its dataset to make requests about"""
+    base_url: str
+    params: dict  # Sent with every request (the dataset)
+    wildlife: list[tuple[int, int]] = field(default_factory=list)  # (id, category_id)
+    category_fields: dict[int, list[dict]] = field(default_factory=dict)  # Each category's fields, including inherited ones
+    fields_by_type: dict[str, list[dict]] = field(default_factory=dict)
+    image_ids: list[int] = field(default_factory=list)
+    image_filenames: list[str] = field(default_factory=list)
+
+
+def load_target(base_url: str = BASE_URL, dataset: str | None = None) -> Target:
+    """Reads the categories, fields and a sample of wildlife and images from the server"""
+    target = Target(base_url, {"dataset": dataset} if dataset else {})
+    with requests.Session() as session:
+        categories_and_fields = _get_json(session, target, "/get-categories-and-fields/")
+        fields = {int(field_id): field_info for field_id, field_info in categories_and_fields["fields"].items()}
+        for field_info in fields.values():
+            target.fields_by_type.setdefault(field_info["type"], []).append(field_info)
+        for category_id, category in categories_and_fields["categories"].items():
+            target.category_fields[int(category_id)] = [fields[field_id] for field_id in category["field_ids"] if field_id in fields]
+
+        wildlife = _get_json(session, target, "/get-wildlife/", {"limit": SAMPLE_SIZE})["results"]
+        target.wildlife = [(entry["id"], entry["category_id"]) for entry in wildlife]
+        for wildlife_id, _ in target.wildlife[:IMAGE_SAMPLE_SIZE]:
+            for image in _get_json(session, target, f"/get-images-by-wildlife-id/{wildlife_id}"):
+                target.image_ids.append(image["id"])
+                target.image_filenames.append(image["image_path"])
+    return target
+
+
+def _get_json(session, target, path, params=None):
+    response = session.get(f"{target.base_url}{path}", params={**target.params, **(params or {})}, timeout=REQUEST_TIMEOUT)
+    if response.status_code != 200:
+        raise Exception(f"Failed to read {path} (server returned {response.status_code}). Full response: {response.text}")
+    return response.json()
+
+
+# Each operation makes one request and returns the response, or None if the sample has nothing to make it about
+
+def _list(session, rng, target):
+    after = rng.choice(target.wildlife)[0] if target.wildlife else 0
+    return session.get(f"{target.base_url}/get-wildlife/", params={**target.params, "limit": 100, "after": after}, timeout=REQUEST_TIMEOUT)
+
+
+def _search(session, rng, target):
+    text_fields, integer_fields = target.fields_by_type.get("TEXT"), target.fields_by_type.get("INTEGER")
+    kind = rng.choice(["names"] + ["text"] * bool(text_fields) + ["integer"] * bool(integer_fields))
+    if kind == "text":
+        path, params = "/search-wildlife-text-field/", {"field_id": rng.choice(text_fields)["id"], "query": rng.choice(SEARCH_WORDS)}
+    elif kind == "integer":
+        min_value = rng.randint(0, 1_000_000)
+        path, params = "/search-wildlife-by-integer-field/", {
+            "field_id": rng.choice(integer_fields)["id"], "min_value": min_value, "max_value": min_value + 100_000}
+    else:
+        path, params = "/search-wildlife-names/", {"query": rng.choice(SEARCH_WORDS)}
+    return session.get(f"{target.base_url}{path}", params={**target.params, **params, "limit": 100}, timeout=REQUEST_TIMEOUT)
+
+
+def _image(session, rng, target):
+    if not target.image_ids:
+        return None
+    if rng.random() < 0.5:
+        url = f"{target.base_url}/get-image-by-image-id/{rng.choice(target.image_ids)}"
+    else:
+        url = f"{target.base_url}/get-image/{rng.choice(target.image_filenames)}"
+    return session.get(url, params=target.params, timeout=REQUEST_TIMEOUT)
+
+
+def _field_value(rng, field_info):
+    if field_info["type"] == "INTEGER":
+        return str(rng.randint(0, 1_000_000))
+    if field_info["type"] == "ENUM":
+        return f"option {rng.randint(0, 4)}"
+    return " ".join(rng.choices(SEARCH_WORDS, k=3))
+
+
+def _edit(session, rng, target):
+    if not target.wildlife:
+        return None
+    wildlife_id, category_id = rng.choice(target.wildlife)
+    data = {"wildlife_id": wildlife_id, "category_id": category_id}
+    for field_info in target.category_fields.get(category_id, [])[:3]:
+        if field_info["type"] != "IMAGE":
+            data[field_info["name"]] = _field_value(rng, field_info)
+    return session.post(f"{target.base_url}/edit-wildlife/", params=target.params, data=data, timeout=REQUEST_TIMEOUT)
+
+
+def _create(session, rng, target):
+    if not target.category_fields:
+        return None
+    category_id = rng.choice(list(target.category_fields))
+    # Unique across workers and runs
+    suffix = uuid.uuid4().hex[:12]
+    data = {"name": f"Load test {suffix}", "scientific_name": f"Loadtestus {suffix}", "category_id": category_id}
+    files = {}
+    for field_info in target.category_fields[category_id]:
+        if field_info["type"] == "IMAGE":
+            files[field_info["name"]] = ("load_test.gif", io.BytesIO(PLACEHOLDER_IMAGE), "image/gif")
+        else:
+            data[field_info["name"]] = _field_value(rng, field_info)
+    return session.post(f"{target.base_url}/create-wildlife/", params=target.params, data=data, files=files or None,
+                        timeout=REQUEST_TIMEOUT)
+
+
+OPERATIONS = {"list": _list, "search": _search, "image": _image, "edit": _edit, "create": _create}
+
+
+def classify_error(response: requests.Response | None, exception: Exception | None = None) -> str | None:
+    """Returns what went wrong with a request ("database is locked", "HTTP 500", "ConnectionError", ...), or None if it succeeded"""
+    if exception is not None:
+        return type(exception).__name__
+    if response.status_code < 400:
+        return None
+    if "database is locked" in response.text or "database is busy" in response.text:
+        return "database is locked"
+    return f"HTTP {response.status_code}"
+
+
+def _worker(target: Target, mix: dict[str, int], deadline: float, seed: int, stop: threading.Event):
+    """Sends requests until the deadline, and returns (operation, seconds, error) for each one"""
+    rng = random.Random(seed)
+    operations, weights = list(mix), list(mix.values())
+    records = []
+    with requests.Session() as session:
+        while time.perf_counter() < deadline and not stop.is_set():
+            operation = rng.choices(operations, weights)[0]
+            started_at = time.perf_counter()
+            try:
+                response = OPERATIONS[operation](session, rng, target)
+                if response is None:
+                    continue
+                error = classify_error(response)
+            except requests.RequestException as e:
+                error = classify_error(None, e)
+            records.append((operation, time.perf_counter() - started_at, error))
+    return records
+
+
+def run_load_test(target: Target, workers: int = DEFAULT_WORKERS, duration: float = DEFAULT_DURATION,
+                  mix: dict[str, int] | None = None, seed: int = 0) -> dict:
+    """Runs `workers` concurrent workers for `duration` seconds, and returns the overall and per-operation statistics"""
+    mix = {operation: weight for operation, weight in (mix or DEFAULT_MIX).items() if weight > 0}
+    stop = threading.Event()
+    started_at = time.perf_counter()
+    deadline = started_at + duration
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_worker, target, mix, deadline, seed + i, stop) for i in range(workers)]
+        try:
+            records = [record for future in futures for record in future.result()]
+        except KeyboardInterrupt:
+            stop.set()
+            records = [record for future in futures for record in future.result()]
+    elapsed = time.perf_counter() - started_at
+
+    return {
+        "meta": {"base_url": target.base_url, "dataset": target.params.get("dataset"), "workers": workers,
+                 "duration_s": round(elapsed, 2), "mix": mix, "seed": seed},
+        "overall": _summarize(records, elapsed),
+        "operations": {operation: _summarize([record for record in records if record[0] == operation], elapsed) for operation in mix},
+    }
+
+
+def _summarize(records, elapsed: float) -> dict:
+    errors = {}
+    for _, _, error in records:
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+    n_errors = sum(errors.values())
+    return {
+        "requests": len(records),
+        "errors": n_errors,
+        "error_rate": round(n_errors / len(records), 4) if records else 0.0,
+        "errors_by_kind": errors,
+        **summarize_latencies([seconds for _, seconds, _ in records], elapsed),
+    }
+
+
+def parse_mix(text: str) -> dict[str, int]:
+    """Parses a mix like "list=40,search=25,create=5" (operations that aren't mentioned get no requests)"""
+    mix = {}
+    for part in text.split(","):
+        operation, _, weight = part.partition("=")
+        operation = operation.strip()
+        if operation not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation '{operation}' (expected one of {', '.join(OPERATIONS)})")
+        try:
+            mix[operation] = int(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"The weight of '{operation}' must be a whole number")
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("At least one operation needs a positive weight")
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a concurrent mix of requests to a running backend and report how it held up.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent workers, each sending one request at a time")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="Seconds to run for")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Relative weights of the operations, e.g. list=40,search=25,image=20,edit=10,create=5")
+    parser.add_argument("--dataset", help="Dataset to send requests to (default: the server's default dataset)")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    if args.base_url == BASE_URL:
+        complain_if_server_not_running()
+    target = load_target(args.base_url, args.dataset)
+    results = run_load_test(target, args.workers, args.duration, args.mix, args.seed)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    for name, stats in [("overall", results["overall"]), *results["operations"].items()]:
+        print(f"{name:8} {stats['requests']:>7} requests {stats['throughput_rps']:>8.1f} req/s  errors {stats['error_rate']:>7.2%}  "
+              f"p50 {stats['p50_ms']:>8.2f} ms  p95 {stats['p95_ms']:>8.2f} ms  p99 {stats['p99_ms']:>8.2f} ms")
+    for kind, count in results["overall"]["errors_by_kind"].items():
+        print(f"  {count} x {kind}")
+
+
+if __name__ == "__main__":
+    main()
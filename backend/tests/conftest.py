@@ -1,18 +1,42 @@
 import pytest
 import sys
 import os
+from io import BytesIO
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from app import create_app
+from app import db_helpers
 @pytest.fixture
-def client():
+def app(tmp_path):
+    (tmp_path / 'uploaded_images').mkdir()
     app = create_app({
         'TESTING': True,
-        'DATABASE': ':memory:',  # Use in-memory SQLite DB
-        'IMAGE_UPLOAD_FOLDER': '/tmp/test_uploaded_images',  # Use a temp folder
+        'DATABASE': str(tmp_path / 'database.db'),  # Use a throwaway DB file so pooled connections share the schema
+        'IMAGE_UPLOAD_FOLDER': str(tmp_path / 'uploaded_images'),  # Use a throwaway folder too
     })
+    with app.app_context():
+        db_helpers.init_db()
+    yield app
+    db_helpers.close_pools()
 
+
+@pytest.fixture
+def client(app):
     with app.test_client() as client:
-        with app.app_context():
-            # Initialize your schema here if needed
-            pass
-        yield client
\ No newline at end of file
+        yield client
+
+
+@pytest.fixture
+def add_image(client):
+    """
+    Returns a function that uploads an image through /api/add-image/ and returns its (image_id, image_path).
+    The image goes to wildlife_id if given, otherwise to a new "Luna Moth" in a new "Moths" category.
+    """
+    def add_image(data=b'0123456789', wildlife_id=None, filename='moth.png'):
+        if wildlife_id is None:
+            category_id = client.post('/api/create-category/', data={'name': 'Moths'}).get_json()['category_id']
+            wildlife_id = client.post('/api/create-wildlife/', data={
+                'name': 'Luna Moth', 'scientific_name': 'Actias luna', 'category_id': category_id}).get_json()['wildlife_id']
+        response = client.post('/api/add-image/', data={'wildlife_id': wildlife_id, 'image_file': (BytesIO(data), filename, 'image/png')},
+                               content_type='multipart/form-data')
+        return response.get_json()['image_id'], response.get_json()['image_path']
+    return add_image
@@ -0,0 +1,40 @@
+import sqlite3
+
+from benchmarks.generate_dataset import DatasetSpec, generate_dataset
+from benchmarks.run_benchmarks import ROUTE_BENCHMARKS, find_regressions, run_benchmarks
+from benchmarks.stats import percentile
+
+SMALL_SPEC = DatasetSpec(depth=2, fan_out=2, species=40, fields_per_category=2, enum_options=3, images_per_species=2, image_files=5)
+
+def test_generate_dataset(tmp_path):
+    counts = generate_dataset(str(tmp_path / 'database.db'), SMALL_SPEC)
+    assert counts['Categories'] == 1 + 2 + 4
+    assert counts['Fields'] == 7 * 2
+    assert counts['Wildlife'] == 40
+    assert counts['Images'] == 80
+    assert len(list((tmp_path / 'uploaded_images').iterdir())) == 5
+
+def test_run_benchmarks(tmp_path):
+    db_path = str(tmp_path / 'database.db')
+    generate_dataset(db_path, SMALL_SPEC)
+    results = run_benchmarks(db_path, iterations=3)
+    assert set(results['routes']) == {benchmark.name for benchmark in ROUTE_BENCHMARKS}
+    for name, route in results['routes'].items():
+        assert route['errors'] == 0, (name, route.get('first_error'))
+        assert route['p50_ms'] <= route['p95_ms'] <= route['p99_ms'] <= route['max_ms']
+    assert results['meta']['row_counts']['Wildlife'] == 40
+    # The dataset itself isn't changed by the write routes
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM Wildlife").fetchone()[0] == 40
+    conn.close()
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 95) == 3
+
+def test_find_regressions():
+    baseline = {'routes': {'a': {'p95_ms': 10.0, 'errors': 0}, 'b': {'p95_ms': 10.0, 'errors': 0}}}
+    results = {'routes': {'a': {'p95_ms': 11.0, 'errors': 0}, 'b': {'p95_ms': 15.0, 'errors': 2}, 'c': {'p95_ms': 99.0, 'errors': 0}}}
+    assert find_regressions(results, baseline) == ["b: p95 went from 10.0 ms to 15.0 ms", "b: errors went from 0 to 2"]
@@ -0,0 +1,153 @@
+import pytest
+import json
+import logging
+from io import BytesIO
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def _create_moth_schema(client):
+    category_id = client.post('/api/create-category/', data={'name': 'Moths'}).get_json()['category_id']
+    client.post('/api/create-field/', data={'name': 'Wingspan', 'type': 'INTEGER', 'category_id': category_id})
+    client.post('/api/create-field/', data={'name': 'Habitat', 'type': 'TEXT', 'category_id': category_id})
+    return category_id
+
+def test_import_wildlife_csv(client):
+    category_id = _create_moth_schema(client)
+    csv_data = (
+        "name,scientific_name,category_id,Wingspan,Habitat\n"
+        f"Luna Moth,Actias luna,{category_id},11,Forests\n"
+        f"Atlas Moth,Attacus atlas,{category_id},wide,Forests\n"
+        f"Luna Moth,Actias luna 2,{category_id},11,Forests\n"
+        f"Rosy Maple Moth,Dryocampa rubicunda,{category_id},,Forests\n"
+        "Ghost Moth,Hepialus humuli,999,5,Meadows\n"
+    )
+    response = client.post('/api/import-wildlife/', data={'file': (BytesIO(csv_data.encode()), 'wildlife.csv')},
+                           content_type='multipart/form-data')
+    logger.debug(f"Response status: {response.status_code}, JSON: {response.get_json()}")
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['imported'] == 1
+    assert report['failed'] == 4
+    assert [error['row'] for error in report['errors']] == [2, 4, 5, 3]
+
+    wildlife = client.get('/api/get-wildlife/').get_json()
+    assert [w['name'] for w in wildlife] == ['Luna Moth']
+    assert {fv['name']: fv['value'] for fv in wildlife[0]['field_values']} == {'Wingspan': 11, 'Habitat': 'Forests'}
+    assert len(client.get('/api/search-wildlife-names/?query=luna').get_json()) == 1
+
+def test_import_wildlife_ndjson_body(client):
+    category_id = _create_moth_schema(client)
+    lines = [json.dumps({'name': f'Moth {i}', 'scientific_name': f'Mothus {i}', 'category_id': category_id,
+                         'Wingspan': i, 'Habitat': 'Forests'}) for i in range(50)]
+    lines.append('not json')
+    response = client.post('/api/import-wildlife/?format=ndjson', data='\n'.join(lines), content_type='application/x-ndjson')
+    report = response.get_json()
+    assert report['imported'] == 50
+    assert report['errors'][0]['row'] == 51
+    results = client.get('/api/search-wildlife-by-integer-field/?field_id=1&min_value=47').get_json()
+    assert sorted(w['name'] for w in results) == ['Moth 48', 'Moth 49']
+    assert len(client.get('/api/search-wildlife-text-field/?field_id=2&query=forest').get_json()) == 50
+
+def test_import_wildlife_unknown_format(client):
+    response = client.post('/api/import-wildlife/', data='name\n', content_type='text/plain')
+    assert response.status_code == 400
+
+def test_import_wildlife_unreadable_file(client):
+    category_id = _create_moth_schema(client)
+    lines = ["name,scientific_name,category_id,Wingspan,Habitat"]
+    lines += [f"Moth {i},Mothus {i},{category_id},{i},Forests" for i in range(2000)]
+    data = "\n".join(lines).encode() + b"\nBad \xff Moth,Mothus,1,1,Forests\n"
+    response = client.post('/api/import-wildlife/?format=csv', data=data, content_type='text/csv')
+    assert response.status_code == 400
+    report = response.get_json()
+    assert 'error' in report
+    # Every row read before the bad byte was still imported
+    assert 0 < report['imported'] == report['stopped_at_row'] - 1 <= 2000
+    assert len(client.get('/api/get-wildlife/').get_json()) == report['imported']
+
+def test_import_wildlife_failed_batch_frees_names(client, monkeypatch):
+    import sqlite3
+    from app.routes import bulk
+    category_id = _create_moth_schema(client)
+    monkeypatch.setattr(bulk, 'IMPORT_BATCH_SIZE', 1)
+    insert = bulk.WildlifeImporter._insert
+    calls = []
+    def fail_first_insert(self, rows, first_id):
+        calls.append(rows)
+        if len(calls) == 1:
+            raise sqlite3.IntegrityError("UNIQUE constraint failed")
+        insert(self, rows, first_id)
+    monkeypatch.setattr(bulk.WildlifeImporter, '_insert', fail_first_insert)
+
+    lines = [json.dumps({'name': 'Luna Moth', 'scientific_name': 'Actias luna', 'category_id': category_id,
+                         'Wingspan': 11, 'Habitat': 'Forests'})] * 2
+    report = client.post('/api/import-wildlife/?format=ndjson', data='\n'.join(lines), content_type='application/x-ndjson').get_json()
+    # The first row's batch failed, so its name wasn't taken and the second row goes in
+    assert report['imported'] == 1
+    assert [error['row'] for error in report['errors']] == [1]
+
+def test_import_wildlife_unexpected_batch_error_keeps_report(client, monkeypatch):
+    from app.routes import bulk
+    category_id = _create_moth_schema(client)
+    monkeypatch.setattr(bulk, 'IMPORT_BATCH_SIZE', 2)
+    insert = bulk.WildlifeImporter._insert
+    calls = []
+    def fail_second_insert(self, rows, first_id):
+        calls.append(rows)
+        if len(calls) == 2:
+            raise RuntimeError("disk full")
+        insert(self, rows, first_id)
+    monkeypatch.setattr(bulk.WildlifeImporter, '_insert', fail_second_insert)
+
+    lines = [json.dumps({'name': f'Moth {i}', 'scientific_name': f'Mothus {i}', 'category_id': category_id,
+                         'Wingspan': i, 'Habitat': 'Forests'}) for i in range(6)]
+    lines[2] = 'not json'
+    response = client.post('/api/import-wildlife/?format=ndjson', data='\n'.join(lines), content_type='application/x-ndjson')
+    assert response.status_code == 500
+    report = response.get_json()
+    # The first batch stays imported, the failing batch's rows are all reported, and nothing after it is read
+    assert report['imported'] == 2
+    assert report['stopped_at_row'] == 3
+    assert [error['row'] for error in report['errors']] == [3, 4]
+    assert 'disk full' in report['errors'][1]['error']
+    assert len(calls) == 2
+    assert sorted(w['name'] for w in client.get('/api/get-wildlife/').get_json()) == ['Moth 0', 'Moth 1']
+
+def _import_moths(client, category_id, count):
+    lines = [json.dumps({'name': f'Moth {i}', 'scientific_name': f'Mothus {i}', 'category_id': category_id,
+                         'Wingspan': i, 'Habitat': 'Forests'}) for i in range(count)]
+    client.post('/api/import-wildlife/?format=ndjson', data='\n'.join(lines), content_type='application/x-ndjson')
+
+def test_export_ndjson_all_parts(client, add_image):
+    category_id = _create_moth_schema(client)
+    _import_moths(client, category_id, 3)
+    add_image(wildlife_id=1)
+
+    response = client.get('/api/export/')
+    assert response.status_code == 200
+    assert response.is_streamed
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    parts = [row['part'] for row in rows]
+    assert parts == ['categories'] + ['fields'] * 2 + ['wildlife'] * 3 + ['field_values'] * 6 + ['images']
+    assert rows[1] == {'part': 'fields', 'id': 1, 'name': 'Wingspan', 'type': 'INTEGER', 'category_ids': str(category_id)}
+    assert rows[6] == {'part': 'field_values', 'wildlife_id': 1, 'field_id': 1, 'field_name': 'Wingspan', 'value': '0'}
+    assert rows[-1]['wildlife_id'] == 1 and rows[-1]['is_thumbnail'] == 0
+
+def test_export_csv_part(client):
+    category_id = _create_moth_schema(client)
+    _import_moths(client, category_id, 2)
+    response = client.get('/api/export/?format=csv&part=wildlife')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert 'attachment' in response.headers['Content-Disposition']
+    assert response.get_data(as_text=True).splitlines() == [
+        'id,name,scientific_name,category_id,thumbnail_id',
+        f'1,Moth 0,Mothus 0,{category_id},',
+        f'2,Moth 1,Mothus 1,{category_id},',
+    ]
+
+def test_export_rejects_bad_arguments(client):
+    assert client.get('/api/export/?format=xml').status_code == 400
+    assert client.get('/api/export/?part=everything').status_code == 400
+    assert client.get('/api/export/?format=csv').status_code == 400
@@ -0,0 +1,198 @@
+import pytest
+import logging
+import os
+
+from app import db_helpers, file_deletion, utils
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def _create_category(client, name, parent_id=None):
+    data = {'name': name}
+    if parent_id:
+        data['parent_id'] = parent_id
+    response = client.post('/api/create-category/', data=data)
+    assert response.status_code == 201
+    return response.get_json()['category_id']
+
+def test_category_closure_lookups(app, client):
+    animals = _create_category(client, 'Animals')
+    birds = _create_category(client, 'Birds', animals)
+    owls = _create_category(client, 'Owls', birds)
+    plants = _create_category(client, 'Plants')
+    with app.test_request_context():
+        assert sorted(utils.get_subcategory_ids([animals])) == [animals, birds, owls]
+        assert sorted(utils.get_subcategory_ids([birds, plants])) == [birds, owls, plants]
+        assert utils.get_parent_ids(str(owls)) == [owls, birds, animals]
+
+def test_category_lookups_follow_create_and_delete(app, client):
+    animals = _create_category(client, 'Animals')
+    birds = _create_category(client, 'Birds', animals)
+    with app.test_request_context():
+        assert sorted(utils.get_subcategory_ids([animals])) == [animals, birds]
+
+    owls = _create_category(client, 'Owls', birds)
+    with app.test_request_context():
+        assert sorted(utils.get_subcategory_ids([animals])) == [animals, birds, owls]
+
+    # Deleting Birds reassigns Owls to Animals
+    assert client.delete(f'/api/delete-category/?id={birds}').status_code == 200
+    with app.test_request_context():
+        assert sorted(utils.get_subcategory_ids([animals])) == [animals, owls]
+        assert utils.get_parent_ids(owls) == [owls, animals]
+
+    assert client.delete(f'/api/delete-category/?id={animals}&delete-members').status_code == 200
+    with app.test_request_context():
+        assert utils.get_subcategory_ids([animals]) == []
+
+def test_category_lookups_see_changes_from_other_connections(app, client):
+    import sqlite3
+    animals = _create_category(client, 'Animals')
+    with app.test_request_context():
+        assert utils.get_subcategory_ids([animals]) == [animals]
+    # As if another worker (or the sqlite3 shell) added a subcategory
+    conn = sqlite3.connect(app.config['DATABASE'])
+    conn.execute("INSERT INTO Categories (id, parent_id, name) VALUES (50, ?, 'Birds')", [animals])
+    conn.commit()
+    conn.close()
+    with app.test_request_context():
+        assert sorted(utils.get_subcategory_ids([animals])) == [animals, 50]
+        assert utils.get_parent_ids(50) == [50, animals]
+
+def test_search_uses_subcategories(client):
+    animals = _create_category(client, 'Animals')
+    birds = _create_category(client, 'Birds', animals)
+    client.post('/api/create-wildlife/', data={'name': 'Barn Owl', 'scientific_name': 'Tyto alba', 'category_id': birds})
+    response = client.get(f'/api/search-wildlife-names/?query=owl&category_id={animals}')
+    assert [w['name'] for w in response.get_json()] == ['Barn Owl']
+
+def _closure(app):
+    with app.app_context():
+        rows = db_helpers.select_multiple("SELECT ancestor_id, descendant_id, depth FROM CategoryClosure")
+    return {(row['ancestor_id'], row['descendant_id']): row['depth'] for row in rows}
+
+def test_category_closure_maintained(app, client):
+    animals = _create_category(client, 'Animals')
+    birds = _create_category(client, 'Birds', animals)
+    owls = _create_category(client, 'Owls', birds)
+    assert _closure(app) == {
+        (animals, animals): 0, (birds, birds): 0, (owls, owls): 0,
+        (animals, birds): 1, (birds, owls): 1, (animals, owls): 2,
+    }
+
+    # Deleting Birds moves Owls up to Animals
+    client.delete(f'/api/delete-category/?id={birds}')
+    assert _closure(app) == {(animals, animals): 0, (owls, owls): 0, (animals, owls): 1}
+
+def test_create_wildlife_fields_follow_closure_when_category_moves(client):
+    animals = _create_category(client, 'Animals')
+    birds = _create_category(client, 'Birds', animals)
+    owls = _create_category(client, 'Owls', birds)
+    client.post('/api/create-field/', data={'name': 'Habitat', 'type': 'TEXT', 'category_id': animals})
+    client.post('/api/create-field/', data={'name': 'Wingspan', 'type': 'INTEGER', 'category_id': birds})
+    # Owls inherit from both their grandparent and their parent
+    response = client.post('/api/create-wildlife/', data={'name': 'Barn Owl', 'scientific_name': 'Tyto alba', 'category_id': owls, 'Habitat': 'Barns'})
+    assert response.status_code == 400
+    assert 'Wingspan' in response.get_json()['error']
+    response = client.post('/api/create-wildlife/', data={
+        'name': 'Barn Owl', 'scientific_name': 'Tyto alba', 'category_id': owls, 'Habitat': 'Barns', 'Wingspan': '100'})
+    assert response.status_code == 201
+
+    # Deleting Birds moves Owls up to Animals, and the closure rows with it, so Owls lose Wingspan
+    client.delete(f'/api/delete-category/?id={birds}')
+    response = client.post('/api/create-wildlife/', data={
+        'name': 'Snowy Owl', 'scientific_name': 'Bubo scandiacus', 'category_id': owls, 'Habitat': 'Tundra', 'Wingspan': '140'})
+    assert response.status_code == 400
+    assert 'Wingspan' in response.get_json()['error']
+    response = client.post('/api/create-wildlife/', data={
+        'name': 'Snowy Owl', 'scientific_name': 'Bubo scandiacus', 'category_id': owls, 'Habitat': 'Tundra'})
+    assert response.status_code == 201
+
+def test_categories_and_fields_etag(client):
+    animals = _create_category(client, 'Animals')
+    birds = _create_category(client, 'Birds', animals)
+    client.post('/api/create-field/', data={'name': 'Habitat', 'type': 'TEXT', 'category_id': animals})
+
+    response = client.get('/api/get-categories-and-fields/')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['categories'][str(birds)]['field_ids'] == [1]
+    assert data['categories'][str(animals)]['subcategories'] == [birds]
+    etag = response.headers['ETag']
+    assert not etag.startswith('W/')
+
+    response = client.get('/api/get-categories-and-fields/', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    client.post('/api/create-field/', data={'name': 'Wingspan', 'type': 'INTEGER', 'category_id': birds})
+    response = client.get('/api/get-categories-and-fields/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert sorted(response.get_json()['categories'][str(birds)]['field_ids']) == [1, 2]
+
+def test_categories_and_fields_etag_follows_other_connections(app, client):
+    import sqlite3
+    _create_category(client, 'Animals')
+    etag = client.get('/api/get-categories-and-fields/').headers['ETag']
+    # As if another worker renamed the category
+    conn = sqlite3.connect(app.config['DATABASE'])
+    conn.execute("UPDATE Categories SET name = 'Fauna'")
+    conn.commit()
+    conn.close()
+    response = client.get('/api/get-categories-and-fields/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [category['name'] for category in response.get_json()['categories'].values()] == ['Fauna']
+
+def test_delete_category_members_removes_everything(app, client, add_image, monkeypatch):
+    animals = _create_category(client, 'Animals')
+    birds = _create_category(client, 'Birds', animals)
+    client.post('/api/create-field/', data={'name': 'Habitat', 'type': 'TEXT', 'category_id': birds})
+    for i in range(20):
+        client.post('/api/create-wildlife/', data={
+            'name': f'Bird {i}', 'scientific_name': f'Avis {i}', 'category_id': birds, 'Habitat': 'Forest'})
+        add_image(wildlife_id=i + 1, filename='bird.png')
+    with app.app_context():
+        conn = db_helpers.get_connection()
+        conn.execute("INSERT INTO Fields (id, name, type) VALUES (99, 'Colour', 'ENUM')")
+        conn.execute("INSERT INTO EnumeratedOptions (id, field_id, option_value) VALUES (1, 99, 'Brown')")
+        conn.execute("INSERT INTO EnumeratedFieldValues (wildlife_id, option_id) VALUES (1, 1)")
+        conn.commit()
+    upload_folder = app.config['IMAGE_UPLOAD_FOLDER']
+    assert len(os.listdir(upload_folder)) == 20
+
+    statements = []
+    original_delete = db_helpers.delete
+    def recording_delete(*args, **kwargs):
+        statements.append(args[0])
+        return original_delete(*args, **kwargs)
+    monkeypatch.setattr(db_helpers, 'delete', recording_delete)
+    assert client.delete(f'/api/delete-category/?id={animals}&delete-members').status_code == 200
+    monkeypatch.undo()
+
+    # One statement per table, however many wildlife there were
+    assert len(statements) == 6
+    assert file_deletion.wait_for_file_deletions(timeout=5)
+    assert os.listdir(upload_folder) == []
+    with app.app_context():
+        counts = db_helpers.select_one("""
+            SELECT (SELECT COUNT(*) FROM Wildlife) AS wildlife, (SELECT COUNT(*) FROM FieldValues) AS field_values,
+                   (SELECT COUNT(*) FROM EnumeratedFieldValues) AS enumerated, (SELECT COUNT(*) FROM Images) AS images,
+                   (SELECT COUNT(*) FROM FieldsToCategories) AS field_links, (SELECT COUNT(*) FROM Categories) AS categories
+        """)
+    assert counts == {'wildlife': 0, 'field_values': 0, 'enumerated': 0, 'images': 0, 'field_links': 0, 'categories': 0}
+
+def test_delete_category_members_large_subtree(app, client):
+    animals = _create_category(client, 'Animals')
+    plants = _create_category(client, 'Plants')
+    # More subcategories than older SQLite builds allow query parameters (999), so the subtree can't go in an IN (?, ?, ...) list
+    with app.app_context():
+        with db_helpers.transaction():
+            db_helpers.mutate_many("INSERT INTO Categories (parent_id, name) VALUES (?, ?)",
+                                   [(animals, f'Subcategory {i}') for i in range(1500)])
+    client.post('/api/create-wildlife/', data={'name': 'Deep Owl', 'scientific_name': 'Strix profunda', 'category_id': 1500})
+    client.post('/api/create-wildlife/', data={'name': 'Oak', 'scientific_name': 'Quercus robur', 'category_id': plants})
+
+    assert client.delete(f'/api/delete-category/?id={animals}&delete-members').status_code == 200
+    with app.app_context():
+        assert [row['id'] for row in db_helpers.select_multiple("SELECT id FROM Categories")] == [plants]
+        assert [row['name'] for row in db_helpers.select_multiple("SELECT name FROM Wildlife")] == ['Oak']
@@ -0,0 +1,173 @@
+import pytest
+import logging
+import sqlite3
+
+from app import db_helpers
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def test_connection_reused_within_app_context(app):
+    with app.app_context():
+        first = db_helpers.get_connection()
+        db_helpers.select_multiple("SELECT * FROM Categories")
+        assert db_helpers.get_connection() is first
+
+def test_connection_returned_to_pool(app):
+    with app.app_context():
+        conn = db_helpers.get_connection()
+        pool = db_helpers.get_pool(app.config["DATABASE"])
+        assert pool.in_use == 1
+    assert pool.in_use == 0
+    assert pool.idle >= 1
+    with app.app_context():
+        assert db_helpers.get_connection() is conn
+
+def test_pooled_connection_pragmas(app):
+    with app.app_context():
+        conn = db_helpers.get_connection()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == app.config["DB_CACHE_SIZE"]
+
+def test_init_db_backfills_search_index(app):
+    with app.app_context():
+        conn = db_helpers.get_connection()
+        conn.execute("INSERT INTO Categories (id, name) VALUES (1, 'Mammals')")
+        conn.execute("INSERT INTO Wildlife (category_id, name, scientific_name) VALUES (1, 'Red Fox', 'Vulpes vulpes')")
+        conn.execute("DELETE FROM WildlifeNameSearch")
+        conn.commit()
+    db_helpers.init_db(app.config["DATABASE"])
+    with app.app_context():
+        rows = db_helpers.select_multiple("SELECT rowid FROM WildlifeNameSearch WHERE WildlifeNameSearch MATCH 'fox'")
+        assert len(rows) == 1
+
+def test_init_db_backfills_category_closure(app):
+    with app.app_context():
+        conn = db_helpers.get_connection()
+        conn.execute("INSERT INTO Categories (id, name) VALUES (1, 'Animals')")
+        conn.execute("INSERT INTO Categories (id, name, parent_id) VALUES (2, 'Birds', 1)")
+        conn.execute("DELETE FROM CategoryClosure")
+        conn.commit()
+    db_helpers.init_db(app.config["DATABASE"])
+    with app.app_context():
+        rows = db_helpers.select_multiple("SELECT ancestor_id, descendant_id, depth FROM CategoryClosure ORDER BY ancestor_id, descendant_id")
+        assert [tuple(row.values()) for row in rows] == [(1, 1, 0), (1, 2, 1), (2, 2, 0)]
+
+def test_dataset_resolved_once_per_request(tmp_path):
+    from flask import g
+    from app import create_app
+    dataset_configs = {}
+    for name in ('butterflies', 'moths'):
+        folder = tmp_path / name
+        folder.mkdir()
+        dataset_configs[name] = {'name': name, 'db_path': str(folder / 'database.db'), 'image_upload_folder': str(folder / 'uploaded_images')}
+    app = create_app({'TESTING': True, 'DATASET_CONFIGS': dataset_configs, 'DEFAULT_DATASET': 'butterflies'})
+
+    with app.test_request_context('/api/get-wildlife/?dataset=Moths'):
+        app.preprocess_request()
+        assert g.dataset['key'] == 'moths'
+        assert db_helpers.get_active_database_path() == dataset_configs['moths']['db_path']
+    with app.test_request_context('/api/get-wildlife/'):
+        app.preprocess_request()
+        assert db_helpers.get_active_image_upload_folder() == dataset_configs['butterflies']['image_upload_folder']
+
+    client = app.test_client()
+    client.post('/api/create-category/?dataset=moths', data={'name': 'Moths'})
+    assert client.get('/api/get-categories/?dataset=moths').get_json()[0]['name'] == 'Moths'
+    assert client.get('/api/get-categories/').get_json() == []
+    assert client.get('/api/get-categories/?dataset=beetles').status_code == 400
+    db_helpers.close_pools()
+
+def test_transaction_rolls_back_on_error(app):
+    with app.app_context():
+        with pytest.raises(RuntimeError):
+            with db_helpers.transaction():
+                db_helpers.insert("INSERT INTO Categories (name) VALUES (?)", ["Animals"])
+                db_helpers.mutate_many("INSERT INTO Categories (name) VALUES (?)", [["Birds"], ["Owls"]])
+                raise RuntimeError("something went wrong halfway through")
+        assert db_helpers.select_multiple("SELECT * FROM Categories") == []
+
+def test_transaction_commits_once(app):
+    with app.app_context():
+        conn = db_helpers.get_connection()
+        with db_helpers.transaction():
+            db_helpers.insert("INSERT INTO Categories (name) VALUES (?)", ["Animals"])
+            with db_helpers.transaction():
+                db_helpers.mutate_many("INSERT INTO Categories (name) VALUES (?)", [["Birds"], ["Owls"]])
+            assert conn.in_transaction
+        assert not conn.in_transaction
+        assert len(db_helpers.select_multiple("SELECT * FROM Categories")) == 3
+
+def test_query_stats_headers(client):
+    response = client.get('/api/get-categories/')
+    count = int(response.headers['X-Query-Count'])
+    assert count >= 1
+    server_timing = response.headers['Server-Timing']
+    assert server_timing.startswith('db;dur=') and f'desc="{count} queries"' in server_timing
+    assert 'sql-1;dur=' in server_timing and 'SELECT' in server_timing
+
+def test_query_stats_keep_slowest(app):
+    stats = db_helpers.QueryStats()
+    for i, seconds in enumerate([0.001, 0.005, 0.002, 0.004, 0.003]):
+        stats.add(f"SELECT {i}", seconds)
+    assert stats.count == 5
+    assert stats.total_seconds == pytest.approx(0.015)
+    assert stats.slowest == [(0.005, "SELECT 1"), (0.004, "SELECT 3"), (0.003, "SELECT 4")]
+
+def test_slow_query_logged_with_plan(app, caplog):
+    app.config["SLOW_QUERY_MS"] = 0
+    with app.app_context(), caplog.at_level(logging.WARNING, logger="app.slow_queries"):
+        db_helpers.select_multiple("SELECT * FROM Wildlife WHERE category_id = ?", [1])
+        db_helpers.mutate_many("DELETE FROM Wildlife WHERE id = ?", [])
+    [record] = [r for r in caplog.records if r.name == "app.slow_queries" and "Wildlife WHERE category_id" in r.query]
+    assert record.params == [1]
+    assert any("Wildlife_category" in step for step in record.plan)
+    assert [r.plan for r in caplog.records if "DELETE" in r.query] == [None]
+
+@pytest.mark.parametrize("value, expected", [("250", 250.0), ("", None), ("None", None), (" off ", None)])
+def test_slow_query_ms_from_env(monkeypatch, value, expected):
+    from app import _slow_query_ms_from_env
+    monkeypatch.setenv("SLOW_QUERY_MS", value)
+    assert _slow_query_ms_from_env() == expected
+
+def test_slow_query_ms_from_env_rejects_junk(monkeypatch):
+    from app import _slow_query_ms_from_env
+    monkeypatch.setenv("SLOW_QUERY_MS", "fast")
+    with pytest.raises(ValueError, match="SLOW_QUERY_MS"):
+        _slow_query_ms_from_env()
+    monkeypatch.delenv("SLOW_QUERY_MS")
+    assert _slow_query_ms_from_env() == db_helpers.DEFAULT_SLOW_QUERY_MS
+
+def test_fast_queries_not_logged(app, caplog):
+    with app.app_context(), caplog.at_level(logging.WARNING, logger="app.slow_queries"):
+        db_helpers.select_multiple("SELECT * FROM Wildlife")
+        assert db_helpers.get_query_stats().count == 1
+    assert not [r for r in caplog.records if r.name == "app.slow_queries"]
+
+def test_database_locked_is_503(app, client):
+    def locked():
+        conn = sqlite3.connect(app.config['DATABASE'], timeout=0)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        finally:
+            conn.close()
+    app.add_url_rule('/api/test-locked/', 'test_locked', locked)
+    writer = sqlite3.connect(app.config['DATABASE'])
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        response = client.get('/api/test-locked/')
+    finally:
+        writer.rollback()
+        writer.close()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert 'database is locked' in response.get_json()['error']
+
+def test_other_database_errors_not_503(app, client):
+    def broken():
+        # Mentions "locked", but isn't SQLITE_BUSY or SQLITE_LOCKED
+        db_helpers.select_one("SELECT * FROM locked_out")
+    app.add_url_rule('/api/test-broken/', 'test_broken', broken)
+    with pytest.raises(sqlite3.OperationalError):
+        client.get('/api/test-broken/')
@@ -0,0 +1,69 @@
+import os
+import time
+import pytest
+
+from app import db_helpers, file_deletion
+
+def _add_image_file(app, add_image):
+    image_id, image_path = add_image()
+    return image_id, os.path.join(app.config['IMAGE_UPLOAD_FOLDER'], image_path)
+
+def _pending_deletions(app):
+    with app.app_context():
+        return db_helpers.select_multiple("SELECT file_path, attempts, last_error FROM PendingFileDeletions")
+
+def test_delete_image_removes_file_in_background(app, client, add_image):
+    image_id, file_path = _add_image_file(app, add_image)
+    assert os.path.exists(file_path)
+    assert client.delete(f'/api/delete_image/?id={image_id}').status_code == 200
+    assert file_deletion.wait_for_file_deletions(timeout=5)
+    assert not os.path.exists(file_path)
+    assert _pending_deletions(app) == []
+
+def test_failed_file_deletion_is_retried(app, client, add_image, monkeypatch):
+    image_id, file_path = _add_image_file(app, add_image)
+    monkeypatch.setattr(file_deletion, 'FILE_DELETION_RETRY_DELAY', 0.05)
+    original_remove = os.remove
+    failures = []
+    def flaky_remove(path):
+        if not failures:
+            failures.append(path)
+            raise PermissionError("Mount is busy")
+        original_remove(path)
+    monkeypatch.setattr(os, 'remove', flaky_remove)
+
+    client.delete(f'/api/delete_image/?id={image_id}')
+    deadline = time.time() + 5
+    while os.path.exists(file_path) and time.time() < deadline:
+        time.sleep(0.02)
+    assert failures == [file_path]
+    assert not os.path.exists(file_path)
+    assert file_deletion.wait_for_file_deletions(timeout=5)
+    assert _pending_deletions(app) == []
+
+def test_queued_deletions_are_discarded_on_rollback(app, add_image):
+    _, file_path = _add_image_file(app, add_image)
+    with app.app_context():
+        with pytest.raises(RuntimeError):
+            with db_helpers.transaction():
+                file_deletion.queue_file_deletions([file_path])
+                raise RuntimeError("Something went wrong after queueing")
+        file_deletion.start_file_deletions()
+    assert file_deletion.wait_for_file_deletions(timeout=5)
+    assert os.path.exists(file_path)
+    assert _pending_deletions(app) == []
+
+def test_queued_deletions_resume_on_startup(app):
+    # As if the server stopped after committing the queue but before deleting the file
+    file_path = os.path.join(app.config['IMAGE_UPLOAD_FOLDER'], 'left_behind.png')
+    with open(file_path, 'wb') as file:
+        file.write(b'fake')
+    with app.app_context():
+        with db_helpers.transaction():
+            file_deletion.queue_file_deletions([file_path])
+
+    from app import create_app
+    create_app({'TESTING': True, 'DATABASE': app.config['DATABASE'], 'IMAGE_UPLOAD_FOLDER': app.config['IMAGE_UPLOAD_FOLDER']})
+    assert file_deletion.wait_for_file_deletions(timeout=5)
+    assert not os.path.exists(file_path)
+    assert _pending_deletions(app) == []
@@ -0,0 +1,122 @@
+import os
+import time
+import pytest
+from io import BytesIO
+
+from app import db_helpers, image_gc
+
+def _make_old(path):
+    an_hour_ago = time.time() - 2 * 60 * 60
+    os.utime(path, (an_hour_ago, an_hour_ago))
+
+@pytest.fixture
+def upload_folder(app, client, add_image):
+    """An upload folder with images referenced by an Images row and by an IMAGE field, plus orphans old and new"""
+    folder = app.config['IMAGE_UPLOAD_FOLDER']
+    category_id = client.post('/api/create-category/', data={'name': 'Moths'}).get_json()['category_id']
+    client.post('/api/create-field/', data={'name': 'Photo', 'type': 'IMAGE', 'category_id': category_id})
+    wildlife_id = client.post('/api/create-wildlife/', data={
+        'name': 'Luna Moth', 'scientific_name': 'Actias luna', 'category_id': category_id,
+        'Photo': (BytesIO(b'photo'), 'photo.png', 'image/png')}, content_type='multipart/form-data').get_json()['wildlife_id']
+    add_image(wildlife_id=wildlife_id)
+    for i in range(5):
+        with open(os.path.join(folder, f'orphan{i}.png'), 'wb') as file:
+            file.write(b'orphan')
+    with open(os.path.join(folder, 'new_orphan.png'), 'wb') as file:
+        file.write(b'new')
+    with open(os.path.join(folder, '.gitkeep'), 'wb'):
+        pass
+    for filename in os.listdir(folder):
+        if filename != 'new_orphan.png':
+            _make_old(os.path.join(folder, filename))
+    return folder
+
+def test_collect_orphan_images(app, upload_folder):
+    stats = image_gc.collect_orphan_images(upload_folder, [app.config['DATABASE']], batch_size=2)
+    assert stats == {'scanned': 8, 'orphaned': 5, 'deleted': 5, 'bytes_freed': 30}
+    remaining = sorted(os.listdir(upload_folder))
+    assert '.gitkeep' in remaining and 'new_orphan.png' in remaining
+    assert not any(filename.startswith('orphan') for filename in remaining)
+    assert len(remaining) == 4  # Plus the Images row's file and the IMAGE field's file
+
+def test_collect_orphan_images_dry_run(app, upload_folder):
+    stats = image_gc.collect_all_orphan_images(app, dry_run=True)[upload_folder]
+    assert stats['orphaned'] == 5 and stats['deleted'] == 0
+    assert len(os.listdir(upload_folder)) == 9
+
+def test_gc_images_command(app, upload_folder):
+    result = app.test_cli_runner().invoke(args=['gc-images', '--min-age', '0'])
+    assert result.exit_code == 0
+    assert "'deleted': 6" in result.output
+
+def test_reference_check_uses_indexes(app):
+    query = image_gc._REFERENCED_FILENAMES_QUERY.format(placeholders='?, ?')
+    with app.app_context():
+        plan = db_helpers.select_multiple(f"EXPLAIN QUERY PLAN {query}", ['a.png', 'b.png'] * 2)
+    details = ' '.join(row['detail'] for row in plan)
+    assert 'Images_path' in details and 'FieldValues_field_value' in details
+
+def test_dataset_image_fields_are_collected(tmp_path):
+    from app import create_app
+    dataset_configs = {}
+    for name in ('butterflies', 'moths'):
+        (tmp_path / name / 'uploaded_images').mkdir(parents=True)
+        dataset_configs[name] = {'name': name, 'db_path': str(tmp_path / name / 'database.db'),
+                                 'image_upload_folder': str(tmp_path / name / 'uploaded_images')}
+    (tmp_path / 'uploaded_images').mkdir()
+    app = create_app({'TESTING': True, 'DATASET_CONFIGS': dataset_configs, 'DEFAULT_DATASET': 'butterflies',
+                      'IMAGE_UPLOAD_FOLDER': str(tmp_path / 'uploaded_images')})
+    client = app.test_client()
+    category_id = client.post('/api/create-category/?dataset=moths', data={'name': 'Moths'}).get_json()['category_id']
+    client.post('/api/create-field/?dataset=moths', data={'name': 'Photo', 'type': 'IMAGE', 'category_id': category_id})
+    client.post('/api/create-wildlife/?dataset=moths', data={
+        'name': 'Luna Moth', 'scientific_name': 'Actias luna', 'category_id': category_id,
+        'Photo': (BytesIO(b'photo'), 'photo.png', 'image/png')}, content_type='multipart/form-data')
+    # IMAGE field files go to the dataset's own folder, like every other upload
+    [photo] = os.listdir(dataset_configs['moths']['image_upload_folder'])
+    with open(tmp_path / 'uploaded_images' / 'orphan.png', 'wb') as file:
+        file.write(b'orphan')
+
+    stats = image_gc.collect_all_orphan_images(app, min_age=0)
+    assert stats[str(tmp_path / 'uploaded_images')]['deleted'] == 1
+    assert stats[dataset_configs['moths']['image_upload_folder']]['deleted'] == 0
+    assert os.listdir(dataset_configs['moths']['image_upload_folder']) == [photo]
+    db_helpers.close_pools()
+
+def test_collect_orphan_images_skips_files_deleted_during_scan(app, upload_folder, monkeypatch):
+    class Entry:
+        """A DirEntry whose file is deleted by someone else between scandir listing it and the stat() call"""
+        def __init__(self, entry):
+            self._entry = entry
+            self.name, self.path = entry.name, entry.path
+        def is_file(self, **kwargs):
+            return self._entry.is_file(**kwargs)
+        def stat(self, **kwargs):
+            if self.name == 'orphan0.png':
+                os.remove(self.path)
+            return self._entry.stat(**kwargs)
+    scandir = os.scandir
+    class Scandir:
+        def __init__(self, path):
+            self._entries = scandir(path)
+        def __enter__(self):
+            return (Entry(entry) for entry in self._entries.__enter__())
+        def __exit__(self, *exc):
+            return self._entries.__exit__(*exc)
+    monkeypatch.setattr(os, 'scandir', Scandir)
+    stats = image_gc.collect_orphan_images(upload_folder, [app.config['DATABASE']])
+    assert stats['deleted'] == 4
+    assert not any(filename.startswith('orphan') for filename in os.listdir(upload_folder))
+
+def test_reference_check_fits_older_sqlite_variable_limit(app, monkeypatch):
+    import sqlite3
+    connect = db_helpers.ConnectionPool._connect
+    def connect_with_limit(pool):
+        conn = connect(pool)
+        conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        return conn
+    db_helpers.close_pools()
+    monkeypatch.setattr(db_helpers.ConnectionPool, '_connect', connect_with_limit)
+    filenames = [f'image{i}.png' for i in range(1000)]
+    assert image_gc._referenced_filenames([app.config['DATABASE']], filenames) == set()
+    db_helpers.close_pools()
@@ -0,0 +1,55 @@
+import os
+import pytest
+
+from app import file_deletion, image_index
+
+def _forbid_stat_calls(monkeypatch):
+    def fail(*args):
+        raise AssertionError("Image lookup checked the disk")
+    monkeypatch.setattr(os.path, 'exists', fail)
+
+def test_saved_image_served_from_index(app, client, add_image, monkeypatch):
+    _, filename = add_image()
+    assert image_index.folders_with_image(filename) == (app.config['IMAGE_UPLOAD_FOLDER'],)
+    _forbid_stat_calls(monkeypatch)
+    response = client.get(f'/api/get-image/{filename}')
+    assert response.status_code == 200
+    assert response.get_data() == b'0123456789'
+
+def test_index_built_at_startup(app):
+    folder = app.config['IMAGE_UPLOAD_FOLDER']
+    with open(os.path.join(folder, 'existing.png'), 'wb') as file:
+        file.write(b'old')
+    with open(os.path.join(folder, '.gitkeep'), 'wb'):
+        pass
+    image_index.build_image_index([folder])
+    assert image_index.folders_with_image('existing.png') == (folder,)
+    assert image_index.folders_with_image('.gitkeep') == ()
+
+def test_unindexed_image_found_on_disk_and_indexed(app, client):
+    folder = app.config['IMAGE_UPLOAD_FOLDER']
+    with open(os.path.join(folder, 'copied_in.png'), 'wb') as file:
+        file.write(b'copied')
+    assert image_index.folders_with_image('copied_in.png') == ()
+    assert client.get('/api/get-image/copied_in.png').status_code == 200
+    assert image_index.folders_with_image('copied_in.png') == (folder,)
+    assert client.get('/api/get-image/missing.png').status_code == 404
+
+def test_deleted_image_removed_from_index(client, add_image):
+    image_id, filename = add_image()
+    client.delete(f'/api/delete_image/?id={image_id}')
+    assert file_deletion.wait_for_file_deletions(timeout=5)
+    assert image_index.folders_with_image(filename) == ()
+    assert client.get(f'/api/get-image/{filename}').status_code == 404
+
+def test_missing_image_not_looked_for_on_every_request(app, client, monkeypatch):
+    assert client.get('/api/get-image/missing.png').status_code == 404
+    with monkeypatch.context() as patch:
+        _forbid_stat_calls(patch)
+        assert client.get('/api/get-image/missing.png').status_code == 404
+
+    # Once the miss has expired, a file another process put there is found
+    with open(os.path.join(app.config['IMAGE_UPLOAD_FOLDER'], 'missing.png'), 'wb') as file:
+        file.write(b'late')
+    monkeypatch.setattr(image_index, 'MISS_TTL', 0)
+    assert client.get('/api/get-image/missing.png').status_code == 200
@@ -56,4 +56,43 @@ def test_delete_image_nonexistent_id(client):
     logger.debug(f"Response status: {response.status_code}, JSON: {response.get_json()}")
     assert response.status_code == 404
     assert response.is_json
-    assert 'error' in response.get_json() 
\ No newline at end of file
+    assert 'error' in response.get_json() 
+
+def test_get_image_is_cached_forever(client, add_image):
+    _, filename = add_image()
+    response = client.get(f'/api/get-image/{filename}')
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"{filename}"'
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == 365 * 24 * 60 * 60
+
+    revalidation = client.get(f'/api/get-image/{filename}', headers={'If-None-Match': f'"{filename}"'})
+    assert revalidation.status_code == 304
+    assert revalidation.get_data() == b''
+
+def test_get_image_range(client, add_image):
+    _, filename = add_image()
+    response = client.get(f'/api/get-image/{filename}', headers={'Range': 'bytes=2-5'})
+    assert response.status_code == 206
+    assert response.get_data() == b'2345'
+    assert response.headers['Content-Range'] == 'bytes 2-5/10'
+
+def test_get_image_by_id_revalidates(client, add_image):
+    image_id, filename = add_image()
+    response = client.get(f'/api/get-image-by-image-id/{image_id}')
+    assert response.status_code == 200
+    assert response.cache_control.no_cache and not response.cache_control.immutable
+    assert client.get(f'/api/get-image-by-image-id/{image_id}', headers={'If-None-Match': f'"{filename}"'}).status_code == 304
+
+@pytest.mark.parametrize('mode, header', [('x-accel-redirect', 'X-Accel-Redirect'), ('x-sendfile', 'X-Sendfile')])
+def test_get_image_through_proxy(app, client, add_image, mode, header):
+    app.config['IMAGE_SENDFILE'] = mode
+    _, filename = add_image()
+    response = client.get(f'/api/get-image/{filename}')
+    assert response.status_code == 200
+    assert response.get_data() == b''
+    assert response.mimetype == 'image/png'
+    assert response.headers[header].endswith(f"{app.config['IMAGE_UPLOAD_FOLDER']}/{filename}")
+    if mode == 'x-accel-redirect':
+        assert response.headers[header].startswith('/protected-images/')
+    assert client.get(f'/api/get-image/{filename}', headers={'If-None-Match': f'"{filename}"'}).status_code == 304
@@ -0,0 +1,46 @@
+import threading
+import pytest
+
+pytest.importorskip('requests')
+from werkzeug.serving import make_server
+
+import load_test
+from benchmarks.generate_dataset import DatasetSpec, generate_dataset
+from app import create_app, db_helpers
+
+@pytest.fixture
+def server_url(tmp_path):
+    db_path = str(tmp_path / 'database.db')
+    generate_dataset(db_path, DatasetSpec(depth=1, fan_out=2, species=30, image_files=3))
+    app = create_app({'TESTING': True, 'DATABASE': db_path, 'IMAGE_UPLOAD_FOLDER': str(tmp_path / 'uploaded_images')})
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/api'
+    server.shutdown()
+    db_helpers.close_pools()
+
+def test_load_test_against_server(server_url):
+    target = load_test.load_target(server_url)
+    assert len(target.wildlife) == 30 and target.image_ids and target.category_fields
+    results = load_test.run_load_test(target, workers=3, duration=1.0)
+    assert results['overall']['requests'] > 0
+    assert results['overall']['errors'] == 0, results['overall']['errors_by_kind']
+    assert set(results['operations']) == set(load_test.DEFAULT_MIX)
+    assert sum(stats['requests'] for stats in results['operations'].values()) == results['overall']['requests']
+
+def test_parse_mix():
+    assert load_test.parse_mix('list=3, create=1') == {'list': 3, 'create': 1}
+    with pytest.raises(Exception):
+        load_test.parse_mix('delete=1')
+    with pytest.raises(Exception):
+        load_test.parse_mix('list=0')
+
+def test_classify_error():
+    class FakeResponse:
+        def __init__(self, status_code, text=''):
+            self.status_code, self.text = status_code, text
+    assert load_test.classify_error(FakeResponse(200)) is None
+    assert load_test.classify_error(FakeResponse(503, '{"error": "The database is busy (database is locked); try again"}')) == 'database is locked'
+    assert load_test.classify_error(FakeResponse(500)) == 'HTTP 500'
+    assert load_test.classify_error(None, ConnectionError()) == 'ConnectionError'
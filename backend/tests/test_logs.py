@@ -0,0 +1,61 @@
+import io
+import json
+import logging
+import pytest
+
+from app import logs
+
+@pytest.fixture
+def log_stream(app):
+    stream = io.StringIO()
+    logs.configure_logging("INFO", stream=stream)
+    yield stream
+    logs.configure_logging(app.config["LOG_LEVEL"])
+
+def _records(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def test_request_logged_as_json_with_context(client, log_stream):
+    response = client.get('/api/ping/', headers={'X-Request-ID': 'abc123'})
+    assert response.headers['X-Request-ID'] == 'abc123'
+    [record] = _records(log_stream)
+    assert record['message'] == 'request'
+    assert record['level'] == 'info'
+    assert record['request_id'] == 'abc123'
+    assert record['path'] == '/api/ping/' and record['status'] == 200
+    assert 'dataset' in record and record['duration_ms'] >= 0
+
+def test_request_id_generated(client, log_stream):
+    first = client.get('/api/ping/').headers['X-Request-ID']
+    second = client.get('/api/ping/').headers['X-Request-ID']
+    assert first and second and first != second
+    assert [record['request_id'] for record in _records(log_stream)] == [first, second]
+
+def test_debug_messages_not_formatted_when_off(client, log_stream):
+    class Expensive:
+        def __str__(self):
+            raise AssertionError("A disabled debug message was formatted")
+    logging.getLogger('app.test').debug("Value: %s", Expensive())
+    # select_one logs every query at debug level
+    client.get('/api/get-wildlife-by-id/1')
+    assert all(record['level'] != 'debug' for record in _records(log_stream))
+
+def test_debug_level_turns_on_query_logging(client, log_stream):
+    logs.configure_logging("DEBUG", stream=log_stream)
+    client.get('/api/get-wildlife-by-id/1')
+    queries = [record for record in _records(log_stream) if record['message'].startswith('SELECT ONE')]
+    assert queries and queries[0]['logger'] == 'app.db_helpers' and queries[0]['request_id']
+
+def test_streamed_request_logged_when_body_sent(client, log_stream):
+    client.post('/api/create-category/', data={'name': 'Moths'})
+    response = client.get('/api/export/', headers={'X-Request-ID': 'export1'})
+    assert response.is_streamed
+    assert 'X-Query-Count' not in response.headers
+    # Only create-category has been logged so far
+    assert [record['path'] for record in _records(log_stream)] == ['/api/create-category/']
+    response.get_data()
+    response.close()
+    record = _records(log_stream)[-1]
+    assert record['message'] == 'request' and record['request_id'] == 'export1'
+    # The export's queries all run while the body is sent
+    assert record['query_count'] >= 4 and record['duration_ms'] >= 0
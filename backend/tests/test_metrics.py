@@ -0,0 +1,62 @@
+import re
+import pytest
+
+from app import db_helpers, metrics
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+def _samples(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+def test_metrics_format(client):
+    client.get('/api/get-categories/')
+    client.get('/api/get-categories/')
+    client.get('/api/no-such-route/')
+    response = client.get('/api/metrics/')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.get_data(as_text=True)
+    samples = _samples(text)
+
+    assert samples['http_requests_total{method="GET",endpoint="category.get_categories",status="200"}'] == 2
+    assert samples['http_requests_total{method="GET",endpoint="unmatched",status="404"}'] == 1
+    assert samples['http_request_duration_seconds_count{endpoint="category.get_categories"}'] == 2
+    assert samples['http_request_duration_seconds_bucket{endpoint="category.get_categories",le="+Inf"}'] == 2
+    assert samples['app_db_queries_total{endpoint="category.get_categories"}'] >= 1
+    assert samples['app_dataset_rows_approx{dataset="default",table="Wildlife"}'] == 0
+    assert samples['app_dataset_db_size_bytes{dataset="default"}'] > 0
+    assert any(name.startswith('app_db_pool_connections{') for name in samples)
+    assert 'app_cache_hits_total{cache="field_registry"}' in samples
+    # Every sample belongs to a metric with HELP and TYPE lines
+    typed = set(re.findall(r'^# TYPE (\S+)', text, re.M))
+    assert all(re.sub(r'(_bucket|_sum|_count)?\{.*', '', name) in typed for name in samples)
+
+def test_histogram_buckets_are_cumulative():
+    for seconds in [0.001, 0.02, 0.02, 3.0, 60.0]:
+        metrics.record_request('GET', 'test', 200, seconds)
+    histogram = metrics._latencies['test']
+    assert histogram.count == 5
+    assert histogram.sum == pytest.approx(63.041)
+    buckets = dict(zip(histogram.buckets, histogram.counts))
+    assert buckets[0.005] == 1 and buckets[0.025] == 2 and buckets[5.0] == 1
+    assert histogram.counts[-1] == 1
+
+def test_label_values_escaped():
+    assert metrics._format_labels({'endpoint': 'a"b\\c\nd'}) == '{endpoint="a\\"b\\\\c\\nd"}'
+
+def test_dataset_row_counts_skip_table_scans(app, client):
+    client.post('/api/create-category/', data={'name': 'Moths'})
+    samples = _samples(client.get('/api/metrics/').get_data(as_text=True))
+    assert samples['app_dataset_rows_approx{dataset="default",table="Categories"}'] == 1
+    with app.app_context():
+        plan = db_helpers.select_multiple("EXPLAIN QUERY PLAN SELECT COALESCE(MAX(rowid), 0) FROM FieldValues")
+    assert not any(row['detail'].startswith('SCAN') for row in plan)
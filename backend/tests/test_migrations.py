@@ -0,0 +1,52 @@
+import sqlite3
+import pytest
+
+from app import db_helpers, migrations
+
+def _index_names(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+def test_new_database_is_at_latest_version(app):
+    latest_version = migrations.get_migrations()[-1][0]
+    with app.app_context():
+        conn = db_helpers.get_connection()
+        assert migrations.get_schema_version(conn) == latest_version
+        assert {'Wildlife_category', 'Categories_parent', 'FieldValues_field_value', 'Images_path',
+                'EnumeratedFieldValues_option'} <= _index_names(conn)
+
+def test_old_database_is_migrated(tmp_path):
+    db_path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(db_path)
+    # A database from before migrations existed: the original tables, with no extra indexes and user_version 0
+    conn.executescript("""
+        CREATE TABLE Categories (id INTEGER PRIMARY KEY, parent_id INTEGER, name TEXT NOT NULL UNIQUE);
+        CREATE TABLE Wildlife (id INTEGER PRIMARY KEY, category_id INTEGER NOT NULL, thumbnail_id INTEGER,
+                               name TEXT NOT NULL UNIQUE, scientific_name TEXT NOT NULL UNIQUE);
+        INSERT INTO Categories (id, name) VALUES (1, 'Mammals');
+        INSERT INTO Wildlife (category_id, name, scientific_name) VALUES (1, 'Red Fox', 'Vulpes vulpes');
+    """)
+    conn.close()
+
+    db_helpers.init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    assert migrations.get_schema_version(conn) == migrations.get_migrations()[-1][0]
+    assert 'Wildlife_category' in _index_names(conn)
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT id FROM Wildlife WHERE category_id = 1").fetchall()
+    assert any('Wildlife_category' in row[-1] for row in plan)
+    assert migrations.run_migrations(conn) == []
+    conn.close()
+
+def test_failed_migration_is_rolled_back(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'database.db')
+    db_helpers.init_db(db_path)
+    bad_migration = tmp_path / '0999_broken.sql'
+    bad_migration.write_text("CREATE TABLE Half (id INTEGER);\nTHIS IS NOT SQL;")
+    original_get_migrations = migrations.get_migrations
+    monkeypatch.setattr(migrations, 'get_migrations', lambda: original_get_migrations() + [(999, str(bad_migration))])
+
+    conn = sqlite3.connect(db_path)
+    with pytest.raises(sqlite3.Error):
+        migrations.run_migrations(conn)
+    assert migrations.get_schema_version(conn) == original_get_migrations()[-1][0]
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'Half'").fetchone() is None
+    conn.close()
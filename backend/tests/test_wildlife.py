@@ -31,3 +31,221 @@ def test_create_wildlife_missing_fields(client):
     # Should fail due to missing required fields
     assert response.status_code in (400, 500)
     assert response.is_json
+
+def _create_wildlife_with_fields(client, count):
+    category_id = client.post('/api/create-category/', data={'name': 'Moths'}).get_json()['category_id']
+    client.post('/api/create-field/', data={'name': 'Wingspan', 'type': 'INTEGER', 'category_id': category_id})
+    client.post('/api/create-field/', data={'name': 'Habitat', 'type': 'TEXT', 'category_id': category_id})
+    for i in range(count):
+        response = client.post('/api/create-wildlife/', data={
+            'name': f'Moth {i}', 'scientific_name': f'Mothus {i}', 'category_id': category_id,
+            'Wingspan': str(i), 'Habitat': 'Forest',
+        })
+        assert response.status_code == 201
+
+def _count_get_wildlife_queries(client, monkeypatch):
+    from app import db_helpers
+    calls = []
+    for helper in ('select_one', 'select_multiple', 'select_iter'):
+        original = getattr(db_helpers, helper)
+        def counting(*args, _original=original, **kwargs):
+            calls.append(args[0])
+            return _original(*args, **kwargs)
+        monkeypatch.setattr(db_helpers, helper, counting)
+    response = client.get('/api/get-wildlife/')
+    monkeypatch.undo()
+    assert response.status_code == 200
+    return len(calls), response.get_json()
+
+def test_get_wildlife_field_values(client):
+    _create_wildlife_with_fields(client, 2)
+    response = client.get('/api/get-wildlife/')
+    wildlife = response.get_json()
+    assert [w['name'] for w in wildlife] == ['Moth 0', 'Moth 1']
+    values = {fv['name']: fv['value'] for fv in wildlife[1]['field_values']}
+    assert values == {'Wingspan': 1, 'Habitat': 'Forest'}
+
+def test_get_wildlife_query_count_is_constant(client, monkeypatch):
+    _create_wildlife_with_fields(client, 1)
+    small_count, _ = _count_get_wildlife_queries(client, monkeypatch)
+    for i in range(1, 25):
+        client.post('/api/create-wildlife/', data={
+            'name': f'Moth {i}', 'scientific_name': f'Mothus {i}', 'category_id': 1,
+            'Wingspan': str(i), 'Habitat': 'Forest',
+        })
+    large_count, wildlife = _count_get_wildlife_queries(client, monkeypatch)
+    logger.debug(f"Queries for 1 wildlife: {small_count}, for {len(wildlife)} wildlife: {large_count}")
+    assert len(wildlife) == 25
+    assert large_count == small_count
+
+def test_get_wildlife_keyset_pagination(client):
+    _create_wildlife_with_fields(client, 5)
+    seen = []
+    after = None
+    while True:
+        url = '/api/get-wildlife/?limit=2' + (f'&after={after}' if after else '')
+        page = client.get(url).get_json()
+        assert len(page['results']) <= 2
+        seen.extend(w['name'] for w in page['results'])
+        assert all(len(w['field_values']) == 2 for w in page['results'])
+        after = page['next_cursor']
+        if after is None:
+            break
+    assert seen == [f'Moth {i}' for i in range(5)]
+
+def test_search_wildlife_names_pagination(client):
+    _create_wildlife_with_fields(client, 3)
+    page = client.get('/api/search-wildlife-names/?query=moth&limit=2').get_json()
+    assert [w['name'] for w in page['results']] == ['Moth 0', 'Moth 1']
+    page = client.get(f"/api/search-wildlife-names/?query=moth&limit=2&after={page['next_cursor']}").get_json()
+    assert [w['name'] for w in page['results']] == ['Moth 2']
+    assert page['next_cursor'] is None
+
+def test_pagination_invalid_limit(client):
+    response = client.get('/api/get-wildlife/?limit=0')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_get_wildlife_ndjson(client):
+    import json
+    _create_wildlife_with_fields(client, 3)
+    response = client.get('/api/get-wildlife/?format=ndjson')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines == client.get('/api/get-wildlife/').get_json()
+
+def test_search_wildlife_names_ndjson_with_limit(client):
+    _create_wildlife_with_fields(client, 3)
+    response = client.get('/api/search-wildlife-names/?query=moth&format=ndjson&limit=2')
+    assert len(response.get_data(as_text=True).splitlines()) == 2
+
+def test_invalid_format(client):
+    response = client.get('/api/get-wildlife/?format=xml')
+    assert response.status_code == 400
+
+def test_search_wildlife_names_full_text(client):
+    category_id = client.post('/api/create-category/', data={'name': 'Mammals'}).get_json()['category_id']
+    client.post('/api/create-wildlife/', data={'name': 'Red Fox', 'scientific_name': 'Vulpes vulpes', 'category_id': category_id})
+    client.post('/api/create-wildlife/', data={'name': 'Arctic Fox', 'scientific_name': 'Vulpes lagopus', 'category_id': category_id})
+    client.post('/api/create-wildlife/', data={'name': 'Black Bear', 'scientific_name': 'Ursus americanus', 'category_id': category_id})
+
+    names = lambda url: sorted(w['name'] for w in client.get(url).get_json())
+    assert names('/api/search-wildlife-names/?query=fox') == ['Arctic Fox', 'Red Fox']
+    assert names('/api/search-wildlife-names/?query=vulp') == ['Arctic Fox', 'Red Fox']
+    assert names('/api/search-wildlife-names/?query=vulp&prefix=false') == []
+    assert names('/api/search-wildlife-names/?query=red%20fox') == ['Red Fox']
+    assert names('/api/search-wildlife-names/?query=%22fox') == ['Arctic Fox', 'Red Fox']
+
+    client.delete('/api/delete-wildlife/?id=1')
+    assert names('/api/search-wildlife-names/?query=fox') == ['Arctic Fox']
+
+def test_search_wildlife_text_field_full_text(client):
+    category_id = client.post('/api/create-category/', data={'name': 'Turtles'}).get_json()['category_id']
+    field_id = client.post('/api/create-field/', data={'name': 'Notes', 'type': 'TEXT', 'category_id': category_id}).get_json()['field_id']
+    client.post('/api/create-wildlife/', data={'name': 'Green Turtle', 'scientific_name': 'Chelonia mydas', 'category_id': category_id, 'Notes': 'Also known as the green sea turtle'})
+    client.post('/api/create-wildlife/', data={'name': 'Box Turtle', 'scientific_name': 'Terrapene carolina', 'category_id': category_id, 'Notes': 'Lives on land'})
+
+    names = lambda query: [w['name'] for w in client.get(f'/api/search-wildlife-text-field/?field_id={field_id}&query={query}').get_json()]
+    assert names('sea') == ['Green Turtle']
+    assert sorted(names('')) == ['Box Turtle', 'Green Turtle']
+
+    client.post('/api/edit-wildlife/', data={'wildlife_id': 2, 'category_id': category_id, 'Notes': 'Sometimes found near the sea'})
+    assert sorted(names('sea')) == ['Box Turtle', 'Green Turtle']
+    assert names('land') == []
+
+def test_search_wildlife_by_integer_field_compares_numbers(client):
+    _create_wildlife_with_fields(client, 20)  # Wingspan is field 1, with values 0 to 19
+    response = client.get('/api/search-wildlife-by-integer-field/?field_id=1&min_value=8&max_value=15')
+    assert sorted(w['id'] for w in response.get_json()) == list(range(10, 16))
+    response = client.get('/api/search-wildlife-by-integer-field/?field_id=1&exact_value=9')
+    assert [w['name'] for w in response.get_json()] == ['Moth 9']
+
+def test_integer_field_values_stored_as_plain_numbers(client):
+    import json
+    category_id = client.post('/api/create-category/', data={'name': 'Moths'}).get_json()['category_id']
+    client.post('/api/create-field/', data={'name': 'Wingspan', 'type': 'INTEGER', 'category_id': category_id})
+    # int() accepts all of these, but SQLite's CAST reads "1_000" as 1 and "\u0663" (an Arabic-Indic 3) as 0
+    for i, wingspan in enumerate(['1_000', ' 42 ', '\u0663']):
+        response = client.post('/api/create-wildlife/', data={
+            'name': f'Moth {i}', 'scientific_name': f'Mothus {i}', 'category_id': category_id, 'Wingspan': wingspan})
+        assert response.status_code == 201
+    client.post('/api/edit-wildlife/', data={'wildlife_id': 2, 'category_id': category_id, 'Wingspan': '2_000'})
+    line = json.dumps({'name': 'Moth 3', 'scientific_name': 'Mothus 3', 'category_id': category_id, 'Wingspan': ' 3_000'})
+    assert client.post('/api/import-wildlife/?format=ndjson', data=line, content_type='application/x-ndjson').get_json()['imported'] == 1
+
+    assert [client.get(f'/api/get-wildlife-by-id/{i}').get_json()['Wingspan'] for i in range(1, 5)] == ['1000', '2000', '3', '3000']
+    response = client.get('/api/search-wildlife-by-integer-field/?field_id=1&min_value=500')
+    assert sorted(w['name'] for w in response.get_json()) == ['Moth 0', 'Moth 1', 'Moth 3']
+    response = client.get('/api/search-wildlife-by-integer-field/?field_id=1&exact_value=3')
+    assert [w['name'] for w in response.get_json()] == ['Moth 2']
+
+def test_integer_field_range_search_uses_index(app):
+    from app import db_helpers
+    with app.app_context():
+        plan = db_helpers.select_multiple(
+            "EXPLAIN QUERY PLAN SELECT w.* FROM Wildlife w JOIN IntegerFieldValues iv ON w.id = iv.wildlife_id "
+            "WHERE iv.field_id = ? AND iv.value > ? AND iv.value < ?", [1, 8, 15])
+    assert any('IntegerFieldValues_field_value' in row['detail'] for row in plan)
+
+def test_create_wildlife_rejects_non_integer_value(client):
+    category_id = client.post('/api/create-category/', data={'name': 'Moths'}).get_json()['category_id']
+    client.post('/api/create-field/', data={'name': 'Wingspan', 'type': 'INTEGER', 'category_id': category_id})
+    response = client.post('/api/create-wildlife/', data={
+        'name': 'Moth', 'scientific_name': 'Mothus', 'category_id': category_id, 'Wingspan': 'wide'})
+    assert response.status_code == 400
+    assert 'Wingspan' in response.get_json()['error']
+
+def test_create_wildlife_looks_up_inherited_fields_in_one_query(client, monkeypatch):
+    from app import db_helpers
+    _create_wildlife_with_fields(client, 1)
+    queries = []
+    for helper in ('select_one', 'select_multiple'):
+        original = getattr(db_helpers, helper)
+        def recording(*args, _original=original, **kwargs):
+            queries.append(args[0])
+            return _original(*args, **kwargs)
+        monkeypatch.setattr(db_helpers, helper, recording)
+    response = client.post('/api/create-wildlife/', data={
+        'name': 'Moth 9', 'scientific_name': 'Mothus 9', 'category_id': 1, 'Wingspan': '9', 'Habitat': 'Forest'})
+    assert response.status_code == 201
+    monkeypatch.undo()
+    [field_query] = [query for query in queries if 'FieldsToCategories' in query]
+    assert 'CategoryClosure' in field_query
+    assert client.get('/api/get-wildlife-by-id/2').get_json()['Wingspan'] == '9'
+
+def test_field_registry_sees_fields_added_by_another_process(app, client):
+    import os
+    import subprocess
+    import sys
+    _create_wildlife_with_fields(client, 1)
+    assert 'Color' not in client.get('/api/get-wildlife-by-id/1').get_json()
+    etag = client.get('/api/get-categories-and-fields/').headers['ETag']
+
+    # A second app on the same database file, in its own process (like another gunicorn worker), adds a field
+    script = (
+        "import sys; from app import create_app\n"
+        "app = create_app({'TESTING': True, 'DATABASE': sys.argv[1], 'IMAGE_UPLOAD_FOLDER': sys.argv[2]})\n"
+        "response = app.test_client().post('/api/create-field/', data={'name': 'Color', 'type': 'TEXT', 'category_id': 1})\n"
+        "assert response.status_code == 201, response.get_json()\n"
+    )
+    subprocess.run([sys.executable, '-c', script, app.config['DATABASE'], app.config['IMAGE_UPLOAD_FOLDER']],
+                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True)
+
+    response = client.post('/api/create-wildlife/', data={
+        'name': 'Moth 9', 'scientific_name': 'Mothus 9', 'category_id': 1, 'Wingspan': '9', 'Habitat': 'Forest', 'Color': 'Brown'})
+    assert response.status_code == 201
+    assert client.get(f"/api/get-wildlife-by-id/{response.get_json()['wildlife_id']}").get_json()['Color'] == 'Brown'
+    response = client.get('/api/get-categories-and-fields/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'Color' in [field['name'] for field in response.get_json()['fields'].values()]
+
+def test_field_registry_invalidated_on_rename(client):
+    _create_wildlife_with_fields(client, 1)
+    assert 'Habitat' in client.get('/api/get-wildlife-by-id/1').get_json()
+    client.post('/api/edit-field/', data={'field_id': 2, 'new_name': 'Biome'})
+    wildlife = client.get('/api/get-wildlife-by-id/1').get_json()
+    assert wildlife['Biome'] == 'Forest' and 'Habitat' not in wildlife
+    response = client.post('/api/create-wildlife/', data={
+        'name': 'Moth 9', 'scientific_name': 'Mothus 9', 'category_id': 1, 'Wingspan': '9', 'Biome': 'Forest'})
+    assert response.status_code == 201
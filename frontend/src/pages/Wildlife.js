@@ -4,6 +4,8 @@ import { FilterBar } from "../components/FilterBar";
 import { GridResult, ListResult, CardResult } from "../components/ResultTypes";
 import apiService from "../services/apiService";
 
+const WILDLIFE_PAGE_SIZE = 500;
+
 export const Wildlife = () => {
   const [wildlifeData, setWildlifeData] = useState([]);
   const [categories, setCategories] = useState([]);
@@ -20,26 +22,44 @@ export const Wildlife = () => {
   };
 
   useEffect(() => {
+    // Set when the component unmounts (or StrictMode re-runs this effect), so a load that's still running stops updating state
+    let ignore = false;
+
     const fetchData = async () => {
       try {
         const categoriesAndFields = await apiService.getCategoriesAndFields();
-        const data = await apiService.getAllWildlife();
-
-        const fetchedWildlife = convertDataToArray(data);
+        if (ignore) return;
         const fetchedCategories = convertDataToArray(
           categoriesAndFields.categories
         );
         const fetchedFields = convertDataToArray(categoriesAndFields.fields);
-        
-        setWildlifeData(fetchedWildlife); // Set the updated data with image URLs
+
         setCategories(fetchedCategories);
         setFields(fetchedFields);
+
+        // Load wildlife a page at a time. The first page is shown as soon as it arrives, and the rest are gathered
+        // and shown together at the end, rather than copying the whole list again for every page.
+        const loaded = [];
+        let after = null;
+        do {
+          const page = await apiService.getWildlifePage(WILDLIFE_PAGE_SIZE, after);
+          if (ignore) return;
+          loaded.push(...page.results);
+          if (after === null) {
+            setWildlifeData(page.results);
+          }
+          after = page.next_cursor;
+        } while (after !== null);
+        setWildlifeData(loaded);
       } catch (error) {
         console.error("Error fetching wildlife data:", error);
       }
     };
 
     fetchData();
+    return () => {
+      ignore = true;
+    };
   }, []);
 
   useEffect(() => {
@@ -72,6 +72,19 @@ const apiService = {
     }
   },
 
+  getWildlifePage: async (limit, after = null) => {
+    try {
+      const params = { limit };
+      if (after !== null) {
+        params.after = after;
+      }
+      const response = await api.get(`/api/get-wildlife/`, { params });
+      return response.data;
+    } catch (error) {
+      handleError(error);
+    }
+  },
+
   getWildlifeById: async (wildlifeId) => {
     try {
       const response = await api.get(`/api/get-wildlife-by-id/${wildlifeId}`);